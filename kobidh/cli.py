@@ -2,8 +2,9 @@ import functools
 import click
 import logging
 import sys
-from kobidh.core import Core, Apps, Service, Container
+from kobidh.constants import AMI_PARAMETERS
 from kobidh.exceptions import KobidhError
+from kobidh.utils import cache
 
 # Set up basic logging
 logging.basicConfig(
@@ -11,6 +12,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# NOTE: `kobidh.core` is imported inside each command, see the note in
+# kobidh/core.py.
+
 
 def handle_exceptions(func):
     """Decorator to handle exceptions gracefully."""
@@ -24,6 +28,9 @@ def handle_exceptions(func):
             if e.suggestion:
                 click.echo(f"💡 Suggestion: {e.suggestion}", err=True)
             sys.exit(1)
+        except click.ClickException:
+            # Usage errors found by the command itself, click reports them
+            raise
         except KeyboardInterrupt:
             click.echo("\n❌ Operation cancelled by user", err=True)
             sys.exit(130)
@@ -37,11 +44,22 @@ def handle_exceptions(func):
 
 @click.group()
 @click.option("--verbose", "-v", is_flag=True, help="Enable verbose logging")
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="KOBIDH_NO_CACHE",
+    help="Ignore cached AWS lookups and refresh them",
+)
 @click.version_option(version="1.0.0", prog_name="kobidh")
-def main(verbose):
+def main(verbose, no_cache):
     """🚀 Kobidh - CLI tool for automating containerized application deployment"""
     if verbose:
+        from kobidh.utils import ratelimit
+
         logging.getLogger().setLevel(logging.DEBUG)
+        # Report how long API calls waited on the client side rate limiter
+        click.get_current_context().call_on_close(ratelimit.log_stats)
+    cache.set_enabled(not no_cache)
     logger.info("Kobidh CLI started")
 
 
@@ -52,6 +70,8 @@ def main(verbose):
 @handle_exceptions
 def setup():
     """🔧 Initial setup and configuration"""
+    from kobidh.core import Core
+
     click.echo("🔧 Starting Kobidh setup...")
     Core().setup()
 
@@ -60,29 +80,146 @@ def setup():
 @handle_exceptions
 def show():
     """📋 Show current configuration"""
+    from kobidh.core import Core
+
     Core().show()
 
 
+@main.command()
+@click.option("--socket", "socket_path", help="Unix socket path to listen on")
+@handle_exceptions
+def serve(socket_path):
+    """🔥 Run a warm daemon that executes kobidh commands"""
+    from kobidh.daemon import Daemon
+
+    daemon = Daemon(socket_path)
+    click.echo("🔥 Warming up AWS clients...")
+    daemon.warm()
+    click.echo(f"👂 Listening on {daemon.path}")
+    daemon.serve_forever()
+
+
+@main.command(name="azs.refresh")
+@click.option("--region", "-r", multiple=True, help="AWS region(s) to refresh")
+@handle_exceptions
+def azs_refresh(region):
+    """🔄 Refresh cached availability zones"""
+    from kobidh.core import Core
+
+    Core().refresh_azs(list(region))
+
+
+@main.command(name="ami.prefetch")
+@click.option("--region", "-r", multiple=True, help="AWS region(s) to resolve")
+@click.option(
+    "--family",
+    type=click.Choice(sorted({family for family, _ in AMI_PARAMETERS})),
+    help="AMI family",
+)
+@click.option(
+    "--arch",
+    type=click.Choice(sorted({arch for _, arch in AMI_PARAMETERS})),
+    help="AMI architecture",
+)
+@click.option("--refresh", is_flag=True, help="Ignore cached AMIs")
+@handle_exceptions
+def ami_prefetch(region, family, arch, refresh):
+    """💿 Resolve and cache ECS optimized AMIs"""
+    from kobidh.core import Core
+
+    Core().prefetch_amis(list(region), family, arch, refresh)
+
+
 # --------------------
 # Apps Commands
 # --------------------
+def _is_bulk(names, manifest) -> bool:
+    return len(names) != 1 or manifest is not None
+
+
 @main.command(name="apps.create")
-@click.argument("name", type=str)
+@click.argument("names", nargs=-1, type=str)
 @click.option("--region", "-r", help="AWS region to deploy to")
+@click.option("--wait", "-w", is_flag=True, help="Stream stack events until done")
+@click.option(
+    "--layered",
+    is_flag=True,
+    help="Deploy network, identity, registry and cluster as separate stacks",
+)
+@click.option(
+    "--service",
+    "-s",
+    "services",
+    multiple=True,
+    help="Service to create an image repository for (repeatable, web is implied)",
+)
+@click.option(
+    "--remove-service",
+    "remove_services",
+    multiple=True,
+    help="Service whose repository and images are deleted (repeatable)",
+)
+@click.option("--manifest", "-m", help="File listing one '<name> [region]' per line")
+@click.option(
+    "--parallel", "-p", type=click.IntRange(min=1), help="Apps to create concurrently"
+)
 @handle_exceptions
-def apps_create(name, region):
+def apps_create(
+    names, region, wait, layered, services, remove_services, manifest, parallel
+):
     """🏗️ Create application infrastructure"""
-    click.echo(f"🏗️ Creating application '{name}'...")
-    Apps(name, region).create()
+    from kobidh.core import Apps, Bulk
+
+    if not _is_bulk(names, manifest):
+        click.echo(f"🏗️ Creating application '{names[0]}'...")
+        Apps(names[0], region).create(wait, layered, services, remove_services)
+        return
+    targets = Bulk.targets(names, manifest, region)
+    Bulk(targets, parallel).run(
+        "apps.create",
+        lambda name, region: Apps(name, region).create(
+            wait, layered, services, remove_services
+        ),
+    )
+
+
+@main.command(name="apps.list")
+@click.option("--region", "-r", help="AWS region")
+@handle_exceptions
+def apps_list(region):
+    """📋 List every kobidh application"""
+    from kobidh.core import Fleet
+
+    Fleet(region).list()
+
+
+@main.command(name="apps.status")
+@click.option("--region", "-r", help="AWS region")
+@handle_exceptions
+def apps_status(region):
+    """📋 Show stack, cluster and service status of every application"""
+    from kobidh.core import Fleet
+
+    Fleet(region).status()
 
 
 @main.command(name="apps.describe")
 @click.argument("name", type=str)
 @click.option("--region", "-r", help="AWS region")
+@click.option(
+    "--output",
+    "-o",
+    type=click.Choice(["table", "json", "ndjson"]),
+    default="table",
+    help="Output format of the stack resources",
+)
+@click.option("--template", is_flag=True, help="Print the deployed template instead")
 @handle_exceptions
-def apps_describe(name, region):
+def apps_describe(name, region, output, template):
     """📊 Describe application infrastructure details"""
-    Apps(name, region).describe()
+    from kobidh.core import Apps
+
+    Apps(name, region).describe(output, template)
 
 
 @main.command(name="apps.info")
@@ -91,37 +228,120 @@ def apps_describe(name, region):
 @handle_exceptions
 def apps_info(name, region):
     """ℹ️ Show application information"""
+    from kobidh.core import Apps
+
     Apps(name, region).info()
 
 
-@main.command(name="apps.delete")
+@main.command(name="apps.timeline")
 @click.argument("name", type=str)
 @click.option("--region", "-r", help="AWS region")
+@handle_exceptions
+def apps_timeline(name, region):
+    """⏱️ Show the critical path and slack of the last deployment"""
+    from kobidh.core import Apps
+
+    Apps(name, region).timeline()
+
+
+@main.command(name="apps.delete")
+@click.argument("names", nargs=-1, type=str)
+@click.option("--region", "-r", help="AWS region")
 @click.option("--force", "-f", is_flag=True, help="Skip confirmation prompt")
+@click.option("--manifest", "-m", help="File listing one '<name> [region]' per line")
+@click.option(
+    "--parallel", "-p", type=click.IntRange(min=1), help="Apps to delete concurrently"
+)
 @handle_exceptions
-def apps_delete(name, region, force):
+def apps_delete(names, region, force, manifest, parallel):
     """🗑️ Delete application and all resources"""
+    from kobidh.core import Apps, Bulk
+
+    targets = Bulk.targets(names, manifest, region)
+    apps = ", ".join(f"'{name}'" for name, _ in targets)
     if not force:
         if not click.confirm(
-            f"⚠️ Are you sure you want to delete app '{name}' and ALL its resources?"
+            f"⚠️ Are you sure you want to delete app {apps} and ALL its resources?"
         ):
             click.echo("❌ Deletion cancelled")
             return
-    click.echo(f"🗑️ Deleting application '{name}'...")
-    Apps(name, region).delete()
+    if not _is_bulk(names, manifest):
+        click.echo(f"🗑️ Deleting application '{names[0]}'...")
+        Apps(names[0], region).delete()
+        return
+    Bulk(targets, parallel).run(
+        "apps.delete", lambda name, region: Apps(name, region).delete()
+    )
+
+
+@main.command()
+@click.argument("name", type=str)
+@click.option("--region", "-r", help="AWS region (default: the snapshot's region)")
+@click.option(
+    "--snapshot",
+    "-s",
+    help="Facts snapshot file (default: kobidh-<name>.facts.json)",
+)
+@click.option("--record", is_flag=True, help="Look up facts from AWS and save them")
+@click.option("--out", "-o", default="kobidh.out", help="Template output directory")
+@handle_exceptions
+def synth(name, region, snapshot, record, out):
+    """🧪 Render CloudFormation templates offline from a facts snapshot"""
+    from kobidh.core import Synth
+
+    synth = Synth(name, region, snapshot)
+    if record:
+        synth.record()
+    synth.render(out)
 
 
 # --------------------
 # Service Commands
 # --------------------
 @main.command(name="service.create")
-@click.argument("name", type=str)
+@click.argument("names", nargs=-1, type=str)
 @click.option("--region", "-r", help="AWS region")
+@click.option("--wait", "-w", is_flag=True, help="Stream stack events until done")
+@click.option("--manifest", "-m", help="File listing one '<name> [region]' per line")
+@click.option(
+    "--parallel",
+    "-p",
+    type=click.IntRange(min=1),
+    help="Services to create concurrently",
+)
+@click.option("--image", help="Container image (default: <repository>:latest)")
+@click.option("--desired-count", type=int, help="Number of tasks to run")
+@click.option("--cpu", type=int, help="Task CPU units")
+@click.option("--memory", type=int, help="Task memory (MiB)")
 @handle_exceptions
-def service_create(name, region):
+def service_create(
+    names, region, wait, manifest, parallel, image, desired_count, cpu, memory
+):
     """🚀 Create and deploy ECS service"""
-    click.echo(f"🚀 Creating service for app '{name}'...")
-    Service(name, region).create()
+    from kobidh.core import Bulk, Service
+
+    # Only the given values change, the others keep their deployed value
+    parameters = {
+        key: value
+        for key, value in (
+            ("Image", image),
+            ("DesiredCount", desired_count),
+            ("Cpu", cpu),
+            ("Memory", memory),
+        )
+        if value is not None
+    }
+    if not _is_bulk(names, manifest):
+        click.echo(f"🚀 Creating service for app '{names[0]}'...")
+        Service(names[0], region).create(wait, parameters)
+        return
+    targets = Bulk.targets(names, manifest, region)
+    if image and len(targets) > 1:
+        raise click.UsageError("--image would pin the same image on every app")
+    Bulk(targets, parallel).run(
+        "service.create",
+        lambda name, region: Service(name, region).create(wait, parameters),
+    )
 
 
 @main.command(name="service.delete")
@@ -131,6 +351,8 @@ def service_create(name, region):
 @handle_exceptions
 def service_delete(name, region, force):
     """🗑️ Delete ECS service"""
+    from kobidh.core import Service
+
     if not force:
         if not click.confirm(
             f"⚠️ Are you sure you want to delete service for app '{name}'?"
@@ -144,11 +366,75 @@ def service_delete(name, region, force):
 # --------------------
 # Container Commands
 # --------------------
+def _parse_services(ctx, param, values) -> dict:
+    """`NAME=CONTEXT` options -> {service: build context}"""
+    services = {}
+    for value in values:
+        service, separator, context = value.partition("=")
+        if not separator or not service or not context:
+            raise click.BadParameter(f'"{value}" is not NAME=CONTEXT', param=param)
+        services[service] = context
+    return services
+
+
 @main.command(name="container.push")
 @click.argument("name", type=str)
 @click.option("--region", "-r", help="AWS region")
+@click.option("--tag", "-t", default="latest", help="Image tag (also tagged latest)")
+@click.option(
+    "--archive",
+    "-a",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Push a 'docker save' or OCI image archive instead of building",
+)
+@click.option("--context", "-c", default=".", help="Docker build context")
+@click.option(
+    "--registry-cache",
+    is_flag=True,
+    help="Build with BuildKit, sharing the layer cache through the app repository",
+)
+@click.option(
+    "--service",
+    "-s",
+    "services",
+    multiple=True,
+    callback=_parse_services,
+    help="Service image to build as NAME=CONTEXT (repeatable), e.g. worker=./worker",
+)
+@click.option(
+    "--parallel",
+    "-p",
+    type=click.IntRange(min=1),
+    help="Service images built concurrently",
+)
 @handle_exceptions
-def container_push(name, region):
+def container_push(
+    name, region, tag, archive, context, registry_cache, services, parallel
+):
     """📦 Build and push container to ECR"""
+    from kobidh.core import Container
+
     click.echo(f"📦 Building and pushing container for app '{name}'...")
-    Container(name, region).push()
+    if services:
+        if archive:
+            raise click.UsageError("--archive can not be combined with --service")
+        Container(name, region).push_services(services, tag, registry_cache, parallel)
+        return
+    Container(name, region).push(tag, archive, context, registry_cache)
+
+
+@main.command(name="container.release")
+@click.argument("name", type=str)
+@click.option("--region", "-r", help="AWS region")
+@click.option("--tag", "-t", default="latest", help="Image tag to release")
+@click.option("--wait", "-w", is_flag=True, help="Wait for the service to be stable")
+@handle_exceptions
+def container_release(name, region, tag, wait):
+    """🚀 Release an image to the service without a stack update"""
+    from kobidh.core import Container
+
+    Container(name, region).release(tag, wait)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
 import os
-import boto3
 import logging
-from typing import Optional, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from click import echo, prompt
 from kobidh.meta import DIR, DEFAULT_FILE
 from kobidh.exceptions import KobidhError, ConfigurationError, AWSError, DeploymentError
-from kobidh.resource.infra import Infra
-from kobidh.resource.provision import Provision
-from kobidh.utils.logging import log_err
+from kobidh.utils.logging import log_err, prefixed
 from kobidh.utils.decorators import aws_credentails
+from kobidh.utils.clients import get_session
+from kobidh.constants import BUILD_MAX_WORKERS, BULK_MAX_WORKERS
 
 logger = logging.getLogger(__name__)
 
+# NOTE: boto3 and the troposphere based `kobidh.resource` modules are heavy to
+# import. They are imported where they are used, and `kobidh.cli` imports this
+# module inside each command, so that `kobidh --help`, argument parsing and
+# commands which never reach AWS do not pay for them.
+
 
 class Config:
     def __init__(self):
@@ -59,11 +65,31 @@ class Config:
             file.close()
         return config
 
+    def read(self) -> dict:
+        """Read the configuration without creating or rewriting it."""
+        try:
+            with open(
+                os.path.join(self.home_dir, f"{DIR}/{DEFAULT_FILE}"), "r"
+            ) as file:
+                return Config.parse(file.read())
+        except FileNotFoundError:
+            return {}
+
+    def pinned_azs(self, region: str) -> Optional[list]:
+        """
+        Availability zones pinned for `region`, e.g. the line
+        `azs.ap-south-1: ap-south-1a,ap-south-1b` in the configuration.
+        """
+        value = self.read().get(f"azs.{region}")
+        if not value:
+            return None
+        return [az.strip() for az in value.split(",") if az.strip()]
+
 
 class Core:
     @aws_credentails
     def __init__(self):
-        self.session = boto3.session.Session()
+        self.session = get_session()
         self.config = Config()
 
     def setup(self):
@@ -79,6 +105,30 @@ class Core:
             echo(f"{k}: {v}")
         echo()
 
+    def refresh_azs(self, regions: list = None):
+        """Refresh the cached availability zones of `regions`."""
+        from kobidh.resource.infra.vpc_config import get_azs
+
+        for region in regions or [self.session.region_name]:
+            zones = get_azs(region, refresh=True)
+            echo(f'Availability Zones for region "{region}": {", ".join(zones)}')
+
+    def prefetch_amis(
+        self,
+        regions: list = None,
+        family: Optional[str] = None,
+        architecture: Optional[str] = None,
+        refresh: bool = False,
+    ):
+        """Resolve and cache the ECS optimized AMI of `regions` concurrently."""
+        from kobidh.resource.provision.ami import AMIResolver
+
+        kwargs = {"family": family, "architecture": architecture}
+        resolver = AMIResolver(**{k: v for k, v in kwargs.items() if v})
+        images = resolver.prefetch(regions or [self.session.region_name], refresh)
+        for region, image in images.items():
+            echo(f'{region}: {image["image_id"]} ({image["image_name"]})')
+
 
 class Apps:
     """Application management for Kobidh deployment automation."""
@@ -101,23 +151,49 @@ class Apps:
             )
 
         self.name = name.strip()
-        self.session = boto3.session.Session()
+        self.session = get_session()
         self.region = region if region else self.session.region_name
 
         logger.info(
             f"Apps manager initialized for '{self.name}' in region '{self.region}'"
         )
 
-    def create(self):
-        """Create application infrastructure with enhanced error handling."""
+    def create(
+        self,
+        wait: bool = False,
+        layered: bool = False,
+        services: List[str] = None,
+        remove_services: Tuple[str, ...] = (),
+    ):
+        """
+        Create application infrastructure with enhanced error handling.
+
+        Args:
+            services: Services to create an image repository for, besides
+                the default one and the ones already deployed
+            remove_services: Services whose repository (and images) are
+                deleted
+        """
+        from kobidh.resource.facts import Facts
+        from kobidh.resource.infra import Infra
+
         try:
             logger.info(f"Creating infrastructure for app '{self.name}'")
             echo(f'🚀 Creating app "{self.name}" for "{self.region}"..')
 
-            config = Infra.configure(self.name, self.region)
-            echo(f'✅ App "{self.name}" configuration created..')
-
-            Infra.apply(config.name, config.region, config.template)
+            facts = Facts(azs=Config().pinned_azs(self.region))
+            if layered:
+                configs = Infra.configure_layers(
+                    self.name, self.region, facts, services, remove_services
+                )
+                echo(f'✅ App "{self.name}" configuration created..')
+                Infra.apply_layers(self.name, self.region, configs, wait)
+            else:
+                config = Infra.configure(
+                    self.name, self.region, facts, services, remove_services
+                )
+                echo(f'✅ App "{self.name}" configuration created..')
+                Infra.apply(config.name, config.region, config.template, wait)
             echo(f'✅ App "{self.name}" infrastructure deployed successfully!')
 
             logger.info(f"Successfully created app '{self.name}'")
@@ -131,11 +207,13 @@ class Apps:
                 suggestion="Check CloudFormation console for detailed error information",
             )
 
-    def describe(self):
+    def describe(self, output: str = "table", template: bool = False):
         """Describe application infrastructure details."""
+        from kobidh.resource.infra import Infra
+
         try:
             logger.info(f"Describing app '{self.name}'")
-            Infra.describe(self.name, self.region)
+            Infra.describe(self.name, self.region, output, template)
         except Exception as e:
             logger.error(f"Failed to describe app '{self.name}': {str(e)}")
             if "does not exist" in str(e).lower():
@@ -147,6 +225,8 @@ class Apps:
 
     def info(self):
         """Show application information."""
+        from kobidh.resource.infra import Infra
+
         try:
             logger.info(f"Getting info for app '{self.name}'")
             Infra.info(self.name, self.region)
@@ -159,8 +239,26 @@ class Apps:
                 )
             raise AWSError(f"Failed to get app info: {str(e)}")
 
+    def timeline(self):
+        """Show the critical path of the last stack operation."""
+        from kobidh.resource.infra import Infra
+
+        try:
+            logger.info(f"Analysing timeline of app '{self.name}'")
+            Infra.timeline(self.name, self.region)
+        except Exception as e:
+            logger.error(f"Failed to get timeline of app '{self.name}': {str(e)}")
+            if "does not exist" in str(e).lower():
+                raise DeploymentError(
+                    f"App '{self.name}' not found",
+                    suggestion="Create the application first with 'kobidh apps.create'",
+                )
+            raise AWSError(f"Failed to get app timeline: {str(e)}")
+
     def delete(self):
         """Delete application and all associated resources."""
+        from kobidh.resource.infra import Infra
+
         try:
             logger.info(f"Deleting app '{self.name}'")
             echo(f'🗑️ Deleting app "{self.name}"..')
@@ -180,23 +278,58 @@ class Apps:
             )
 
 
+class Fleet:
+    """Every kobidh app of a region."""
+
+    @aws_credentails
+    def __init__(self, region: Optional[str] = None):
+        self.session = get_session()
+        self.region = region if region else self.session.region_name
+
+    def list(self):
+        from kobidh.resource.infra import Infra
+
+        try:
+            echo(f'📋 Apps in "{self.region}"..')
+            return Infra.list(self.region)
+        except Exception as e:
+            logger.error(f"Failed to list apps: {str(e)}")
+            raise AWSError(f"Failed to list apps: {str(e)}")
+
+    def status(self):
+        from kobidh.resource.infra import Infra
+
+        try:
+            echo(f'📋 Status of apps in "{self.region}"..')
+            return Infra.list(self.region, status=True)
+        except Exception as e:
+            logger.error(f"Failed to get status of apps: {str(e)}")
+            raise AWSError(f"Failed to get status of apps: {str(e)}")
+
+
 class Service:
     @aws_credentails
     def __init__(self, app: str, region: str = None):
         self.app = app
-        self.session = boto3.session.Session()
+        self.session = get_session()
         self.region = region if region else self.session.region_name
 
-    def create(self):
+    def create(self, wait: bool = False, parameters: Optional[Dict[str, Any]] = None):
+        from kobidh.resource.provision import Provision
+
         try:
             echo(f'Provisioning app "{self.app}"..')
-            provision = Provision(self.app, self.region)
-            provision.configure()
-            provision.apply()
+            config = Provision.configure(self.app, self.region)
+            Provision.apply(config, wait, parameters)
         except Exception as e:
             log_err(str(e))
+            if isinstance(e, KobidhError):
+                raise
+            raise DeploymentError(f"Failed to provision app '{self.app}': {str(e)}")
 
     def delete(self):
+        from kobidh.resource.provision import Provision
+
         echo(f'Removing app "{self.app}" provision..')
         Provision.delete(self.app, self.region)
 
@@ -205,11 +338,226 @@ class Container:
     @aws_credentails
     def __init__(self, app: str, region: str = None):
         self.app = app
-        self.session = boto3.session.Session()
+        self.session = get_session()
         self.region = region if region else self.session.region_name
 
-    def push(self):
-        Provision.push(self.app)
+    def push(
+        self,
+        tag: str = "latest",
+        archive: str = None,
+        context: str = ".",
+        registry_cache: bool = False,
+    ):
+        from kobidh.resource.provision import Provision
+
+        echo(f'📦 Pushing "{tag}" for app "{self.app}"..')
+        digest = Provision.push(
+            self.app, self.region, tag, archive, context, registry_cache
+        )
+        echo(f'✅ App "{self.app}" image pushed: {digest}')
+
+    def push_services(
+        self,
+        services: Dict[str, str],
+        tag: str = "latest",
+        registry_cache: bool = False,
+        max_workers: int = None,
+    ):
+        from kobidh.resource.provision import Provision
+
+        echo(f'📦 Pushing "{tag}" of {", ".join(services)} for app "{self.app}"..')
+        Provision.push_services(
+            self.app,
+            self.region,
+            services,
+            tag,
+            registry_cache,
+            max_workers or BUILD_MAX_WORKERS,
+        )
+        echo(f'✅ App "{self.app}" images pushed')
+
+    def release(self, tag: str = "latest", wait: bool = False):
+        from kobidh.resource.provision import Provision
+
+        echo(f'🚀 Releasing "{tag}" for app "{self.app}"..')
+        Provision.release(self.app, self.region, tag, wait)
+        echo(f'✅ App "{self.app}" released "{tag}"')
+
+
+class Bulk:
+    """
+    Runs one operation over many apps on a bounded worker pool.
+
+    The workers share the process wide boto3 clients, so the creates and
+    updates of several apps overlap instead of running one at a time.
+    """
+
+    def __init__(
+        self, targets: List[Tuple[str, Optional[str]]], max_workers: int = None
+    ):
+        self.targets = targets
+        self.max_workers = max_workers or BULK_MAX_WORKERS
+
+    @staticmethod
+    def read_manifest(path: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Read a manifest with one app per line as `<name> [region]`. Blank
+        lines and `#` comments are skipped.
+        """
+        try:
+            with open(path, "r") as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            raise ConfigurationError(f'Manifest "{path}" not found')
+        targets = []
+        for line in lines:
+            parts = line.split("#", 1)[0].split()
+            if not parts:
+                continue
+            if len(parts) > 2:
+                raise ConfigurationError(
+                    f'Invalid manifest line "{line}"', "Use '<name> [region]'"
+                )
+            targets.append((parts[0], parts[1] if len(parts) > 1 else None))
+        return targets
+
+    @staticmethod
+    def targets(
+        names: List[str], manifest: str = None, region: str = None
+    ) -> List[Tuple[str, Optional[str]]]:
+        """Apps named on the command line followed by those of the manifest."""
+        targets = [(name, region) for name in names]
+        if manifest:
+            targets += [
+                (name, app_region or region)
+                for name, app_region in Bulk.read_manifest(manifest)
+            ]
+        if not targets:
+            raise ConfigurationError(
+                "No app names given", "Pass app names or a manifest with --manifest"
+            )
+        return list(dict.fromkeys(targets))
+
+    def run(self, action: str, operation: Callable[[str, Optional[str]], Any]):
+        """
+        Run `operation(name, region)` for every target and print a summary.
+
+        Raises:
+            DeploymentError: If the operation failed for any app
+        """
+
+        def attempt(target):
+            started = time.monotonic()
+            try:
+                # Concurrent apps log (and stream stack events) interleaved
+                with prefixed(target[0]):
+                    operation(*target)
+                error = None
+            except Exception as e:
+                logger.error(f"Failed to {action} app '{target[0]}': {str(e)}")
+                error = e.message if isinstance(e, KobidhError) else str(e)
+            return {
+                "name": target[0],
+                "region": target[1],
+                "error": error,
+                "seconds": time.monotonic() - started,
+            }
+
+        echo(f"⚙️ Running {action} for {len(self.targets)} app(s)..")
+        workers = min(self.max_workers, len(self.targets))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(attempt, self.targets))
+        Bulk.log_summary(action, results)
+
+        failed = [result["name"] for result in results if result["error"]]
+        if failed:
+            raise DeploymentError(
+                f"{action} failed for {len(failed)} of {len(results)} app(s): "
+                f"{', '.join(failed)}"
+            )
+        return results
+
+    @staticmethod
+    def log_summary(action: str, results: list):
+        echo(f"\n📋 {action} summary")
+        echo(f"  {'App':<30} {'Region':<16} {'Duration':>9}  Result")
+        for result in results:
+            status = f"❌ {result['error']}" if result["error"] else "✅ ok"
+            echo(
+                f"  {result['name']:<30} {result['region'] or '-':<16} "
+                f"{result['seconds']:>8.1f}s  {status}"
+            )
+
 
-    def release(self):
-        Provision.release(self.app)
+class Synth:
+    """Renders app and service templates from a recorded facts snapshot."""
+
+    def __init__(self, name: str, region: Optional[str] = None, snapshot: str = None):
+        self.name = name
+        self.region = region
+        self.snapshot = snapshot or f"kobidh-{name}.facts.json"
+
+    @aws_credentails
+    def record(self):
+        """Look up the external facts once and write them to the snapshot."""
+        from kobidh.resource.facts import Facts
+
+        region = self.region or get_session().region_name
+        facts = Facts.collect(self.name, region, azs=Config().pinned_azs(region))
+        facts.save(self.snapshot, self.name, region)
+        echo(
+            f'✅ Facts for app "{self.name}" in "{region}" recorded to {self.snapshot}'
+        )
+        if facts.stack_outputs is None:
+            echo(f'⚠️ App "{self.name}" does not exist yet, service facts are partial')
+
+    def render(self, out_dir: str) -> list:
+        """Render the templates without calling AWS, returns the written files."""
+        from kobidh.resource.facts import Facts
+        from kobidh.resource.infra import Infra
+        from kobidh.resource.provision import Provision
+        from kobidh.utils.format import camelcase
+
+        snapshot = Facts.load(self.snapshot)
+        facts = snapshot["facts"]
+        region = self.region or snapshot["region"]
+        if snapshot["app"] != self.name:
+            raise ConfigurationError(
+                f'Facts snapshot "{self.snapshot}" was recorded for app '
+                f'"{snapshot["app"]}"',
+                f"Record one with 'kobidh synth {self.name} --record'",
+            )
+        # Snapshots recorded before services were a fact
+        if facts.services is None:
+            facts.services = []
+        if facts.missing("azs"):
+            raise ConfigurationError(
+                f'Facts snapshot "{self.snapshot}" has no availability zones',
+                f"Record it again with 'kobidh synth {self.name} --record'",
+            )
+
+        os.makedirs(out_dir, exist_ok=True)
+        templates = {
+            camelcase(f"{self.name}-app-stack"): Infra.configure(
+                self.name, region, facts
+            ).template
+        }
+        missing = facts.missing("image", "execution_role_arn", "stack_outputs")
+        if missing:
+            echo(
+                f"⚠️ Skipping the service template, missing facts: {', '.join(missing)}"
+            )
+        else:
+            templates[camelcase(f"{self.name}-service-stack")] = Provision.configure(
+                self.name, region, facts
+            ).template
+
+        files = []
+        for stack_name, template in templates.items():
+            path = os.path.join(out_dir, f"{stack_name}.template.json")
+            with open(path, "w") as file:
+                file.write(template.to_json())
+                file.write("\n")
+            files.append(path)
+            echo(f"📄 {path}")
+        return files
@@ -0,0 +1,259 @@
+"""
+Warm kobidh daemon (`kobidh serve`) and the thin client behind the `kobidh`
+entry point.
+
+The daemon keeps boto3 sessions, clients and caches loaded and listens on a
+Unix socket under `~/.kobidh`. The client forwards argv to it and streams the
+output back, falling back to running the command in-process whenever no
+daemon is available. This module only uses the standard library so the client
+stays cheap to start.
+"""
+
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+from typing import List, Optional
+from kobidh.constants import CONFIG_DIR, DAEMON_SOCKET_FILE
+
+# Environment variables that change what a command does. The daemon only runs
+# requests from clients whose values match its own.
+FORWARDED_ENV = (
+    "AWS_PROFILE",
+    "AWS_DEFAULT_REGION",
+    "AWS_REGION",
+    "AWS_ACCESS_KEY_ID",
+    "AWS_SECRET_ACCESS_KEY",
+    "AWS_SESSION_TOKEN",
+    "KOBIDH_NO_CACHE",
+)
+# Commands that must run in the caller's process
+LOCAL_COMMANDS = ("serve", "setup")
+# Commands that prompt for confirmation unless forced
+CONFIRM_COMMANDS = ("apps.delete", "service.delete")
+
+logger = logging.getLogger(__name__)
+
+
+def socket_path() -> str:
+    return os.path.join(os.path.expanduser("~"), CONFIG_DIR, DAEMON_SOCKET_FILE)
+
+
+def _env_fingerprint(env) -> str:
+    from kobidh.utils.cache import fingerprint
+
+    return fingerprint(*[env.get(name, "") for name in FORWARDED_ENV])
+
+
+def _forwardable(argv: List[str]) -> bool:
+    commands = [arg for arg in argv if not arg.startswith("-")]
+    if not commands:
+        return False
+    command = commands[0]
+    if command in LOCAL_COMMANDS:
+        return False
+    if command in CONFIRM_COMMANDS and not ({"-f", "--force"} & set(argv)):
+        # The daemon has no terminal to ask on
+        return False
+    return True
+
+
+# --------------------
+# Client
+# --------------------
+def forward(argv: List[str], path: Optional[str] = None) -> Optional[int]:
+    """
+    Run `argv` on a running daemon.
+
+    Returns:
+        The command's exit code, or None when the command has to run
+        in-process (no daemon, unsupported command, different environment).
+    """
+    path = path or socket_path()
+    if not hasattr(socket, "AF_UNIX") or os.environ.get("KOBIDH_NO_DAEMON"):
+        return None
+    if not _forwardable(argv) or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    request = {"argv": argv, "cwd": os.getcwd(), "env": _env_fingerprint(os.environ)}
+    streamed = False
+    with sock, sock.makefile("rwb") as channel:
+        channel.write(json.dumps(request).encode("utf-8") + b"\n")
+        channel.flush()
+        for line in channel:
+            frame = json.loads(line)
+            if "fallback" in frame:
+                return None
+            if "exit" in frame:
+                return frame["exit"]
+            stream = sys.stdout if "out" in frame else sys.stderr
+            stream.write(frame.get("out", frame.get("err")))
+            stream.flush()
+            streamed = True
+    if not streamed:
+        return None
+    sys.stderr.write("❌ Error: kobidh daemon closed the connection\n")
+    return 1
+
+
+def run():
+    """Console entry point: use the daemon when one is running."""
+    code = forward(sys.argv[1:])
+    if code is None:
+        from kobidh.cli import main
+
+        return main()
+    sys.exit(code)
+
+
+# --------------------
+# Server
+# --------------------
+class _FrameWriter(io.TextIOBase):
+    """Text stream that forwards every write to the client as a frame."""
+
+    def __init__(self, channel, name: str, lock: threading.Lock):
+        self.channel = channel
+        self.name = name
+        # Shared by the stdout and stderr writers, commands may print from
+        # several threads (e.g. bulk operations)
+        self.lock = lock
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        if not isinstance(text, str):
+            # click probes streams with `write(b"")` to detect binary writers
+            raise TypeError("write() argument must be str")
+        if text:
+            with self.lock:
+                _send(self.channel, {self.name: text})
+        return len(text)
+
+
+def _send(channel, frame: dict):
+    channel.write(json.dumps(frame).encode("utf-8") + b"\n")
+    channel.flush()
+
+
+class Daemon:
+    """Runs forwarded commands one at a time inside a warm interpreter."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or socket_path()
+        self.env = _env_fingerprint(os.environ)
+        # stdout, stderr and the working directory are process wide
+        self._run_lock = threading.Lock()
+        self._aws_files_mtime = self._aws_files_state()
+
+    @staticmethod
+    def _aws_files_state():
+        state = []
+        for name in ("credentials", "config"):
+            path = os.path.join(os.path.expanduser("~"), ".aws", name)
+            state.append(os.stat(path).st_mtime_ns if os.path.exists(path) else None)
+        return state
+
+    def warm(self):
+        """Import the command modules and create the common AWS clients."""
+        import kobidh.core  # noqa: F401
+        import kobidh.resource.infra  # noqa: F401
+        import kobidh.resource.provision  # noqa: F401
+        from kobidh.utils.clients import get_client
+
+        for service in ("sts", "cloudformation", "ec2", "ecs", "ecr", "ssm", "iam"):
+            try:
+                get_client(service)
+            except Exception as e:
+                logger.warning(f"Could not warm up {service} client: {e}")
+
+    def serve_forever(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.path)
+            os.chmod(self.path, 0o600)
+            server.listen()
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _handle(self, conn):
+        with conn, conn.makefile("rwb") as channel:
+            try:
+                request = json.loads(channel.readline())
+                if request.get("env") != self.env:
+                    _send(channel, {"fallback": "environment differs from daemon"})
+                    return
+                _send(channel, {"exit": self._run(channel, request)})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropped client request: {e}")
+
+    def _run(self, channel, request) -> int:
+        from kobidh.utils import clients
+
+        with self._run_lock:
+            aws_files_mtime = self._aws_files_state()
+            if aws_files_mtime != self._aws_files_mtime:
+                # Credentials were edited, rebuild sessions on next use
+                clients.reset()
+                self._aws_files_mtime = aws_files_mtime
+
+            lock = threading.Lock()
+            out = _FrameWriter(channel, "out", lock)
+            err = _FrameWriter(channel, "err", lock)
+            root = logging.getLogger()
+            saved = (sys.stdin, sys.stdout, sys.stderr, os.getcwd(), root.level)
+            handlers = [
+                h
+                for h in root.handlers
+                if isinstance(h, logging.StreamHandler) and h.stream is sys.stderr
+            ]
+            sys.stdin, sys.stdout, sys.stderr = io.StringIO(), out, err
+            for handler in handlers:
+                handler.setStream(err)
+            try:
+                os.chdir(request["cwd"])
+                return self._invoke(request["argv"])
+            finally:
+                for handler in handlers:
+                    handler.setStream(saved[2])
+                sys.stdin, sys.stdout, sys.stderr = saved[:3]
+                os.chdir(saved[3])
+                root.setLevel(saved[4])
+
+    @staticmethod
+    def _invoke(argv: List[str]) -> int:
+        from kobidh.cli import main
+
+        try:
+            main.main(args=argv, prog_name="kobidh", standalone_mode=True)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            sys.stderr.write(f"{e.code}\n")
+            return 1
+        except Exception as e:
+            logger.exception("Unexpected error")
+            sys.stderr.write(f"❌ Unexpected error: {e}\n")
+            return 1
+        return 0
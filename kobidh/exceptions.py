@@ -176,6 +176,17 @@ class CloudFormationError(AWSError):
         )
 
 
+class ThrottlingError(AWSError):
+    """Raised when AWS keeps throttling requests after every retry"""
+
+    def __init__(self, message: str, aws_error_code: str = "THROTTLING"):
+        super().__init__(
+            message=message,
+            aws_error_code=aws_error_code,
+            suggestion="Lower the concurrency (e.g. --parallel) or retry later",
+        )
+
+
 class PermissionError(AWSError):
     """Raised when there are insufficient permissions"""
 
@@ -193,6 +204,21 @@ class PermissionError(AWSError):
 
 # Helper functions for exception handling
 
+# Error codes AWS services use to signal request throttling
+THROTTLING_ERROR_CODES = (
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "BandwidthLimitExceeded",
+    "SlowDown",
+    "EC2ThrottledException",
+)
+
 
 def handle_boto3_error(func):
     """Decorator to handle common boto3 exceptions and convert them to Kobidh exceptions"""
@@ -223,6 +249,8 @@ def handle_boto3_error(func):
                 raise ValidationError("parameter", error_message, "valid AWS parameter")
             elif error_code.startswith("InvalidRegion"):
                 raise RegionError(kwargs.get("region", "unknown"))
+            elif error_code in THROTTLING_ERROR_CODES:
+                raise ThrottlingError(error_message, error_code)
             else:
                 # Generic AWS error
                 raise AWSError(error_message, error_code)
@@ -1,10 +1,15 @@
-import boto3
 import traceback
 from troposphere import Template
 from kobidh.utils.format import camelcase
 from botocore.exceptions import ClientError
 from kobidh.utils.logging import log, log_err, log_warning
-from kobidh.resource.infra.attrs import Attrs
+from kobidh.utils.clients import get_client
+from kobidh.utils.cache import DiskCache
+from kobidh.constants import DEFAULT_SERVICE
+from kobidh.resource.facts import Facts
+
+# Stacks of an app created with `--layered`, in deployment order
+LAYERS = ("network", "identity", "registry", "cluster")
 
 
 class Config:
@@ -34,6 +39,9 @@ class Config:
             # ECR Configuration attribute name(s)
             self.ecr_name = f"{name}-repository"
 
+        def layer_stack_name(self, layer):
+            return f"{self.name}-{layer}-stack"
+
         def public_subnet_name(self, az):
             return f"{self.name}-{az}-public-subnet"
 
@@ -46,14 +54,46 @@ class Config:
         def private_subnet_route_association_name(self, az):
             return f"{self.name}-{az}-private-subnet-assoc"
 
-    def __init__(self, name: str, region: str = None):
+    def __init__(
+        self,
+        name: str,
+        region: str = None,
+        facts: Facts = None,
+        services: list = None,
+    ):
         self.name: str = name
         self.region: str = region
+        # Pinned or recorded external facts, see `Facts`
+        self.facts: Facts = facts or Facts()
+        # Services with an image repository, the default one always has one
+        self.services: list = list(dict.fromkeys([DEFAULT_SERVICE, *(services or [])]))
         self.attrs: Config.Attrs = Config.Attrs(name)
         self.template: Template = Template()
 
 
+# Outputs are only re-read when the stack changes, see `StackOutput.validate`
+stack_output_cache = DiskCache("stack-outputs")
+
+
 class StackOutput:
+    # Stack output key -> attribute
+    OUTPUTS = {
+        "ClusterName": "ecs_cluster_name",
+        "ECRUri": "ecr_uri",
+        "PublicSubnetNames": "public_subnet_names",
+        "PrivateSubnetNames": "private_subnet_names",
+        "SecurityGroupName": "security_group_name",
+        "InstanceProfileName": "instance_profile_name",
+    }
+    # Attributes provisioning depends on -> description
+    REQUIRED = {
+        "ecs_cluster_name": "Cluster name",
+        "ecr_uri": "Container Registry URI",
+        "public_subnet_names": "Public Subnet names",
+        "security_group_name": "Security Group name",
+        "instance_profile_name": "Instance Profile name",
+    }
+
     def __init__(self):
         self.ecs_cluster_name: str = None
         self.ecr_uri: str = None
@@ -63,52 +103,88 @@ class StackOutput:
         self.security_group_name: str = None
         self.instance_profile_name: str = None
 
-    def validate(self, name):
-        ecs_client = boto3.client("ecs")
-        cloudformation_client = boto3.client("cloudformation")
+    @staticmethod
+    def stack_version(stack: dict) -> str:
+        updated = stack.get("LastUpdatedTime") or stack.get("CreationTime")
+        return f"{stack['StackId']}@{updated}"
+
+    def load(self, outputs: list):
+        values = {op["OutputKey"]: op["OutputValue"] for op in outputs}
+        for key, attr in StackOutput.OUTPUTS.items():
+            setattr(self, attr, values.get(key))
+        for attr, description in StackOutput.REQUIRED.items():
+            if not getattr(self, attr):
+                log_err(f"{description} not found in the stack output.")
+
+    def to_dict(self) -> dict:
+        return {attr: getattr(self, attr) for attr in StackOutput.OUTPUTS.values()}
+
+    @staticmethod
+    def from_dict(outputs: dict) -> "StackOutput":
+        stack_op = StackOutput()
+        for attr, value in outputs.items():
+            setattr(stack_op, attr, value)
+        return stack_op
+
+    @staticmethod
+    def _describe(cloudformation_client, stack_name: str) -> dict:
+        response = cloudformation_client.describe_stacks(StackName=stack_name)
+        assert (
+            "Stacks" in response
+        ), f'"Stack" key not found in the Cloudformation stack "{stack_name}"'
+        assert (
+            len(response["Stacks"]) > 0
+        ), f'Stack not found in the Cloudformation stack "{stack_name}"'
+        stack = response["Stacks"][0]
+        assert (
+            "Outputs" in stack
+        ), f'"Outputs" key not found in the Cloudformation stack "{stack_name}",\
+              please wait for sometime after creating an app and try again'
+        return stack
+
+    @staticmethod
+    def _describe_app(cloudformation_client, name: str) -> list:
+        """The app stack, or the layer stacks of an app created with `--layered`"""
+        attrs = Config.Attrs(name)
+        try:
+            stack_name = camelcase(f"{name}-app-stack")
+            return [StackOutput._describe(cloudformation_client, stack_name)]
+        except ClientError as e:
+            if "does not exist" not in str(e):
+                raise
+            try:
+                return [
+                    StackOutput._describe(
+                        cloudformation_client, camelcase(attrs.layer_stack_name(layer))
+                    )
+                    for layer in LAYERS
+                ]
+            except ClientError:
+                raise e
+
+    def validate(self, name, region: str = None):
+        ecs_client = get_client("ecs", region)
+        cloudformation_client = get_client("cloudformation", region)
         stack_name = camelcase(f"{name}-app-stack")
         try:
-            response = cloudformation_client.describe_stacks(StackName=stack_name)
-            assert (
-                "Stacks" in response
-            ), f'"Stack" key not found in the Cloudformation stack "{stack_name}"'
-            assert (
-                len(response["Stacks"]) > 0
-            ), f'Stack not found in the Cloudformation stack "{stack_name}"'
-            stack = response["Stacks"][0]
-            assert (
-                "Outputs" in stack
-            ), f'"Outputs" key not found in the Cloudformation stack "{stack_name}",\
-                  please wait for sometime after creating an app and try again'
-            outputs = stack["Outputs"]
-            for op in outputs:
-                if op["OutputKey"] == "ClusterName":
-                    self.ecs_cluster_name = op["OutputValue"]
-                if op["OutputKey"] == "ECRUri":
-                    self.ecr_uri = op["OutputValue"]
-                if op["OutputKey"] == "PublicSubnetNames":
-                    self.public_subnet_names = op["OutputValue"]
-                if op["OutputKey"] == "PrivateSubnetNames":
-                    self.private_subnet_names = op["OutputValue"]
-                if op["OutputKey"] == "SecurityGroupName":
-                    self.security_group_name = op["OutputValue"]
-                if op["OutputKey"] == "InstanceProfileName":
-                    self.instance_profile_name = op["OutputValue"]
-            if not self.ecs_cluster_name:
-                log_err(f"Cluster name not found in the stack output.")
-            if not self.ecr_uri:
-                log_err(f"Container Registry URI not found in the stack output.")
-            if not self.public_subnet_names:
-                log_err(f"Public Subnet names not found in the stack output.")
-            if not self.security_group_name:
-                log_err(f"Security Group name not found in the stack output.")
-            if not self.instance_profile_name:
-                log_err(f"Instance Profile name not found in the stack output.")
+            stacks = StackOutput._describe_app(cloudformation_client, name)
+            cache_key = f"{region}:{stack_name}"
+            version = ",".join(StackOutput.stack_version(stack) for stack in stacks)
+            cached = stack_output_cache.get(cache_key)
+            if cached and cached["version"] == version:
+                # Unchanged stacks, the outputs and the cluster were validated
+                for attr, value in cached["outputs"].items():
+                    setattr(self, attr, value)
+                return
+            self.load([op for stack in stacks for op in stack["Outputs"]])
             # Validating the cluster exist
             response = ecs_client.describe_clusters(clusters=[self.ecs_cluster_name])
             assert (
                 len(response["clusters"]) > 0
             ), f'Cluster with name "{self.ecs_cluster_name}" not found'
+            stack_output_cache.set(
+                cache_key, {"version": version, "outputs": self.to_dict()}
+            )
         except AssertionError as e:
             log_err(f"Assertion error: {e}")
             raise e
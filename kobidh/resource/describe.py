@@ -0,0 +1,77 @@
+"""
+Streaming `apps.describe` output.
+
+Stack resources are read page by page with `list_stack_resources` and written
+as soon as each page arrives, so large stacks start printing immediately and
+memory does not grow with the stack.
+"""
+
+import json
+from click import echo
+from kobidh.utils.logging import log, log_bold
+
+TABLE_COLUMNS = (
+    ("LogicalResourceId", 40),
+    ("ResourceType", 40),
+    ("ResourceStatus", 28),
+    ("PhysicalResourceId", 0),
+)
+
+
+def stack_resources(client, stack_name: str):
+    """Yield the resource summaries of `stack_name`, one page at a time"""
+    paginator = client.get_paginator("list_stack_resources")
+    for page in paginator.paginate(StackName=stack_name):
+        yield from page["StackResourceSummaries"]
+
+
+def _row(resource: dict) -> str:
+    return " ".join(
+        f"{str(resource.get(key, '-')):<{width}}" if width else str(resource.get(key))
+        for key, width in TABLE_COLUMNS
+    )
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def write_resources(resources, output: str = "table", stack: dict = None):
+    """
+    Write `resources` (any iterable) as they are produced.
+
+    `json` writes one array, `ndjson` one object per line; both use ISO
+    timestamps. `table` prints the stack status first when `stack` is given.
+    """
+    if output == "ndjson":
+        for resource in resources:
+            echo(json.dumps(resource, default=_json_default))
+    elif output == "json":
+        echo("[", nl=False)
+        for index, resource in enumerate(resources):
+            separator = ",\n  " if index else "\n  "
+            echo(separator + json.dumps(resource, default=_json_default), nl=False)
+        echo("\n]")
+    else:
+        if stack:
+            log_bold(f"Stack {stack['StackName']}: {stack['StackStatus']}")
+        log_bold(_row({key: key for key, _ in TABLE_COLUMNS}))
+        for resource in resources:
+            log(_row(resource))
+
+
+def write_templates(client, stack_names: list):
+    """Write one `{stack name: template}` document, a stack at a time"""
+    echo("{", nl=False)
+    for index, stack_name in enumerate(stack_names):
+        response = client.get_template(StackName=stack_name, TemplateStage="Original")
+        body = response["TemplateBody"]
+        if isinstance(body, str):
+            body = json.loads(body)
+        template = json.dumps(body, indent=2, default=_json_default)
+        separator = ",\n  " if index else "\n  "
+        echo(
+            f"{separator}{json.dumps(stack_name)}: " + template.replace("\n", "\n  "),
+            nl=False,
+        )
+    echo("\n}")
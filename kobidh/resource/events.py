@@ -0,0 +1,180 @@
+import random
+import time
+from kobidh.constants import (
+    CLOUDFORMATION_TIMEOUT,
+    STACK_EVENTS_MAX_DELAY,
+    STACK_EVENTS_MIN_DELAY,
+)
+from kobidh.exceptions import CloudFormationError
+from kobidh.utils.logging import log, log_bold, log_err, log_intent, log_intent_err
+
+OPERATION_START_STATUSES = (
+    "CREATE_IN_PROGRESS",
+    "UPDATE_IN_PROGRESS",
+    "DELETE_IN_PROGRESS",
+)
+
+
+def is_terminal(status: str) -> bool:
+    return not status.endswith("_IN_PROGRESS")
+
+
+def is_failure(status: str) -> bool:
+    return "FAILED" in status or "ROLLBACK" in status
+
+
+def resource_timings(events: list) -> dict:
+    """
+    Start, end and final status of every resource in `events` (oldest first).
+
+    Returns:
+        {logical id: {"type", "status", "start", "end"}}, "end" is None for
+        resources still in progress.
+    """
+    timings = {}
+    for event in events:
+        timing = timings.setdefault(
+            event["LogicalResourceId"],
+            {
+                "type": event["ResourceType"],
+                "status": None,
+                "start": event["Timestamp"],
+                "end": None,
+            },
+        )
+        timing["status"] = event["ResourceStatus"]
+        terminal = is_terminal(event["ResourceStatus"])
+        timing["end"] = event["Timestamp"] if terminal else None
+    return timings
+
+
+def log_timings(timings: dict):
+    """Print a duration table, slowest resource first."""
+    rows = []
+    for logical_id, timing in timings.items():
+        duration = (
+            (timing["end"] - timing["start"]).total_seconds() if timing["end"] else None
+        )
+        rows.append((logical_id, timing["type"], timing["status"], duration))
+    rows.sort(key=lambda row: -1 if row[3] is None else row[3], reverse=True)
+    log_bold(f"{'Resource':<40} {'Type':<40} {'Status':<28} {'Duration':>9}")
+    for logical_id, resource_type, status, duration in rows:
+        took = f"{duration:.1f}s" if duration is not None else "-"
+        log(f"{logical_id:<40} {resource_type:<40} {status:<28} {took:>9}")
+
+
+def last_operation_events(client, stack_id: str) -> list:
+    """Events of the most recent operation on the stack, oldest first."""
+    return StackEventWaiter(client, stack_id).read_new_events()
+
+
+class StackEventWaiter:
+    """
+    Streams the events of one stack operation until the stack settles.
+
+    Only events newer than the last seen one are read on each poll, and the
+    poll interval backs off with jitter while nothing happens.
+    """
+
+    def __init__(
+        self,
+        client,
+        stack_id: str,
+        client_request_token: str = None,
+        timeout: int = CLOUDFORMATION_TIMEOUT,
+    ):
+        self.client = client
+        self.stack_id = stack_id
+        self.client_request_token = client_request_token
+        self.timeout = timeout
+        self.events = []
+        self._last_event_id = None
+
+    def _is_own(self, event: dict) -> bool:
+        token = event.get("ClientRequestToken")
+        return (
+            not token
+            or not self.client_request_token
+            or (token == self.client_request_token)
+        )
+
+    def _is_operation_start(self, event: dict) -> bool:
+        return (
+            event["PhysicalResourceId"] == self.stack_id
+            and event["ResourceStatus"] in OPERATION_START_STATUSES
+            and event.get("ResourceStatusReason") == "User Initiated"
+        )
+
+    def read_new_events(self) -> list:
+        """Events of this operation since the previous call, oldest first."""
+        events = []
+        paginator = self.client.get_paginator("describe_stack_events")
+        # Events are returned newest first, stop at the last seen event or at
+        # the start of this operation
+        for page in paginator.paginate(StackName=self.stack_id):
+            for event in page["StackEvents"]:
+                if event["EventId"] == self._last_event_id or not self._is_own(event):
+                    return self._seen(events)
+                events.append(event)
+                if self._is_operation_start(event):
+                    return self._seen(events)
+        return self._seen(events)
+
+    def _seen(self, events: list) -> list:
+        events.reverse()
+        if events:
+            self._last_event_id = events[-1]["EventId"]
+            self.events.extend(events)
+        return events
+
+    def wait(self) -> str:
+        """
+        Returns:
+            The final stack status
+
+        Raises:
+            CloudFormationError: If the stack does not settle within `timeout`
+        """
+        started = time.monotonic()
+        delay = STACK_EVENTS_MIN_DELAY
+        while True:
+            stack_status = None
+            events = self.read_new_events()
+            for event in events:
+                status = event["ResourceStatus"]
+                line = (
+                    f"{event['LogicalResourceId']} ({event['ResourceType']}): {status}"
+                )
+                if event.get("ResourceStatusReason") and is_failure(status):
+                    line += f" - {event['ResourceStatusReason']}"
+                (log_intent_err if is_failure(status) else log_intent)(line)
+                if event["PhysicalResourceId"] == self.stack_id:
+                    stack_status = status
+            if stack_status and is_terminal(stack_status):
+                break
+            if time.monotonic() - started > self.timeout:
+                raise CloudFormationError(
+                    self.stack_id, f"Timed out after {self.timeout}s", "TIMEOUT"
+                )
+            # Poll again quickly while resources are moving, back off otherwise
+            delay = (
+                STACK_EVENTS_MIN_DELAY
+                if events
+                else min(delay * 2, STACK_EVENTS_MAX_DELAY)
+            )
+            time.sleep(random.uniform(delay / 2, delay))
+
+        timings = resource_timings(self.events)
+        timings.pop(self._stack_logical_id(), None)
+        log_timings(timings)
+        total = self.events[-1]["Timestamp"] - self.events[0]["Timestamp"]
+        (log_err if is_failure(stack_status) else log_bold)(
+            f"Stack finished with {stack_status} in {total.total_seconds():.1f}s"
+        )
+        return stack_status
+
+    def _stack_logical_id(self):
+        for event in self.events:
+            if event["PhysicalResourceId"] == self.stack_id:
+                return event["LogicalResourceId"]
+        return None
@@ -0,0 +1,187 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from kobidh.constants import FACTS_MAX_WORKERS
+from kobidh.exceptions import ConfigurationError
+
+SNAPSHOT_VERSION = 1
+EXECUTION_ROLE_NAME = "ecsTaskExecutionRole"
+FACT_NAMES = ("azs", "services", "image", "execution_role_arn", "stack_outputs")
+# Facts each template depends on
+INFRA_FACTS = ("azs", "services")
+PROVISION_FACTS = ("image", "execution_role_arn", "stack_outputs")
+
+
+def _lookup_azs(region: str) -> list:
+    from kobidh.resource.infra.vpc_config import get_azs
+
+    return get_azs(region)
+
+
+def _lookup_services(name: str, region: str) -> list:
+    from kobidh.resource.infra.ecr_config import deployed_services
+
+    return deployed_services(name, region)
+
+
+def _lookup_image(region: str) -> dict:
+    from kobidh.resource.provision.ami import AMIResolver
+
+    return AMIResolver().resolve(region)
+
+
+def _lookup_execution_role_arn() -> str:
+    from kobidh.utils.clients import get_client
+
+    response = get_client("iam").get_role(RoleName=EXECUTION_ROLE_NAME)
+    return response["Role"]["Arn"]
+
+
+def _lookup_stack_outputs(name: str, region: str) -> dict:
+    from kobidh.resource.config import StackOutput
+
+    stack_op = StackOutput()
+    stack_op.validate(name, region)
+    return stack_op.to_dict()
+
+
+class Facts:
+    """
+    External facts the templates are rendered from.
+
+    Every fact left as None is looked up from AWS while the template is
+    configured. A snapshot recorded with `Facts.collect` and `Facts.save` lets
+    templates be rendered again without any AWS call.
+    """
+
+    def __init__(
+        self,
+        azs: list = None,
+        services: list = None,
+        image: dict = None,
+        execution_role_arn: str = None,
+        stack_outputs: dict = None,
+    ):
+        # Availability zones of the region (VPCConfig)
+        self.azs = azs
+        # Services with a deployed image repository (ECRConfig)
+        self.services = services
+        # ECS optimized AMI record (AutoScalingConfig)
+        self.image = image
+        # Task execution role (ServiceConfig)
+        self.execution_role_arn = execution_role_arn
+        # App stack outputs (StackOutput)
+        self.stack_outputs = stack_outputs
+
+    def to_dict(self) -> dict:
+        return {
+            "azs": self.azs,
+            "services": self.services,
+            "image": self.image,
+            "execution_role_arn": self.execution_role_arn,
+            "stack_outputs": self.stack_outputs,
+        }
+
+    @staticmethod
+    def from_dict(facts: dict) -> "Facts":
+        return Facts(**{k: facts.get(k) for k in FACT_NAMES})
+
+    def missing(self, *names: str) -> list:
+        return [name for name in names if getattr(self, name) is None]
+
+    def gather(
+        self,
+        name: str,
+        region: str,
+        names: tuple = FACT_NAMES,
+        optional: tuple = (),
+        max_workers: int = FACTS_MAX_WORKERS,
+    ) -> "Facts":
+        """
+        Look up the facts in `names` that are still unset.
+
+        The lookups are independent, so they run concurrently on a bounded
+        thread pool and the wall time is that of the slowest one.
+
+        Args:
+            name: Application name
+            region: AWS region
+            names: Facts to look up
+            optional: Facts left as None when the lookup fails (e.g. the
+                stack outputs of an app that was not created yet)
+            max_workers: Thread pool size
+
+        Raises:
+            The lookup error of a fact that is not optional. A failed zone
+            lookup stops `apps.create` instead of rendering a VPC without
+            subnets.
+        """
+        from botocore.exceptions import ClientError
+
+        lookups = {
+            "azs": lambda: _lookup_azs(region),
+            "services": lambda: _lookup_services(name, region),
+            "image": lambda: _lookup_image(region),
+            "execution_role_arn": _lookup_execution_role_arn,
+            "stack_outputs": lambda: _lookup_stack_outputs(name, region),
+        }
+        missing = self.missing(*names)
+        if not missing:
+            return self
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+            futures = {fact: pool.submit(lookups[fact]) for fact in missing}
+        for fact, future in futures.items():
+            try:
+                setattr(self, fact, future.result())
+            except (AssertionError, ClientError):
+                if fact not in optional:
+                    raise
+        return self
+
+    @staticmethod
+    def collect(name: str, region: str, azs: list = None) -> "Facts":
+        """
+        Look up every fact from AWS. The app stack outputs are only recorded
+        when the app exists.
+        """
+        return Facts(azs=azs).gather(name, region, optional=("stack_outputs",))
+
+    def save(self, path: str, name: str, region: str):
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "app": name,
+            "region": region,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "facts": self.to_dict(),
+        }
+        with open(path, "w") as file:
+            json.dump(snapshot, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    @staticmethod
+    def load(path: str) -> dict:
+        """
+        Read a snapshot file.
+
+        Returns:
+            The snapshot with its "facts" converted to `Facts`
+
+        Raises:
+            ConfigurationError: If the file is missing or of another version
+        """
+        try:
+            with open(path, "r") as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            raise ConfigurationError(
+                f'Facts snapshot "{path}" not found',
+                "Record one with 'kobidh synth <name> --record'",
+            )
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ConfigurationError(
+                f'Facts snapshot "{path}" has version {snapshot.get("version")}, '
+                f"expected {SNAPSHOT_VERSION}",
+                "Record it again with 'kobidh synth <name> --record'",
+            )
+        snapshot["facts"] = Facts.from_dict(snapshot["facts"])
+        return snapshot
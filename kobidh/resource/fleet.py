@@ -0,0 +1,184 @@
+"""
+Fleet wide view of every kobidh app in a region.
+
+All app stacks are found in one paginated `describe_stacks` sweep by their
+`Publisher=kobidh` tag, then the clusters and services are described in
+batches of the API maximum (100 clusters, 10 services per cluster) instead of
+one call per app.
+"""
+
+from kobidh.resource.stack import APP_TAG, PUBLISHER, PUBLISHER_TAG, ROLE_TAG
+from kobidh.resource.stack import stack_tags
+from kobidh.utils.format import camelcase
+from kobidh.utils.logging import log, log_bold, log_warning
+
+# API limits of the batched describe calls
+DESCRIBE_CLUSTERS_BATCH = 100
+DESCRIBE_SERVICES_BATCH = 10
+# Stacks that hold the app cluster
+CLUSTER_ROLES = ("app", "cluster")
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _outputs(stack: dict) -> dict:
+    return {op["OutputKey"]: op["OutputValue"] for op in stack.get("Outputs", [])}
+
+
+def find_apps(cloudformation_client) -> dict:
+    """
+    Returns:
+        {app name: {role: stack}} for every stack tagged `Publisher=kobidh`
+    """
+    apps = {}
+    paginator = cloudformation_client.get_paginator("describe_stacks")
+    for page in paginator.paginate():
+        for stack in page["Stacks"]:
+            tags = stack_tags(stack)
+            if tags.get(PUBLISHER_TAG) != PUBLISHER or APP_TAG not in tags:
+                continue
+            apps.setdefault(tags[APP_TAG], {})[tags.get(ROLE_TAG, "app")] = stack
+    return apps
+
+
+def describe_clusters(ecs_client, names: list) -> dict:
+    """{cluster name: cluster}, 100 clusters per call"""
+    clusters = {}
+    for batch in _batches(sorted(set(names)), DESCRIBE_CLUSTERS_BATCH):
+        response = ecs_client.describe_clusters(clusters=batch)
+        for cluster in response["clusters"]:
+            clusters[cluster["clusterName"]] = cluster
+    return clusters
+
+
+def describe_services(ecs_client, services: dict) -> dict:
+    """
+    Args:
+        services: {cluster name: [service names]}
+
+    Returns:
+        {(cluster name, service name): service}, 10 services per call
+    """
+    described = {}
+    for cluster, names in sorted(services.items()):
+        for batch in _batches(sorted(set(names)), DESCRIBE_SERVICES_BATCH):
+            response = ecs_client.describe_services(cluster=cluster, services=batch)
+            for service in response["services"]:
+                described[(cluster, service["serviceName"])] = service
+    return described
+
+
+def _stack_status(stacks: dict) -> str:
+    """The least settled status among the app stacks"""
+    statuses = [stack["StackStatus"] for stack in stacks.values()]
+    for status in statuses:
+        if "FAILED" in status or "ROLLBACK" in status:
+            return status
+    for status in statuses:
+        if status.endswith("_IN_PROGRESS"):
+            return status
+    return statuses[0]
+
+
+def _summaries(found: dict) -> list:
+    apps = []
+    for name, stacks in sorted(found.items()):
+        updated = max(
+            stack.get("LastUpdatedTime") or stack["CreationTime"]
+            for stack in stacks.values()
+        )
+        apps.append(
+            {
+                "name": name,
+                "stacks": sorted(stacks),
+                "stack_status": _stack_status(stacks),
+                "updated": updated,
+            }
+        )
+    return apps
+
+
+def list_apps(cloudformation_client) -> list:
+    """Name, stacks and overall stack status of every app"""
+    return _summaries(find_apps(cloudformation_client))
+
+
+def fleet_status(cloudformation_client, ecs_client) -> list:
+    """`list_apps` enriched with the state of each app cluster and service"""
+    found = find_apps(cloudformation_client)
+    cluster_names, service_names = {}, {}
+    for name, stacks in found.items():
+        for role in CLUSTER_ROLES:
+            cluster = _outputs(stacks.get(role, {})).get("ClusterName")
+            if cluster:
+                cluster_names[name] = cluster
+        if name in cluster_names and "service" in stacks:
+            service_names.setdefault(cluster_names[name], []).append(
+                camelcase(f"{name}-service")
+            )
+    clusters = describe_clusters(ecs_client, list(cluster_names.values()))
+    services = describe_services(ecs_client, service_names)
+
+    apps = []
+    for app in _summaries(found):
+        name = app["name"]
+        cluster = clusters.get(cluster_names.get(name))
+        service = services.get((cluster_names.get(name), camelcase(f"{name}-service")))
+        app["cluster"] = (
+            {
+                "name": cluster["clusterName"],
+                "status": cluster["status"],
+                "instances": cluster["registeredContainerInstancesCount"],
+            }
+            if cluster
+            else None
+        )
+        app["service"] = (
+            {
+                "name": service["serviceName"],
+                "status": service["status"],
+                "desired": service["desiredCount"],
+                "running": service["runningCount"],
+                "pending": service["pendingCount"],
+                "deployments": len(service.get("deployments", [])),
+            }
+            if service
+            else None
+        )
+        apps.append(app)
+    return apps
+
+
+def log_apps(apps: list):
+    if not apps:
+        log_warning("No kobidh apps found")
+        return
+    log_bold(f"{'App':<30} {'Stacks':<40} {'Status':<28} Updated")
+    for app in apps:
+        log(
+            f"{app['name']:<30} {','.join(app['stacks']):<40} "
+            f"{app['stack_status']:<28} {app['updated']:%Y-%m-%d %H:%M}"
+        )
+
+
+def log_status(apps: list):
+    if not apps:
+        log_warning("No kobidh apps found")
+        return
+    log_bold(
+        f"{'App':<30} {'Stack':<28} {'Cluster':<10} {'Instances':>9} "
+        f"{'Service':<10} {'Tasks':>9} {'Deployments':>11}"
+    )
+    for app in apps:
+        cluster, service = app["cluster"], app["service"]
+        tasks = f"{service['running']}/{service['desired']}" if service else "-"
+        log(
+            f"{app['name']:<30} {app['stack_status']:<28} "
+            f"{cluster['status'] if cluster else '-':<10} "
+            f"{cluster['instances'] if cluster else '-':>9} "
+            f"{service['status'] if service else '-':<10} {tasks:>9} "
+            f"{service['deployments'] if service else '-':>11}"
+        )
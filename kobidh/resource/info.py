@@ -0,0 +1,193 @@
+"""
+Aggregate status of one app (`kobidh apps.info`).
+
+The stack, cluster, service, latest image and task definition are looked up
+concurrently. The cluster name comes from the cached stack outputs when they
+are known, so usually every lookup starts at once and the summary takes a
+single round trip.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from kobidh.constants import DEFAULT_SERVICE, INFO_MAX_WORKERS
+from kobidh.resource.config import LAYERS, Config, stack_output_cache
+from kobidh.resource.fleet import describe_clusters, describe_services
+from kobidh.utils.clients import get_client
+from kobidh.utils.format import camelcase
+from kobidh.utils.logging import log_bold, log_err, log_intent
+
+
+def app_stacks(name: str, region: str) -> dict:
+    """{role: stack} of the app stack, or the layer stacks of a layered app"""
+    client = get_client("cloudformation", region)
+    attrs = Config.Attrs(name)
+    try:
+        stack_name = camelcase(f"{name}-app-stack")
+        return {"app": client.describe_stacks(StackName=stack_name)["Stacks"][0]}
+    except ClientError as e:
+        if "does not exist" not in str(e):
+            raise
+    stacks = {}
+    for layer in LAYERS:
+        try:
+            response = client.describe_stacks(
+                StackName=camelcase(attrs.layer_stack_name(layer))
+            )
+            stacks[layer] = response["Stacks"][0]
+        except ClientError as e:
+            if "does not exist" not in str(e):
+                raise
+    if not stacks:
+        raise ClientError(
+            {
+                "Error": {
+                    "Code": "ValidationError",
+                    "Message": f'Stack "{stack_name}" does not exist',
+                }
+            },
+            "DescribeStacks",
+        )
+    return stacks
+
+
+def _outputs(stacks: dict) -> dict:
+    return {
+        op["OutputKey"]: op["OutputValue"]
+        for stack in stacks.values()
+        for op in stack.get("Outputs", [])
+    }
+
+
+def _cluster(name: str, region: str, cluster_name: str) -> dict:
+    cluster = describe_clusters(get_client("ecs", region), [cluster_name])
+    return cluster.get(cluster_name)
+
+
+def _service(name: str, region: str, cluster_name: str) -> dict:
+    service_name = camelcase(f"{name}-service")
+    services = describe_services(
+        get_client("ecs", region), {cluster_name: [service_name]}
+    )
+    service = services.get((cluster_name, service_name))
+    return service if service and service["status"] != "INACTIVE" else None
+
+
+def _latest_image(name: str, region: str) -> dict:
+    attrs = Config.Attrs(name)
+    paginator = get_client("ecr", region).get_paginator("describe_images")
+    latest = None
+    for page in paginator.paginate(
+        repositoryName=f"{attrs.ecr_name}/{DEFAULT_SERVICE}",
+        filter={"tagStatus": "TAGGED"},
+    ):
+        for image in page["imageDetails"]:
+            if latest is None or image["imagePushedAt"] > latest["imagePushedAt"]:
+                latest = image
+    return latest
+
+
+def _task_definition(name: str, region: str) -> dict:
+    family = camelcase(f"{name}-task")
+    try:
+        response = get_client("ecs", region).describe_task_definition(
+            taskDefinition=family
+        )
+    except ClientError as e:
+        if "Unable to describe task definition" in str(e):
+            return None
+        raise
+    return response["taskDefinition"]
+
+
+def app_info(name: str, region: str, max_workers: int = INFO_MAX_WORKERS) -> dict:
+    """
+    Returns:
+        {"stacks", "outputs", "cluster", "service", "image", "task_definition"}
+        with None for parts that do not exist, and {"errors": {part: message}}
+        for lookups that failed
+    """
+    cached = stack_output_cache.get(f"{region}:{camelcase(f'{name}-app-stack')}")
+    cluster_name = cached["outputs"].get("ecs_cluster_name") if cached else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            "stacks": pool.submit(app_stacks, name, region),
+            "image": pool.submit(_latest_image, name, region),
+            "task_definition": pool.submit(_task_definition, name, region),
+        }
+        if cluster_name:
+            futures["cluster"] = pool.submit(_cluster, name, region, cluster_name)
+            futures["service"] = pool.submit(_service, name, region, cluster_name)
+
+        info, errors = {}, {}
+        for part, future in futures.items():
+            try:
+                info[part] = future.result()
+            except Exception as e:
+                errors[part] = str(e)
+                info[part] = None
+        if "stacks" in errors:
+            raise ClientError(
+                {"Error": {"Code": "ValidationError", "Message": errors["stacks"]}},
+                "DescribeStacks",
+            )
+
+        info["outputs"] = _outputs(info["stacks"])
+        stack_cluster = info["outputs"].get("ClusterName")
+        if stack_cluster and stack_cluster != cluster_name:
+            # Not cached yet (or stale), the cluster is looked up second
+            for part, lookup in (("cluster", _cluster), ("service", _service)):
+                futures[part] = pool.submit(lookup, name, region, stack_cluster)
+            for part in ("cluster", "service"):
+                try:
+                    info[part] = futures[part].result()
+                    errors.pop(part, None)
+                except Exception as e:
+                    errors[part] = str(e)
+                    info[part] = None
+    info.setdefault("cluster", None)
+    info.setdefault("service", None)
+    info["errors"] = errors
+    return info
+
+
+def log_info(name: str, info: dict):
+    log_bold(f'App "{name}"')
+    for role, stack in info["stacks"].items():
+        log_intent(f"Stack ({role}): {stack['StackName']} {stack['StackStatus']}")
+    for key, value in sorted(info["outputs"].items()):
+        log_intent(f"{key}: {value}", level=2)
+
+    cluster = info["cluster"]
+    if cluster:
+        log_intent(
+            f"Cluster: {cluster['clusterName']} {cluster['status']}, "
+            f"{cluster['registeredContainerInstancesCount']} instance(s), "
+            f"{cluster['runningTasksCount']} running task(s)"
+        )
+    service = info["service"]
+    if service:
+        log_intent(
+            f"Service: {service['serviceName']} {service['status']}, "
+            f"running {service['runningCount']}, pending {service['pendingCount']}, "
+            f"desired {service['desiredCount']}, "
+            f"{len(service.get('deployments', []))} deployment(s)"
+        )
+    else:
+        log_intent("Service: not provisioned")
+    task_definition = info["task_definition"]
+    if task_definition:
+        log_intent(
+            f"Task definition: {task_definition['family']}:"
+            f"{task_definition['revision']}"
+        )
+    image = info["image"]
+    if image:
+        log_intent(
+            f"Latest image: {', '.join(image.get('imageTags', []))} "
+            f"{image['imageDigest']} (pushed {image['imagePushedAt']:%Y-%m-%d %H:%M})"
+        )
+    else:
+        log_intent("Latest image: none pushed")
+    for part, message in info["errors"].items():
+        log_err(f"Could not look up {part}: {message}")
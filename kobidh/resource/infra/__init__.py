@@ -1,19 +1,80 @@
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from troposphere import Export
 from kobidh.utils.format import camelcase
 from botocore.exceptions import ClientError
-from kobidh.resource.config import Config
+from kobidh.constants import DEFAULT_SERVICE, LAYERS_MAX_WORKERS
+from kobidh.exceptions import ConfigurationError
+from kobidh.resource.config import Config, LAYERS
+from kobidh.resource.facts import Facts, INFRA_FACTS
 from kobidh.resource.infra.vpc_config import VPCConfig
 from kobidh.resource.infra.iam_config import IAMConfig
 from kobidh.resource.infra.ecr_config import ECRConfig
 from kobidh.resource.infra.ecs_config import ECSConfig
-from kobidh.utils.logging import log, log_err, log_warning
+from kobidh.resource.stack import app_tags, deploy_stack
+from kobidh.utils.logging import in_context, log, log_bold, log_err, log_warning
+from kobidh.utils.clients import get_client
+
+# Layer -> resource configuration. No layer references another one (the
+# service stack consumes their outputs), so all of them deploy concurrently.
+LAYER_CONFIGS = {
+    "network": VPCConfig,
+    "identity": IAMConfig,
+    "registry": ECRConfig,
+    "cluster": ECSConfig,
+}
+LAYER_DESCRIPTIONS = {
+    "network": "CloudFormation template to manage application network",
+    "identity": "CloudFormation template to manage application IAM roles",
+    "registry": "CloudFormation template to manage application container registry",
+    "cluster": "CloudFormation template to manage application ECS cluster",
+}
+
+
+def _stack_exists(client, stack_name: str) -> bool:
+    try:
+        client.describe_stacks(StackName=stack_name)
+    except ClientError as e:
+        if "does not exist" not in str(e):
+            raise
+        return False
+    return True
+
+
+def _services(facts: Facts, services: list = None, remove: tuple = ()) -> list:
+    """
+    Services to keep a repository for: the deployed ones and `services`,
+    except the ones in `remove`. Deployed repositories are only dropped when
+    asked to, CloudFormation would delete them along with their images.
+    """
+    if DEFAULT_SERVICE in remove:
+        raise ConfigurationError(
+            f'The "{DEFAULT_SERVICE}" repository can not be removed',
+            "Delete the app to remove it",
+        )
+    deployed = facts.services or []
+    for service in remove:
+        if service not in deployed:
+            log_warning(f'Service "{service}" has no repository, nothing to remove')
+    return [
+        service
+        for service in dict.fromkeys([*deployed, *(services or [])])
+        if service not in remove
+    ]
 
 
 class Infra:
 
     @staticmethod
-    def configure(name: str, region: str = None) -> Config:
-        config = Config(name, region)
+    def configure(
+        name: str,
+        region: str = None,
+        facts: Facts = None,
+        services: list = None,
+        remove_services: tuple = (),
+    ) -> Config:
+        facts = (facts or Facts()).gather(name, region, INFRA_FACTS)
+        services = _services(facts, services, remove_services)
+        config = Config(name, region, facts, services)
         config.template.set_description(
             "CloudFormation template to manage application infrastructure"
         )
@@ -32,69 +93,221 @@ class Infra:
 
         return config
 
+    @staticmethod
+    def configure_layers(
+        name: str,
+        region: str = None,
+        facts: Facts = None,
+        services: list = None,
+        remove_services: tuple = (),
+    ) -> dict:
+        """
+        Configure one template per layer in `LAYERS` instead of the single app
+        stack. Every output is exported as `<Name>-<OutputKey>` so other
+        stacks can import it.
+
+        Returns:
+            {layer: Config}
+        """
+        facts = (facts or Facts()).gather(name, region, INFRA_FACTS)
+        services = _services(facts, services, remove_services)
+        configs = {}
+        for layer in LAYERS:
+            resource_config = LAYER_CONFIGS[layer]
+            config = Config(name, region, facts, services)
+            config.template.set_description(LAYER_DESCRIPTIONS[layer])
+            resource_config(config)._configure()
+            for key, output in config.template.outputs.items():
+                output.Export = Export(f"{camelcase(name)}-{key}")
+            configs[layer] = config
+        return configs
+
+    @staticmethod
+    def apply_layers(
+        name: str,
+        region: str,
+        configs: dict,
+        wait: bool = False,
+        max_workers: int = LAYERS_MAX_WORKERS,
+    ):
+        """
+        Deploy the layer stacks concurrently. Unchanged layers are skipped by
+        their template fingerprint.
+
+        Raises:
+            ConfigurationError: If the app is deployed as the single app stack
+        """
+        cloud_client = get_client("cloudformation", region)
+        app_stack_name = camelcase(f"{name}-app-stack")
+        if _stack_exists(cloud_client, app_stack_name):
+            raise ConfigurationError(
+                f'App "{name}" is deployed as the single stack "{app_stack_name}"',
+                "Delete the app before creating it with --layered",
+            )
+
+        attrs = Config.Attrs(name)
+        log(f"Deploying layers: {', '.join(configs)}")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(configs))) as pool:
+            futures = {
+                layer: pool.submit(
+                    in_context(deploy_stack),
+                    cloud_client,
+                    camelcase(attrs.layer_stack_name(layer)),
+                    config.template,
+                    wait=wait,
+                    tags=app_tags(name, layer),
+                )
+                for layer, config in configs.items()
+            }
+        return {layer: future.result() for layer, future in futures.items()}
+
+    @staticmethod
+    def list(region: str = None, status: bool = False):
+        from kobidh.resource import fleet
+
+        cloud_client = get_client("cloudformation", region)
+        if not status:
+            apps = fleet.list_apps(cloud_client)
+            fleet.log_apps(apps)
+            return apps
+        apps = fleet.fleet_status(cloud_client, get_client("ecs", region))
+        fleet.log_status(apps)
+        return apps
+
     @staticmethod
     def info(name: str, region: str = None):
-        return
+        from kobidh.resource.info import app_info, log_info
+
+        try:
+            info = app_info(name, region)
+        except ClientError as e:
+            if "does not exist" in str(e):
+                log(f'App "{name}" does not exist...')
+                return None
+            log_err(f"Unexpected error: {e}")
+            raise
+        log_info(name, info)
+        return info
 
     @staticmethod
-    def describe(name: str, region: str = None):
-        cloud_client = boto3.client("cloudformation", region_name=region)
-        stack_name = camelcase(f"{name}-app-stack")
+    def describe(
+        name: str, region: str = None, output: str = "table", template: bool = False
+    ):
+        from itertools import chain
+        from kobidh.resource.describe import (
+            stack_resources,
+            write_resources,
+            write_templates,
+        )
+        from kobidh.resource.info import app_stacks
+
+        cloud_client = get_client("cloudformation", region)
         try:
-            # Check if the stack exists
-            stacks = cloud_client.describe_stacks(StackName=stack_name)
-            log(stacks["Stacks"][0])
-            response = cloud_client.get_template(
-                StackName=stack_name, TemplateStage="Processed"
-            )
-            log(response)
+            stacks = app_stacks(name, region)
         except ClientError as e:
-            # If stack does not exist, create it
             if "does not exist" in str(e):
                 log(f'App "{name}" does not exist...')
-            else:
-                log_err(f"Unexpected error: {e}")
-                raise
+                return
+            log_err(f"Unexpected error: {e}")
+            raise
+        if template:
+            write_templates(cloud_client, [s["StackName"] for s in stacks.values()])
+            return
+        if output != "table":
+            # One document for all the stacks of a layered app
+            write_resources(
+                chain.from_iterable(
+                    stack_resources(cloud_client, stack["StackName"])
+                    for stack in stacks.values()
+                ),
+                output,
+            )
+            return
+        for stack in stacks.values():
+            write_resources(
+                stack_resources(cloud_client, stack["StackName"]), output, stack
+            )
 
     @staticmethod
-    def apply(name: str, region: str, template):
-        cloud_client = boto3.client("cloudformation", region_name=region)
+    def timeline(name: str, region: str = None) -> dict:
+        """
+        Critical path of the last operation on the app stack, or on every
+        layer stack of a layered app.
+
+        Returns:
+            {stack name: report}, see `stack_timeline`
+        """
+        from kobidh.resource.timeline import log_timeline, stack_timeline
+
+        cloud_client = get_client("cloudformation", region)
         stack_name = camelcase(f"{name}-app-stack")
-        response = None
-        try:
-            # Check if the stack exists
-            cloud_client.describe_stacks(StackName=stack_name)
-            log(f"Stack {stack_name} exists. Updating it...")
-
-            # Update the existing stack
-            response = cloud_client.update_stack(
-                StackName=stack_name,
-                TemplateBody=template.to_json(),
-                Capabilities=["CAPABILITY_NAMED_IAM"],
+        if _stack_exists(cloud_client, stack_name):
+            stack_names = [stack_name]
+        else:
+            attrs = Config.Attrs(name)
+            layer_stacks = [camelcase(attrs.layer_stack_name(x)) for x in LAYERS]
+            stack_names = [s for s in layer_stacks if _stack_exists(cloud_client, s)]
+            if not stack_names:
+                raise ConfigurationError(
+                    f'App "{name}" does not exist',
+                    "Create it with 'kobidh apps.create'",
+                )
+        reports = {}
+        for stack_name in stack_names:
+            if len(stack_names) > 1:
+                log_bold(f"\n{stack_name}")
+            reports[stack_name] = stack_timeline(cloud_client, stack_name)
+            log_timeline(reports[stack_name])
+        if len(reports) > 1:
+            # Layers deploy concurrently, the slowest one bounds the operation
+            slowest = max(reports, key=lambda s: reports[s]["elapsed"])
+            log_bold(
+                f"\nLayers ran concurrently, {slowest} was the slowest "
+                f"({reports[slowest]['elapsed']:.1f}s)"
             )
-            log(f"Stack update initiated: {response['StackId']}")
+        return reports
 
-        except ClientError as e:
-            # If stack does not exist, create it
-            if "does not exist" in str(e):
-                log(f"Stack {stack_name} does not exist. Creating it...")
-                response = cloud_client.create_stack(
-                    StackName=stack_name,
-                    TemplateBody=template.to_json(),
-                    Capabilities=["CAPABILITY_NAMED_IAM"],
+    @staticmethod
+    def apply(name: str, region: str, template, wait: bool = False):
+        """
+        Raises:
+            ConfigurationError: If the app is deployed as layer stacks
+        """
+        cloud_client = get_client("cloudformation", region)
+        stack_name = camelcase(f"{name}-app-stack")
+
+        def refuse_layered():
+            # Only probed on create, an existing app stack rules out layers
+            attrs = Config.Attrs(name)
+            layer_stacks = [camelcase(attrs.layer_stack_name(x)) for x in LAYERS]
+            layered = [s for s in layer_stacks if _stack_exists(cloud_client, s)]
+            if layered:
+                raise ConfigurationError(
+                    f'App "{name}" is deployed as the layer stacks '
+                    f'{", ".join(layered)}',
+                    "Create it with --layered, or delete the app first",
                 )
-                log(f"Stack creation initiated: {response['StackId']}")
-            elif "No updates are to be performed" in str(e):
-                log_warning(f"No updates are to be performed!")
-            else:
-                log_err(f"Unexpected error: {e}")
-                raise
-        return response
+
+        return deploy_stack(
+            cloud_client,
+            stack_name,
+            template,
+            wait=wait,
+            tags=app_tags(name, "app"),
+            before_create=refuse_layered,
+        )
 
     @staticmethod
     def delete(name: str, region: str):
-        cloud_client = boto3.client("cloudformation", region_name=region)
+        cloud_client = get_client("cloudformation", region)
         stack_name = camelcase(f"{name}-app-stack")
         response = cloud_client.delete_stack(StackName=stack_name)
         log(response)
+        # Deleting a stack that does not exist succeeds, so the layer stacks
+        # of an app created with `--layered` are deleted as well
+        attrs = Config.Attrs(name)
+        for layer in reversed(LAYERS):
+            cloud_client.delete_stack(
+                StackName=camelcase(attrs.layer_stack_name(layer))
+            )
         return response
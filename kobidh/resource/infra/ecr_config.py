@@ -1,8 +1,40 @@
 from troposphere import GetAtt, Output
 from troposphere.ecr import Repository
+from kobidh.constants import DEFAULT_SERVICE
 from kobidh.utils.format import camelcase
 from kobidh.resource.infra.attrs import Attrs
 from kobidh.resource.config import Config
+from kobidh.utils.clients import get_client
+
+
+def deployed_services(name: str, region: str = None) -> list:
+    """
+    Services with a repository in the deployed app stack (or registry layer
+    stack), an empty list when the app does not exist yet.
+    """
+    from botocore.exceptions import ClientError
+
+    attrs = Config.Attrs(name)
+    client = get_client("cloudformation", region)
+    paginator = client.get_paginator("list_stack_resources")
+    prefix = f"{attrs.ecr_name}/"
+    for stack_name in (
+        camelcase(f"{name}-app-stack"),
+        camelcase(attrs.layer_stack_name("registry")),
+    ):
+        try:
+            return [
+                resource["PhysicalResourceId"][len(prefix) :]
+                for page in paginator.paginate(StackName=stack_name)
+                for resource in page["StackResourceSummaries"]
+                if resource["ResourceType"] == "AWS::ECR::Repository"
+                and resource.get("PhysicalResourceId", "").startswith(prefix)
+                and resource["ResourceStatus"] != "DELETE_COMPLETE"
+            ]
+        except ClientError as e:
+            if "does not exist" not in str(e):
+                raise
+    return []
 
 
 class ECRConfig:
@@ -12,7 +44,7 @@ class ECRConfig:
 
     def __init__(self, config: Config):
         self.config = config
-        self.default_service = "web"
+        self.default_service = DEFAULT_SERVICE
         self.ecr = None
 
     def _configure(self):
@@ -21,6 +53,17 @@ class ECRConfig:
             RepositoryName=f"{self.config.attrs.ecr_name}/{self.default_service}",  # Change to your desired repository name
         )
         self.config.template.add_resource(self.ecr)
+        # One more repository per service, next to the default one (see
+        # `service_repository_uri`)
+        for service in self.config.services:
+            if service == self.default_service:
+                continue
+            self.config.template.add_resource(
+                Repository(
+                    camelcase(f"{self.config.attrs.ecr_name}-{service}"),
+                    RepositoryName=f"{self.config.attrs.ecr_name}/{service}",
+                )
+            )
         self.config.template.add_output(
             Output(
                 "ECRUri",
@@ -1,5 +1,4 @@
 import ipaddress
-import boto3
 import traceback
 from click import prompt
 from botocore.exceptions import ClientError
@@ -17,9 +16,50 @@ from troposphere.ec2 import (
 )
 from kobidh.utils.format import camelcase
 from kobidh.utils.logging import log, log_err
+from kobidh.utils.clients import get_client
+from kobidh.utils.cache import DiskCache
+from kobidh.constants import AZ_CACHE_TTL
 from kobidh.resource.infra.attrs import Attrs
 from kobidh.resource.config import Config
 
+az_cache = DiskCache("azs", ttl=AZ_CACHE_TTL)
+
+
+def _az_key(region: str) -> str:
+    # Zone names map to different physical zones, and zones are enabled
+    # differently, in every account
+    from kobidh.utils.decorators import caller_identity
+
+    return f"{caller_identity()['Account']}:{region}"
+
+
+def get_azs(region: str, refresh: bool = False) -> list:
+    """
+    Availability zones of `region` for the current account, cached on disk
+    for `AZ_CACHE_TTL`.
+
+    :param region: AWS region name (e.g., 'ap-south-1').
+    :param refresh: Skip the cache and query EC2.
+    :return: List of availability zone names.
+    """
+    key = _az_key(region)
+    zones = None if refresh else az_cache.get(key)
+    if zones is not None:
+        return zones
+    ec2_client = get_client("ec2", region)
+    response = ec2_client.describe_availability_zones(
+        Filters=[
+            {"Name": "region-name", "Values": [region]},
+            {
+                "Name": "state",
+                "Values": ["available"],
+            },  # Only zones that are available
+        ]
+    )
+    zones = [az["ZoneName"] for az in response["AvailabilityZones"]]
+    az_cache.set(key, zones)
+    return zones
+
 
 class VPCConfig:
     """
@@ -65,23 +105,18 @@ class VPCConfig:
 
     def _get_azs(self):
         """
-        Fetches the available availability zones for a given AWS region.
+        Fetches the available availability zones for the configured region.
+        Zones pinned in the app configuration or recorded in a facts snapshot
+        are used as is.
 
-        :param region: AWS region name (e.g., 'ap-south-1').
         :return: List of availability zone names.
         """
+        if self.config.facts.azs:
+            zones = self.config.facts.azs
+            log(f'Pinned Availability Zones for "{self.config.region}": {zones}')
+            return list(zones)
         try:
-            ec2_client = boto3.client("ec2", region_name=self.config.region)
-            response = ec2_client.describe_availability_zones(
-                Filters=[
-                    {"Name": "region-name", "Values": [self.config.region]},
-                    {
-                        "Name": "state",
-                        "Values": ["available"],
-                    },  # Only zones that are available
-                ]
-            )
-            zones = [az["ZoneName"] for az in response["AvailabilityZones"]]
+            zones = get_azs(self.config.region)
             log(f'Availability Zones for region "{self.config.region}": {zones}')
             return zones
         except Exception as e:
@@ -89,13 +124,13 @@ class VPCConfig:
             return []
 
     def _allocate_eip(self):
-        client = boto3.client("ec2")
+        client = get_client("ec2", self.config.region)
         response = client.allocate_address(Domain="vpc")
         return response["AllocationId"]
 
     @staticmethod
-    def _release_eip(allocation_id):
-        client = boto3.client("ec2")
+    def _release_eip(allocation_id, region: str = None):
+        client = get_client("ec2", region)
         client.release_address(AllocationId=allocation_id)
 
     def _configure(self):
@@ -1,21 +1,44 @@
-import boto3
+import os
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from kobidh.constants import (
+    BUILD_CACHE_TAG,
+    BUILD_MAX_WORKERS,
+    BUILDX_BUILDER,
+    DEFAULT_SERVICE,
+)
 from kobidh.utils.format import camelcase
-from botocore.exceptions import ClientError
+from kobidh.exceptions import ContainerError, KobidhError
 from kobidh.resource.config import Config, StackOutput
+from kobidh.resource.facts import Facts, PROVISION_FACTS
 from kobidh.resource.provision.autoscaling_config import AutoScalingConfig
 from kobidh.resource.provision.service_config import ServiceConfig
-from kobidh.utils.logging import log, log_err, log_warning
+from kobidh.resource.stack import app_tags, deploy_stack, update_parameters
+from kobidh.utils.logging import (
+    current_prefix,
+    log,
+    log_bold,
+    log_err,
+    log_warning,
+    prefixed,
+)
+from kobidh.utils.clients import get_client
 
 
 class Provision:
+    # Serializes `docker login`, see `_docker_login`
+    _login_lock = threading.Lock()
 
     @staticmethod
-    def configure(name: str, region: str = None):
-        stack_op = StackOutput()
-        stack_op.validate_cloudformation_stack(name)
+    def configure(name: str, region: str = None, facts: Facts = None):
+        # Look up the missing facts concurrently before building the template
+        facts = (facts or Facts()).gather(name, region, PROVISION_FACTS)
+        stack_op = StackOutput.from_dict(facts.stack_outputs)
 
-        config = Config(name, region)
+        config = Config(name, region, facts)
         config.template.set_description(
             "CloudFormation template to provision application service"
         )
@@ -29,87 +52,351 @@ class Provision:
         return config
 
     @staticmethod
-    def apply(config: Config):
-        cloud_client = boto3.client("cloudformation", region_name=config.region)
+    def apply(config: Config, wait: bool = False, parameters: dict = None):
+        """
+        Args:
+            parameters: Service template parameters to set (Image,
+                DesiredCount, Cpu, Memory), the others keep their value
+        """
+        cloud_client = get_client("cloudformation", config.region)
         stack_name = camelcase(f"{config.name}-service-stack")
-        response = None
-        try:
-            # Check if the stack exists
-            response = cloud_client.describe_stacks(StackName=stack_name)
-            log(f"Stack {stack_name} exists.")
-            stack_status = response["Stacks"][0]["StackStatus"]
-            if stack_status == "ROLLBACK_COMPLETE":
-                log_warning(
-                    f"Stack is in ROLLBACK_COMPLETE state!\nStack can not be updated in this state."
-                )
-                return response
-            log(f"Stack status: {stack_status}")
-            # Update the existing stack
-            response = cloud_client.update_stack(
-                StackName=stack_name,
-                TemplateBody=config.template.to_json(),
-                Capabilities=["CAPABILITY_NAMED_IAM"],
-            )
-            log(f"Stack update initiated: {response['StackId']}")
-
-        except ClientError as e:
-            # If stack does not exist, create it
-            if "does not exist" in str(e):
-                log(f"Stack {stack_name} does not exist. Creating it...")
-                response = cloud_client.create_stack(
-                    StackName=stack_name,
-                    TemplateBody=config.template.to_json(),
-                    Capabilities=["CAPABILITY_NAMED_IAM"],
-                )
-                log(f"Stack creation initiated: {response['StackId']}")
-            elif "No updates are to be performed" in str(e):
-                log_warning(f"No updates are to be performed!")
-            elif "in ROLLBACK_COMPLETE state and can not be updated" in str(e):
-                log_warning(
-                    f"Stack is in ROLLBACK_COMPLETE state!\nStack can not be updated in this state."
-                )
-            else:
-                log_err(f"Unexpected error: {e}")
-                raise
-        return response
+        # The service goes back to the stack's task definition, on the image
+        # of the last `container.release`
+        parameters = {**(parameters or {}), "TaskDefinitionArn": ""}
+        return deploy_stack(
+            cloud_client,
+            stack_name,
+            config.template,
+            parameters,
+            wait=wait,
+            tags=app_tags(config.name, "service"),
+        )
 
     @staticmethod
     def delete(name: str, region: str):
-        cloud_client = boto3.client("cloudformation", region_name=region)
+        cloud_client = get_client("cloudformation", region)
         stack_name = camelcase(f"{name}-service-stack")
         response = cloud_client.delete_stack(StackName=stack_name)
         log(response)
         return response
 
     @staticmethod
-    def push(name: str, region: str):
-        repo_name = "tomato-repository/web"
-        tag = "1.0.2"
-        # Build docker image and tag it to the repository name
-        subprocess.run(["docker", "build", "-t", repo_name, "."])
-        # Build docker image and tag it to the ECR repository name and version
-        subprocess.run(
-            [
-                "docker",
-                "tag",
-                f"{repo_name}:latest",
-                f"295920452208.dkr.ecr.ap-south-1.amazonaws.com/{repo_name}:{tag}",
-            ]
+    def release(name: str, region: str = None, tag: str = "latest", wait: bool = False):
+        """
+        Deploy the `tag` image of the app repository without a stack update.
+        """
+        from kobidh.resource.provision.release import (
+            release_image,
+            service_names,
+            wait_for_service,
         )
-        # Build docker image and tag it to the ECR repository name and latest
-        subprocess.run(
-            [
-                "docker",
-                "tag",
-                f"{repo_name}:latest",
-                f"295920452208.dkr.ecr.ap-south-1.amazonaws.com/{repo_name}:latest",
-            ]
+
+        stack_op = StackOutput()
+        stack_op.validate(name, region)
+        names = service_names(name)
+        image = f"{stack_op.ecr_uri}:{tag}"
+        ecs_client = get_client("ecs", region)
+        released = release_image(
+            ecs_client,
+            stack_op.ecs_cluster_name,
+            names["service"],
+            names["container"],
+            image,
         )
-        # Push the docker image(s) to ECR
-        subprocess.run(
+        if not released["task_definition"]:
+            return released
+        # Keep the stack in line with the service, so the next stack update
+        # does not roll the image back. The stack takes over the revision the
+        # service already runs, nothing is registered or rolled out again.
+        cloud_client = get_client("cloudformation", region)
+        update_parameters(
+            cloud_client,
+            names["stack"],
+            {"Image": image, "TaskDefinitionArn": released["task_definition"]},
+            wait=wait,
+        )
+        if wait:
+            wait_for_service(ecs_client, stack_op.ecs_cluster_name, names["service"])
+        return released
+
+    @staticmethod
+    def push(
+        name: str,
+        region: str = None,
+        tag: str = "latest",
+        archive: str = None,
+        context: str = ".",
+        registry_cache: bool = False,
+        service: str = DEFAULT_SERVICE,
+        timings: dict = None,
+    ):
+        """
+        Push an image to the app repository without `docker push`.
+
+        Args:
+            tag: Image tag, the image is tagged "latest" as well
+            archive: `docker save` or OCI archive to push, by default the
+                image is built from `context` and saved first. The build is
+                skipped when the image of an identical context was pushed
+                before, see `build_context`.
+            registry_cache: Build with BuildKit, reading and writing the
+                layer cache as the `BUILD_CACHE_TAG` tag of the app repository
+            service: Service whose repository the image is pushed to
+            timings: Filled with the "build" and "push" seconds
+
+        Returns:
+            The image digest
+        """
+        from kobidh.resource.provision import build_context
+        from kobidh.resource.provision.ecr_push import (
+            ECRPusher,
+            ImageArchive,
+            parse_repository_uri,
+            service_repository_uri,
+        )
+
+        stack_op = StackOutput()
+        stack_op.validate(name, region)
+        repository_uri = service_repository_uri(stack_op.ecr_uri, service)
+        registry_id, repository_region, repository = parse_repository_uri(
+            repository_uri
+        )
+        if tag == BUILD_CACHE_TAG:
+            raise ContainerError(
+                f'"{BUILD_CACHE_TAG}" is the tag of the build cache',
+                "Push the image with another tag",
+            )
+        tags = list(dict.fromkeys([tag, "latest"]))
+        ecr_client = get_client("ecr", repository_region)
+        pusher = ECRPusher(ecr_client, registry_id, repository)
+        timings = {} if timings is None else timings
+        timings.update(build=0.0, push=0.0)
+        if archive:
+            started = time.monotonic()
+            with ImageArchive(archive) as image:
+                digest = pusher.push(image, tags)
+            timings["push"] = time.monotonic() - started
+            return digest
+
+        started = time.monotonic()
+        context_digest = build_context.context_hash(context)
+        pushed = build_context.pushed_image(repository_uri, context_digest)
+        if pushed:
+            log(f"Build context {context_digest[:19]} is unchanged since {pushed}")
+            if pusher.retag(pushed, tags):
+                timings["push"] = time.monotonic() - started
+                return pushed
+            log_warning(f"{pushed} is no longer in {repository}, building it again")
+
+        with tempfile.TemporaryDirectory(prefix="kobidh-") as workdir:
+            archive = os.path.join(workdir, "image.tar")
+            image_name = f"{repository}:{tag}"
+            if registry_cache:
+                Provision._docker_login(ecr_client, registry_id, repository_region)
+                cache_ref = f"{repository_uri}:{BUILD_CACHE_TAG}"
+                Provision._buildx(image_name, context, archive, cache_ref)
+            else:
+                Provision._docker(["build", "-t", image_name, context])
+                Provision._docker(["save", "-o", archive, image_name])
+            timings["build"] = time.monotonic() - started
+            started = time.monotonic()
+            with ImageArchive(archive) as image:
+                digest = pusher.push(image, tags)
+            timings["push"] = time.monotonic() - started
+        build_context.record_image(repository_uri, context_digest, digest)
+        return digest
+
+    @staticmethod
+    def push_services(
+        name: str,
+        region: str = None,
+        services: dict = None,
+        tag: str = "latest",
+        registry_cache: bool = False,
+        max_workers: int = BUILD_MAX_WORKERS,
+    ) -> dict:
+        """
+        Build and push the image of every service concurrently, each to its
+        own repository (see `ECRConfig`). At most `max_workers` builds run at
+        a time and their output is interleaved line by line, prefixed with the
+        service name.
+
+        Args:
+            services: {service: build context}
+
+        Returns:
+            {service: {"digest", "error", "build", "push"}}
+
+        Raises:
+            ContainerError: If any service failed, after all of them ended
+        """
+        from kobidh.resource.provision.ecr_push import parse_repository_uri
+
+        # Warms the stack output cache the workers read
+        stack_op = StackOutput()
+        stack_op.validate(name, region)
+        if registry_cache:
+            # Every service repository is in the app's registry, docker logs
+            # in to it once before the builds start
+            registry_id, registry_region, _ = parse_repository_uri(stack_op.ecr_uri)
+            Provision._docker_login(
+                get_client("ecr", registry_region), registry_id, registry_region
+            )
+
+        def push(service: str, context: str) -> dict:
+            result = {"digest": None, "error": None}
+            started = time.monotonic()
+            with prefixed(service):
+                try:
+                    result["digest"] = Provision.push(
+                        name,
+                        region,
+                        tag,
+                        context=context,
+                        registry_cache=registry_cache,
+                        service=service,
+                        timings=result,
+                    )
+                except Exception as e:
+                    error = e.message if isinstance(e, KobidhError) else str(e)
+                    log_err(f"Failed: {error}")
+                    result["error"] = error
+            result["total"] = time.monotonic() - started
+            return result
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                service: pool.submit(push, service, context)
+                for service, context in services.items()
+            }
+        for service, future in futures.items():
+            results[service] = future.result()
+        Provision.log_push_timings(results)
+        failed = [service for service, result in results.items() if result["error"]]
+        if failed:
+            raise ContainerError(
+                f"Pushing {', '.join(failed)} failed", "See the output above"
+            )
+        return results
+
+    @staticmethod
+    def log_push_timings(results: dict):
+        """Print build and push durations per service, slowest first."""
+        rows = sorted(results.items(), key=lambda item: item[1]["total"], reverse=True)
+        log_bold(f"{'Service':<20} {'Build':>9} {'Push':>9} {'Total':>9}  Image")
+        for service, result in rows:
+            image = result["digest"] or f"failed: {result['error']}"
+            log(
+                f"{service:<20} {result.get('build', 0):>8.1f}s "
+                f"{result.get('push', 0):>8.1f}s {result['total']:>8.1f}s  {image}"
+            )
+        if rows:
+            log_bold(
+                f"{len(rows)} image(s) in {max(r['total'] for _, r in rows):.1f}s, "
+                f"{sum(r['total'] for _, r in rows):.1f}s one after another"
+            )
+
+    @staticmethod
+    def _buildx(image_name: str, context: str, archive: str, cache_ref: str):
+        """
+        Build `context` into the docker archive `archive` with BuildKit, using
+        the registry cache `cache_ref` from and for other builders.
+        """
+        try:
+            inspect = subprocess.run(
+                ["docker", "buildx", "inspect", BUILDX_BUILDER], capture_output=True
+            )
+            exists = inspect.returncode == 0
+        except FileNotFoundError:
+            exists = False
+        if not exists:
+            Provision._docker(
+                [
+                    "buildx",
+                    "create",
+                    "--name",
+                    BUILDX_BUILDER,
+                    "--driver",
+                    "docker-container",
+                ]
+            )
+        Provision._docker(
             [
-                "docker",
-                "push",
-                f"295920452208.dkr.ecr.ap-south-1.amazonaws.com/{repo_name}",
+                "buildx",
+                "build",
+                "--builder",
+                BUILDX_BUILDER,
+                "--cache-from",
+                f"type=registry,ref={cache_ref}",
+                # ECR only accepts caches stored as an image manifest
+                "--cache-to",
+                f"type=registry,ref={cache_ref},mode=max,"
+                "image-manifest=true,oci-mediatypes=true",
+                "--output",
+                f"type=docker,name={image_name},dest={archive}",
+                context,
             ]
         )
+
+    @staticmethod
+    def _docker_login(ecr_client, registry_id: str, region: str):
+        """
+        Log docker in to the registry, BuildKit reads and writes the cache
+        there. The token is cached and docker only logs in when its stored
+        credentials are not that token, see `registry_auth`.
+        """
+        from kobidh.resource.provision import registry_auth
+
+        # Concurrent pushes would otherwise rewrite docker's config together
+        with Provision._login_lock:
+            token = registry_auth.authorization(ecr_client, registry_id, region)
+            if registry_auth.docker_logged_in(token):
+                log(f"docker is logged in to {token['endpoint']}")
+                return
+            Provision._docker(
+                [
+                    "login",
+                    "--username",
+                    token["username"],
+                    "--password-stdin",
+                    token["endpoint"],
+                ],
+                token["password"],
+            )
+
+    @staticmethod
+    def _docker(args: list, input: str = None):
+        log(f"docker {' '.join(args)}")
+        try:
+            if current_prefix():
+                Provision._docker_prefixed(args, input)
+            else:
+                subprocess.run(["docker", *args], check=True, input=input, text=True)
+        except FileNotFoundError:
+            raise ContainerError(
+                "docker is not installed",
+                "Install docker or push a saved image with --archive",
+            )
+        except subprocess.CalledProcessError as e:
+            raise ContainerError(
+                f"docker {args[0]} failed with exit code {e.returncode}"
+            )
+
+    @staticmethod
+    def _docker_prefixed(args: list, input: str = None):
+        """Run docker, streaming its output line by line through `log`"""
+        process = subprocess.Popen(
+            ["docker", *args],
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        if input is not None:
+            process.stdin.write(input)
+            process.stdin.close()
+        for line in process.stdout:
+            log(line.rstrip("\n"))
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, args)
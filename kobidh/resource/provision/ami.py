@@ -0,0 +1,64 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from kobidh.constants import (
+    AMI_CACHE_TTL,
+    AMI_PARAMETERS,
+    DEFAULT_AMI_ARCHITECTURE,
+    DEFAULT_AMI_FAMILY,
+)
+from kobidh.utils.cache import DiskCache
+from kobidh.utils.clients import get_client
+
+ami_cache = DiskCache("ami", ttl=AMI_CACHE_TTL)
+
+
+class AMIResolver:
+    """
+    Resolves the ECS optimized AMI of a region through SSM.
+
+    Resolved images are cached per (region, family, architecture), so repeated
+    provisioning reuses the same AMI until the cache entry expires.
+    """
+
+    def __init__(
+        self,
+        family: str = DEFAULT_AMI_FAMILY,
+        architecture: str = DEFAULT_AMI_ARCHITECTURE,
+    ):
+        if (family, architecture) not in AMI_PARAMETERS:
+            raise ValueError(
+                f'Unsupported ECS optimized AMI "{family}" ({architecture})'
+            )
+        self.family = family
+        self.architecture = architecture
+        self.parameter = AMI_PARAMETERS[(family, architecture)]
+
+    def _key(self, region: str) -> str:
+        return f"{region}:{self.family}:{self.architecture}"
+
+    def resolve(self, region: str, refresh: bool = False) -> dict:
+        """
+        Returns the image record, e.g.
+        `{"image_id": "ami-...", "image_name": "...", "parameter": "/aws/..."}`
+        """
+        image = None if refresh else ami_cache.get(self._key(region))
+        if image is not None:
+            return image
+        ssm_client = get_client("ssm", region)
+        response = ssm_client.get_parameter(Name=self.parameter)
+        value = json.loads(response["Parameter"]["Value"])
+        image = {
+            "image_id": value["image_id"],
+            "image_name": value.get("image_name"),
+            "parameter": self.parameter,
+        }
+        ami_cache.set(self._key(region), image)
+        return image
+
+    def prefetch(self, regions: list, refresh: bool = False, max_workers: int = 8):
+        """Resolve the image of several regions concurrently."""
+        if not regions:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(regions))) as pool:
+            images = pool.map(lambda r: self.resolve(r, refresh), regions)
+            return dict(zip(regions, images))
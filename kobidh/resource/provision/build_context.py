@@ -0,0 +1,181 @@
+"""
+Content addressed build context (`kobidh container.push`).
+
+The build context is hashed the way docker sends it: every file that
+`.dockerignore` does not exclude, plus the Dockerfile and `.dockerignore`
+which are always sent, by relative path, executable bit and content. File
+digests are kept in a stat index (size and mtime), so only files that changed
+since the last push are read again, and those are hashed concurrently. The
+context hash is mapped to the digest of the image pushed from it, which lets
+an unchanged context skip both the build and the push.
+"""
+
+import functools
+import hashlib
+import os
+import re
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from kobidh.constants import CONTEXT_HASH_MAX_WORKERS
+from kobidh.utils.cache import DiskCache
+
+# {absolute context path: {relative path: [size, mtime_ns, digest, executable]}}
+stat_index = DiskCache("build-context")
+# {"<repository>:<context hash>": image digest}
+image_index = DiskCache("build-images")
+
+READ_SIZE = 1024 * 1024
+# Sent by docker even when `.dockerignore` lists them
+ALWAYS_SENT = ("Dockerfile", ".dockerignore")
+
+
+def read_dockerignore(context: str) -> list:
+    """
+    Returns:
+        [(pattern, excluded)], `excluded` is False for `!` exceptions
+    """
+    path = os.path.join(context, ".dockerignore")
+    if not os.path.exists(path):
+        return []
+    rules = []
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            excluded = not line.startswith("!")
+            pattern = os.path.normpath(line.lstrip("!").strip()).lstrip("/")
+            rules.append((pattern.replace(os.sep, "/"), excluded))
+    return rules
+
+
+@functools.lru_cache(maxsize=None)
+def _pattern(pattern: str):
+    """
+    A `.dockerignore` pattern as a regular expression: `*` and `?` do not
+    cross `/`, `**` matches any number of directories.
+    """
+    regex, index = "", 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**", index):
+            index += 2
+            if pattern.startswith("/", index):
+                regex += "(?:.*/)?"
+                index += 1
+            else:
+                regex += ".*"
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[" and "]" in pattern[index + 1 :]:
+            end = pattern.index("]", index + 1)
+            body = pattern[index + 1 : end]
+            if body[:1] in ("^", "!"):
+                body = "^" + body[1:]
+            regex += f"[{body}]"
+            index = end + 1
+            continue
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            regex += re.escape(pattern[index])
+        else:
+            regex += re.escape(char)
+        index += 1
+    return re.compile(regex + r"\Z")
+
+
+def is_ignored(path: str, rules: list) -> bool:
+    """
+    Whether the relative posix `path` is excluded. As in docker the last
+    matching rule wins and a pattern matching a directory matches everything
+    below it.
+    """
+    # The path itself and every directory above it
+    candidates = [path] + [
+        path[:index] for index in range(len(path)) if path[index] == "/"
+    ]
+    ignored = False
+    for pattern, excluded in rules:
+        regex = _pattern(pattern)
+        if any(regex.match(candidate) for candidate in candidates):
+            ignored = excluded
+    return ignored
+
+
+def _files(context: str, rules: list) -> list:
+    """Relative posix paths of the files docker would send"""
+    # Excluded directories can only be skipped when no exception re-includes
+    # something below them
+    prune = all(excluded for _, excluded in rules)
+    files = []
+    for root, dirs, names in os.walk(context):
+        relative_root = os.path.relpath(root, context).replace(os.sep, "/")
+        relative_root = "" if relative_root == "." else relative_root + "/"
+        if prune:
+            dirs[:] = [d for d in dirs if not is_ignored(relative_root + d, rules)]
+        dirs.sort()
+        # Symbolic links to directories are sent as links
+        names += [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        for name in names:
+            path = relative_root + name
+            if not is_ignored(path, rules) or path in ALWAYS_SENT:
+                files.append(path)
+    return sorted(files)
+
+
+def _file_digest(path: str, mode: int) -> str:
+    sha256 = hashlib.sha256()
+    if stat.S_ISLNK(mode):
+        sha256.update(os.readlink(path).encode("utf-8"))
+    else:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(READ_SIZE), b""):
+                sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def context_hash(context: str, max_workers: int = CONTEXT_HASH_MAX_WORKERS) -> str:
+    """Hash of the build context, see the module docstring"""
+    context = os.path.abspath(context)
+    rules = read_dockerignore(context)
+    previous = stat_index.get(context) or {}
+    index, pending = {}, {}
+    for path in _files(context, rules):
+        info = os.lstat(os.path.join(context, path))
+        entry = previous.get(path)
+        executable = bool(info.st_mode & stat.S_IXUSR)
+        if entry and entry[:2] == [info.st_size, info.st_mtime_ns]:
+            # A chmod only changes the ctime, the digest is still valid
+            index[path] = [*entry[:3], executable]
+        else:
+            pending[path] = info
+
+    def digest(item):
+        path, info = item
+        digest = _file_digest(os.path.join(context, path), info.st_mode)
+        executable = bool(info.st_mode & stat.S_IXUSR)
+        return path, [info.st_size, info.st_mtime_ns, digest, executable]
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            index.update(pool.map(digest, pending.items()))
+    if index != previous:
+        stat_index.set(context, index)
+
+    sha256 = hashlib.sha256()
+    for path in sorted(index):
+        _, _, digest, executable = index[path]
+        sha256.update(f"{path}\0{int(executable)}\0{digest}\n".encode("utf-8"))
+    return f"sha256:{sha256.hexdigest()}"
+
+
+def pushed_image(repository: str, context_digest: str) -> str:
+    """Digest of the image last pushed from this context, if any"""
+    return image_index.get(f"{repository}:{context_digest}")
+
+
+def record_image(repository: str, context_digest: str, image_digest: str):
+    image_index.set(f"{repository}:{context_digest}", image_digest)
@@ -0,0 +1,333 @@
+"""
+Daemonless image push to ECR (`kobidh container.push`).
+
+Images are read from a `docker save` archive or an OCI image layout tarball.
+The archive is memory mapped and every blob is a slice of it, so nothing is
+extracted to disk. Blobs the repository already has are found with one
+`BatchCheckLayerAvailability` call per 100 digests, the missing ones are
+uploaded concurrently (one `UploadLayerPart` stream per blob, parts in order
+as ECR requires) and the manifest is put last. Pushing an unchanged image
+costs a layer check and a `PutImage`.
+"""
+
+import hashlib
+import json
+import mmap
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from kobidh.constants import (
+    ECR_LAYER_CHECK_BATCH,
+    ECR_UPLOAD_MAX_WORKERS,
+    ECR_UPLOAD_PART_SIZE,
+)
+from kobidh.exceptions import ContainerError
+from kobidh.utils.logging import in_context, log, log_intent, log_warning
+
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+OCI_INDEX = "application/vnd.oci.image.index.v1+json"
+OCI_CONFIG = "application/vnd.oci.image.config.v1+json"
+OCI_LAYER = "application/vnd.oci.image.layer.v1.tar"
+DOCKER_MANIFEST_LIST = "application/vnd.docker.distribution.manifest.list.v2+json"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class Blob:
+    """A blob of the image, as a range of the memory mapped archive"""
+
+    def __init__(self, data: memoryview, media_type: str, digest: str = None):
+        self.data = data
+        self.media_type = media_type
+        self._digest = digest
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            sha256 = hashlib.sha256()
+            # Hashing large buffers releases the GIL, digests of several
+            # layers are computed in parallel
+            for start in range(0, self.size, ECR_UPLOAD_PART_SIZE):
+                sha256.update(self.data[start : start + ECR_UPLOAD_PART_SIZE])
+            self._digest = f"sha256:{sha256.hexdigest()}"
+        return self._digest
+
+    def descriptor(self) -> dict:
+        return {"mediaType": self.media_type, "digest": self.digest, "size": self.size}
+
+
+def _member_name(name: str) -> str:
+    """Archive member path without the `./` prefix some tar writers add"""
+    return name[2:] if name.startswith("./") else name
+
+
+class ImageArchive:
+    """
+    An image saved with `docker save` (legacy or OCI based layout) or an OCI
+    image layout tarball. The archive must not be compressed as a whole.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ContainerError(f'Image archive "{path}" is empty')
+        if self._map[:2] == GZIP_MAGIC:
+            self._map.close()
+            self._file.close()
+            raise ContainerError(
+                f'Image archive "{path}" is compressed',
+                "Save it uncompressed, e.g. 'docker save -o image.tar <image>'",
+            )
+        self.config, self.layers, self.manifest = None, [], None
+        try:
+            with tarfile.open(fileobj=self._file, mode="r:") as tar:
+                self._members = {
+                    _member_name(member.name): member
+                    for member in tar.getmembers()
+                    if member.isfile()
+                }
+            self.config, self.layers, self.manifest = self._read()
+        except (tarfile.TarError, KeyError, ValueError) as e:
+            self.close()
+            raise ContainerError(f'Invalid image archive "{path}": {e}')
+        except ContainerError:
+            self.close()
+            raise
+
+    def close(self):
+        # The blob views have to be released before the map is closed
+        for blob in self.layers + [self.config]:
+            if blob is not None:
+                blob.data.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # A view is still referenced (e.g. by a traceback), the map is
+            # closed once it is collected
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _view(self, name: str) -> memoryview:
+        member = self._members.get(name)
+        if member is None:
+            raise ContainerError(f'"{name}" not found in image archive "{self.path}"')
+        end = member.offset_data + member.size
+        return memoryview(self._map)[member.offset_data : end]
+
+    def _json(self, name: str):
+        return json.loads(bytes(self._view(name)))
+
+    @staticmethod
+    def _blob_name(digest: str) -> str:
+        algorithm, hex_digest = digest.split(":", 1)
+        return f"blobs/{algorithm}/{hex_digest}"
+
+    def _read(self):
+        if "index.json" in self._members:
+            return self._read_oci()
+        if "manifest.json" in self._members:
+            return self._read_docker()
+        raise ContainerError(
+            f'"{self.path}" is not a docker-archive or OCI image layout',
+            "Create it with 'docker save -o image.tar <image>'",
+        )
+
+    def _read_oci(self):
+        descriptor = self._json("index.json")["manifests"][0]
+        # Multi platform images keep the platform manifests in a nested index
+        while descriptor["mediaType"] in (OCI_INDEX, DOCKER_MANIFEST_LIST):
+            manifests = self._json(self._blob_name(descriptor["digest"]))["manifests"]
+            descriptor = next(
+                (
+                    m
+                    for m in manifests
+                    if m.get("platform", {}).get("os") == "linux"
+                    and m.get("platform", {}).get("architecture") == "amd64"
+                ),
+                manifests[0],
+            )
+        raw = bytes(self._view(self._blob_name(descriptor["digest"])))
+        manifest = json.loads(raw)
+        config = Blob(
+            self._view(self._blob_name(manifest["config"]["digest"])),
+            manifest["config"]["mediaType"],
+            manifest["config"]["digest"],
+        )
+        layers = [
+            Blob(
+                self._view(self._blob_name(layer["digest"])),
+                layer["mediaType"],
+                layer["digest"],
+            )
+            for layer in manifest["layers"]
+        ]
+        # Pushed as is, so the image keeps its digest
+        return config, layers, (raw, descriptor["mediaType"])
+
+    def _read_docker(self):
+        image = self._json("manifest.json")[0]
+        config = Blob(self._view(image["Config"]), OCI_CONFIG)
+        layers = []
+        for name in image["Layers"]:
+            data = self._view(name)
+            compressed = bytes(data[:2]) == GZIP_MAGIC
+            layers.append(Blob(data, OCI_LAYER + ("+gzip" if compressed else "")))
+        # The manifest is built once the digests are known, see `manifest_body`
+        return config, layers, None
+
+    def manifest_body(self):
+        """(manifest bytes, media type) to put"""
+        if self.manifest:
+            return self.manifest
+        manifest = {
+            "schemaVersion": 2,
+            "mediaType": OCI_MANIFEST,
+            "config": self.config.descriptor(),
+            "layers": [layer.descriptor() for layer in self.layers],
+        }
+        return json.dumps(manifest, separators=(",", ":")).encode("utf-8"), OCI_MANIFEST
+
+
+def parse_repository_uri(uri: str) -> tuple:
+    """`<account>.dkr.ecr.<region>.amazonaws.com/<name>` -> (account, region, name)"""
+    registry, _, name = uri.partition("/")
+    parts = registry.split(".")
+    if len(parts) < 6 or parts[1:3] != ["dkr", "ecr"] or not name:
+        raise ContainerError(f'"{uri}" is not an ECR repository URI')
+    return parts[0], parts[3], name
+
+
+def service_repository_uri(uri: str, service: str) -> str:
+    """
+    URI of the `service` repository, next to the default service repository
+    `uri` (`<account>.dkr.ecr.<region>.amazonaws.com/<app>-repository/web`)
+    """
+    return f"{uri.rsplit('/', 1)[0]}/{service}"
+
+
+class ECRPusher:
+    """Pushes an `ImageArchive` to one ECR repository"""
+
+    def __init__(
+        self,
+        ecr_client,
+        registry_id: str,
+        repository: str,
+        max_workers: int = ECR_UPLOAD_MAX_WORKERS,
+    ):
+        self.client = ecr_client
+        self.registry_id = registry_id
+        self.repository = repository
+        self.max_workers = max_workers
+
+    def missing(self, blobs: list) -> list:
+        """Blobs the repository does not have yet"""
+        available = set()
+        digests = list(dict.fromkeys(blob.digest for blob in blobs))
+        for start in range(0, len(digests), ECR_LAYER_CHECK_BATCH):
+            response = self.client.batch_check_layer_availability(
+                registryId=self.registry_id,
+                repositoryName=self.repository,
+                layerDigests=digests[start : start + ECR_LAYER_CHECK_BATCH],
+            )
+            available.update(
+                layer["layerDigest"]
+                for layer in response["layers"]
+                if layer.get("layerAvailability") == "AVAILABLE"
+            )
+        unique = {blob.digest: blob for blob in blobs}
+        return [blob for digest, blob in unique.items() if digest not in available]
+
+    def upload(self, blob: Blob):
+        response = self.client.initiate_layer_upload(
+            registryId=self.registry_id, repositoryName=self.repository
+        )
+        upload_id = response["uploadId"]
+        for first in range(0, blob.size, ECR_UPLOAD_PART_SIZE):
+            last = min(first + ECR_UPLOAD_PART_SIZE, blob.size) - 1
+            self.client.upload_layer_part(
+                registryId=self.registry_id,
+                repositoryName=self.repository,
+                uploadId=upload_id,
+                partFirstByte=first,
+                partLastByte=last,
+                layerPartBlob=bytes(blob.data[first : last + 1]),
+            )
+        self.client.complete_layer_upload(
+            registryId=self.registry_id,
+            repositoryName=self.repository,
+            uploadId=upload_id,
+            layerDigests=[blob.digest],
+        )
+        log_intent(f"Pushed {blob.digest[:19]} ({blob.size / 1024 / 1024:.1f} MiB)")
+
+    def retag(self, digest: str, tags: list) -> str:
+        """
+        Tag the image `digest` the repository already has with `tags`.
+
+        Returns:
+            The image digest, or None when the image is gone
+        """
+        response = self.client.batch_get_image(
+            registryId=self.registry_id,
+            repositoryName=self.repository,
+            imageIds=[{"imageDigest": digest}],
+        )
+        if not response["images"]:
+            return None
+        image = response["images"][0]
+        self._tag(
+            image["imageManifest"].encode("utf-8"),
+            image.get("imageManifestMediaType", OCI_MANIFEST),
+            digest,
+            tags,
+        )
+        return digest
+
+    def _tag(self, body: bytes, media_type: str, digest: str, tags: list):
+        for tag in tags:
+            try:
+                self.client.put_image(
+                    registryId=self.registry_id,
+                    repositoryName=self.repository,
+                    imageManifest=body.decode("utf-8"),
+                    imageManifestMediaType=media_type,
+                    imageTag=tag,
+                )
+                log(f"Tagged {self.repository}:{tag} ({digest})")
+            except self.client.exceptions.ImageAlreadyExistsException:
+                log_warning(f"{self.repository}:{tag} is already {digest}")
+
+    def push(self, archive: ImageArchive, tags: list) -> str:
+        """
+        Returns:
+            The image digest
+        """
+        blobs = archive.layers + [archive.config]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Digests of legacy docker-archive layers are computed here
+            list(pool.map(in_context(lambda blob: blob.digest), blobs))
+            missing = self.missing(blobs)
+            log(
+                f"{len(blobs) - len(missing)} of {len(blobs)} blob(s) already in "
+                f"{self.repository}, pushing {len(missing)}"
+            )
+            # Upload lines keep the service prefix of `push_services`
+            list(pool.map(in_context(self.upload), missing))
+
+        body, media_type = archive.manifest_body()
+        digest = f"sha256:{hashlib.sha256(body).hexdigest()}"
+        self._tag(body, media_type, digest, tags)
+        return digest
@@ -0,0 +1,122 @@
+"""
+ECR authorization tokens (`kobidh container.push --registry-cache`).
+
+`GetAuthorizationToken` returns a registry password valid for 12 hours. It is
+kept under `~/.kobidh/cache` per (account, region) until shortly before it
+expires, so back to back pushes do not ask ECR for a token again. `docker
+login` only runs when docker's stored credentials for the registry are not
+this token, e.g. after a `docker logout` or a login with other credentials.
+The native push path (`ecr_push`) signs its ECR API calls with the IAM
+credentials and needs no token.
+"""
+
+import base64
+import json
+import os
+import subprocess
+import time
+from urllib.parse import urlparse
+from kobidh.constants import ECR_TOKEN_REFRESH_MARGIN, ECR_TOKEN_TTL
+from kobidh.utils.cache import DiskCache
+
+# {"<account>:<region>": {"username", "password", "endpoint", "expires_at"}}
+token_cache = DiskCache("ecr-tokens")
+
+
+def _key(registry_id: str, region: str) -> str:
+    return f"{registry_id}:{region}"
+
+
+def authorization(ecr_client, registry_id: str, region: str) -> dict:
+    """
+    Returns:
+        {"username", "password", "endpoint", "expires_at"}
+    """
+    key = _key(registry_id, region)
+    token = token_cache.get(key)
+    if token:
+        return token
+    response = ecr_client.get_authorization_token(registryIds=[registry_id])
+    data = response["authorizationData"][0]
+    username, password = (
+        base64.b64decode(data["authorizationToken"]).decode("utf-8").split(":", 1)
+    )
+    expires = data.get("expiresAt")
+    expires_at = expires.timestamp() if expires else time.time() + ECR_TOKEN_TTL
+    token = {
+        "username": username,
+        "password": password,
+        "endpoint": data["proxyEndpoint"],
+        "expires_at": expires_at,
+    }
+    # Refreshed a little early, so a build never starts with a token about to
+    # expire
+    token_cache.set(key, token, expires_at=expires_at - ECR_TOKEN_REFRESH_MARGIN)
+    return token
+
+
+def _docker_config() -> dict:
+    directory = os.environ.get("DOCKER_CONFIG") or os.path.join(
+        os.path.expanduser("~"), ".docker"
+    )
+    try:
+        with open(os.path.join(directory, "config.json"), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _helper_credentials(helper: str, server: str) -> dict:
+    try:
+        result = subprocess.run(
+            [f"docker-credential-{helper}", "get"],
+            input=server,
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        credentials = json.loads(result.stdout)
+    except ValueError:
+        return None
+    return {
+        "username": credentials.get("Username"),
+        "password": credentials.get("Secret"),
+    }
+
+
+def docker_credentials(endpoint: str) -> dict:
+    """
+    Credentials docker has stored for the registry `endpoint`, from its
+    config file or credential helper.
+
+    Returns:
+        {"username", "password"}, or None when docker is not logged in
+    """
+    config = _docker_config()
+    host = urlparse(endpoint).netloc or endpoint
+    # `docker login` stores the server as it was given, with or without scheme
+    for server in (endpoint, host):
+        helper = config.get("credHelpers", {}).get(server) or config.get("credsStore")
+        if helper:
+            credentials = _helper_credentials(helper, server)
+        else:
+            auth = config.get("auths", {}).get(server, {}).get("auth")
+            if not auth:
+                continue
+            username, _, password = (
+                base64.b64decode(auth).decode("utf-8").partition(":")
+            )
+            credentials = {"username": username, "password": password}
+        if credentials:
+            return credentials
+    return None
+
+
+def docker_logged_in(token: dict) -> bool:
+    """Whether docker's stored credentials for the registry are `token`"""
+    credentials = docker_credentials(token["endpoint"])
+    return credentials == {"username": token["username"], "password": token["password"]}
@@ -0,0 +1,107 @@
+"""
+Fast image release (`kobidh container.release`).
+
+A new task definition revision is registered from the one the service runs,
+with only the image changed, and the service is pointed at it with
+`ecs:UpdateService`. The service stack is reconciled afterwards by updating
+its parameters on the previous template, instead of regenerating and updating
+the whole stack for a code deploy. Its `TaskDefinitionArn` parameter takes
+the registered revision, so CloudFormation does not register another one.
+"""
+
+from kobidh.exceptions import ServiceError
+from kobidh.utils.format import camelcase
+from kobidh.utils.logging import log, log_warning
+
+# Fields of `describe_task_definition` accepted by `register_task_definition`
+TASK_DEFINITION_FIELDS = (
+    "family",
+    "taskRoleArn",
+    "executionRoleArn",
+    "networkMode",
+    "containerDefinitions",
+    "volumes",
+    "placementConstraints",
+    "requiresCompatibilities",
+    "cpu",
+    "memory",
+    "pidMode",
+    "ipcMode",
+    "proxyConfiguration",
+    "inferenceAccelerators",
+    "ephemeralStorage",
+    "runtimePlatform",
+)
+
+
+def with_image(task_definition: dict, container: str, image: str) -> dict:
+    """Registration arguments of `task_definition` with `container` on `image`"""
+    registration = {
+        field: task_definition[field]
+        for field in TASK_DEFINITION_FIELDS
+        if task_definition.get(field) is not None
+    }
+    containers = [dict(c) for c in registration["containerDefinitions"]]
+    names = [c["name"] for c in containers]
+    if container not in names:
+        raise ServiceError(
+            task_definition["family"],
+            f'Container "{container}" not found in the task definition '
+            f'({", ".join(names)})',
+        )
+    for definition in containers:
+        if definition["name"] == container:
+            definition["image"] = image
+    registration["containerDefinitions"] = containers
+    return registration
+
+
+def release_image(
+    ecs_client, cluster: str, service_name: str, container: str, image: str
+) -> dict:
+    """
+    Roll `service_name` out on `image`.
+
+    Returns:
+        {"task_definition": new task definition arn, "previous": old arn}
+        with "task_definition" None when the service already runs `image`
+    """
+    response = ecs_client.describe_services(cluster=cluster, services=[service_name])
+    services = [s for s in response["services"] if s["status"] != "INACTIVE"]
+    if not services:
+        raise ServiceError(service_name, f'Service not found in cluster "{cluster}"')
+    previous = services[0]["taskDefinition"]
+    response = ecs_client.describe_task_definition(
+        taskDefinition=previous, include=["TAGS"]
+    )
+    task_definition = response["taskDefinition"]
+    current = {c["name"]: c["image"] for c in task_definition["containerDefinitions"]}
+    if current.get(container) == image:
+        log_warning(f"Service is already running {image}")
+        return {"task_definition": None, "previous": previous}
+
+    registration = with_image(task_definition, container, image)
+    if response.get("tags"):
+        registration["tags"] = response["tags"]
+    registered = ecs_client.register_task_definition(**registration)
+    arn = registered["taskDefinition"]["taskDefinitionArn"]
+    log(f"Registered task definition {arn}")
+    ecs_client.update_service(cluster=cluster, service=service_name, taskDefinition=arn)
+    log(f'Service "{service_name}" is rolling out {image}')
+    return {"task_definition": arn, "previous": previous}
+
+
+def wait_for_service(ecs_client, cluster: str, service_name: str):
+    log(f'Waiting for service "{service_name}" to become stable..')
+    ecs_client.get_waiter("services_stable").wait(
+        cluster=cluster, services=[service_name]
+    )
+    log(f'Service "{service_name}" is stable')
+
+
+def service_names(name: str) -> dict:
+    return {
+        "stack": camelcase(f"{name}-service-stack"),
+        "service": camelcase(f"{name}-service"),
+        "container": camelcase(f"{name}-web"),
+    }
@@ -1,4 +1,3 @@
-import boto3
 from kobidh.utils.format import camelcase
 from troposphere.ecs import (
     TaskDefinition,
@@ -10,9 +9,11 @@ from troposphere.ecs import (
     AwsvpcConfiguration,
     Environment,
 )
-from troposphere import Ref
+from troposphere import Equals, If, Not, Parameter, Ref
 from kobidh.utils.logging import log, log_err
 from kobidh.resource.config import Config, StackOutput
+from kobidh.resource.facts import EXECUTION_ROLE_NAME
+from kobidh.utils.clients import get_client
 
 
 class ServiceConfig:
@@ -23,23 +24,79 @@ class ServiceConfig:
         self.task_definition_family = camelcase(f"{self.config.name}-task")
         self.service_name = camelcase(f"{self.config.name}-service")
 
+    def _get_execution_role_arn(self):
+        if self.config.facts.execution_role_arn:
+            return self.config.facts.execution_role_arn
+        return get_client("iam").get_role(RoleName=EXECUTION_ROLE_NAME)["Role"]["Arn"]
+
+    def _add_parameters(self):
+        """
+        Values that change between releases are template parameters, so they
+        can be updated on the previous template, see `deploy_stack`.
+        """
+        template = self.config.template
+        self.image = template.add_parameter(
+            Parameter(
+                "Image",
+                Type="String",
+                Default=f"{self.stack_op.ecr_uri}:latest",
+                Description="Container image of the web container",
+            )
+        )
+        self.desired_count = template.add_parameter(
+            Parameter(
+                "DesiredCount",
+                Type="Number",
+                Default=1,
+                MinValue=0,
+                Description="Number of tasks to run",
+            )
+        )
+        self.cpu = template.add_parameter(
+            Parameter("Cpu", Type="Number", Default=256, Description="Task CPU units")
+        )
+        self.memory = template.add_parameter(
+            Parameter(
+                "Memory", Type="Number", Default=512, Description="Task memory (MiB)"
+            )
+        )
+        # Set by `container.release` to the revision it registered and rolled
+        # out. The stack's own task definition is dropped meanwhile, instead of
+        # being replaced with a second revision of the same image.
+        self.task_definition_arn = template.add_parameter(
+            Parameter(
+                "TaskDefinitionArn",
+                Type="String",
+                Default="",
+                Description="Released task definition, empty to use the stack's",
+            )
+        )
+        template.add_condition(
+            "StackTaskDefinition", Equals(Ref(self.task_definition_arn), "")
+        )
+        template.add_condition(
+            "ReleasedTaskDefinition", Not(Equals(Ref(self.task_definition_arn), ""))
+        )
+
     def _configure(self):
         try:
             container_port = 80
+            self._add_parameters()
             # ECS Task Definition
             task_definition = TaskDefinition(
                 camelcase(self.task_definition),
+                Condition="StackTaskDefinition",
                 Family=self.task_definition_family,
-                Cpu="256",
-                Memory="512",
+                Cpu=Ref(self.cpu),
+                Memory=Ref(self.memory),
                 NetworkMode="awsvpc",
-                ExecutionRoleArn=boto3.resource("iam").Role("ecsTaskExecutionRole").arn,
+                ExecutionRoleArn=self._get_execution_role_arn(),
                 ContainerDefinitions=[
                     ContainerDefinition(
                         Name=camelcase(f"{self.config.name}-web"),
-                        Image=f"{self.stack_op.ecr_uri}:latest",
-                        Cpu=256,
-                        Memory=512,
+                        Image=Ref(self.image),
+                        Cpu=Ref(self.cpu),
+                        Memory=Ref(self.memory),
                         Essential=True,
                         PortMappings=[
                             PortMapping(
@@ -77,9 +134,13 @@ class ServiceConfig:
                         SecurityGroups=[self.stack_op.security_group_name],
                     )
                 ),
-                DesiredCount=1,  # Specify the number of tasks to launch
+                DesiredCount=Ref(self.desired_count),
                 ServiceName=camelcase(f"{self.config.name}-service"),
-                TaskDefinition=Ref(task_definition),
+                TaskDefinition=If(
+                    "ReleasedTaskDefinition",
+                    Ref(self.task_definition_arn),
+                    Ref(task_definition),
+                ),
             )
             self.config.template.add_resource(service)
 
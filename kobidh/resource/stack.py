@@ -0,0 +1,252 @@
+import hashlib
+import json
+import uuid
+from botocore.exceptions import ClientError
+from kobidh.exceptions import CloudFormationError
+from kobidh.resource.events import StackEventWaiter, is_failure
+from kobidh.utils.logging import log, log_err, log_warning
+
+# Stack tag holding the fingerprint of the last applied template
+FINGERPRINT_TAG = "kobidh:fingerprint"
+# Stack tag holding the fingerprint of the template body alone
+TEMPLATE_TAG = "kobidh:template"
+# Stack tags `apps.list` finds the stacks of every app by
+PUBLISHER_TAG = "Publisher"
+PUBLISHER = "kobidh"
+APP_TAG = "kobidh:app"
+ROLE_TAG = "kobidh:role"
+# Stack states in which the tagged template is known to be deployed
+STABLE_STATUSES = ("CREATE_COMPLETE", "UPDATE_COMPLETE", "IMPORT_COMPLETE")
+CAPABILITIES = ["CAPABILITY_NAMED_IAM"]
+
+
+def template_fingerprint(template, parameters: dict = None, tags: dict = None) -> str:
+    """
+    Canonical hash of a rendered template, its parameters and stack tags.
+
+    Keys are sorted and whitespace is dropped, so the fingerprint only changes
+    when the template content does.
+    """
+    body = template.to_dict() if hasattr(template, "to_dict") else template
+    content = {"Template": body, "Parameters": parameters or {}}
+    if tags:
+        content["Tags"] = tags
+    canonical = json.dumps(
+        content,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def stack_tags(stack: dict) -> dict:
+    return {tag["Key"]: tag["Value"] for tag in stack.get("Tags", [])}
+
+
+def app_tags(name: str, role: str) -> dict:
+    """Tags of a stack holding the `role` part ("app", "service", ...) of an app"""
+    return {PUBLISHER_TAG: PUBLISHER, APP_TAG: name, ROLE_TAG: role}
+
+
+def _parameters(parameters: dict = None) -> list:
+    return [
+        {"ParameterKey": key, "ParameterValue": str(value)}
+        for key, value in (parameters or {}).items()
+    ]
+
+
+def _stack_parameters(stack: dict) -> dict:
+    return {
+        p["ParameterKey"]: p.get("ParameterValue") for p in stack.get("Parameters", [])
+    }
+
+
+def _update_parameters(keys, current: dict, parameters: dict = None) -> list:
+    """
+    Parameters of an update: the given values, and the previous value for
+    every other parameter the stack already has (instead of its default).
+    """
+    parameters = parameters or {}
+    updates = []
+    for key in keys:
+        if key in parameters:
+            updates.append(
+                {"ParameterKey": key, "ParameterValue": str(parameters[key])}
+            )
+        elif key in current:
+            updates.append({"ParameterKey": key, "UsePreviousValue": True})
+    return updates
+
+
+def wait_for_stack(client, stack_name: str, response: dict, token: str):
+    """Stream the events of the operation started with `token` until it ends."""
+    status = StackEventWaiter(client, response["StackId"], token).wait()
+    if is_failure(status):
+        raise CloudFormationError(stack_name, f"Operation ended in {status}", status)
+    return status
+
+
+def deploy_stack(
+    client,
+    stack_name: str,
+    template,
+    parameters: dict = None,
+    wait: bool = False,
+    tags: dict = None,
+    before_create=None,
+):
+    """
+    Create `stack_name` or update it when the template changed.
+
+    The template fingerprint is stored as a stack tag and compared with the
+    one on the deployed stack before any mutating call, so an unchanged
+    template costs a single `describe_stacks`. The requested `parameters` are
+    compared with the deployed values too, since `update_parameters` changes
+    them without touching the tag. When only `parameters` changed the stack
+    is updated on its previous template with just the changed values.
+    Parameters that are not given keep their deployed value. `tags` are added
+    to the stack tags, see `app_tags`. `before_create` is called only when the
+    stack does not exist yet and may raise to refuse creating it. With `wait`
+    the stack events are streamed until the operation completes.
+
+    Returns:
+        The create/update response, the describe response when the stack
+        can not be updated, or None when there is nothing to update.
+    """
+    fingerprint = template_fingerprint(template, parameters, tags)
+    body_fingerprint = template_fingerprint(template)
+    # Tags the events of this operation, see `StackEventWaiter`
+    token = f"kobidh-{uuid.uuid4()}"
+    try:
+        # Check if the stack exists
+        response = client.describe_stacks(StackName=stack_name)
+    except ClientError as e:
+        # If stack does not exist, create it
+        if "does not exist" not in str(e):
+            log_err(f"Unexpected error: {e}")
+            raise
+        if before_create:
+            before_create()
+        log(f"Stack {stack_name} does not exist. Creating it...")
+        create_tags = {
+            **(tags or {}),
+            FINGERPRINT_TAG: fingerprint,
+            TEMPLATE_TAG: body_fingerprint,
+        }
+        response = client.create_stack(
+            StackName=stack_name,
+            TemplateBody=template.to_json(),
+            Parameters=_parameters(parameters),
+            Capabilities=CAPABILITIES,
+            Tags=[{"Key": k, "Value": v} for k, v in create_tags.items()],
+            ClientRequestToken=token,
+        )
+        log(f"Stack creation initiated: {response['StackId']}")
+        if wait:
+            wait_for_stack(client, stack_name, response, token)
+        return response
+
+    stack = response["Stacks"][0]
+    stack_status = stack["StackStatus"]
+    log(f"Stack {stack_name} exists.")
+    log(f"Stack status: {stack_status}")
+    if stack_status == "ROLLBACK_COMPLETE":
+        log_warning(
+            "Stack is in ROLLBACK_COMPLETE state!\n"
+            "Stack can not be updated in this state."
+        )
+        return response
+    current_tags = stack_tags(stack)
+    current = _stack_parameters(stack)
+    # `update_parameters` changes parameters without touching the tag, so the
+    # requested values are compared with the deployed ones as well
+    if (
+        current_tags.get(FINGERPRINT_TAG) == fingerprint
+        and stack_status in STABLE_STATUSES
+        and all(current.get(k) == str(v) for k, v in (parameters or {}).items())
+    ):
+        log_warning("No updates are to be performed!")
+        return None
+
+    new_tags = {
+        **current_tags,
+        **(tags or {}),
+        FINGERPRINT_TAG: fingerprint,
+        TEMPLATE_TAG: body_fingerprint,
+    }
+    if current_tags.get(TEMPLATE_TAG) == body_fingerprint:
+        changed = {
+            key: value
+            for key, value in (parameters or {}).items()
+            if current.get(key) != str(value)
+        }
+        tags_changed = any(current_tags.get(k) != v for k, v in (tags or {}).items())
+        if not changed and not tags_changed:
+            log_warning("No updates are to be performed!")
+            return None
+        log(f"Updating parameters of stack {stack_name}: {', '.join(changed) or '-'}")
+        update = {
+            "UsePreviousTemplate": True,
+            "Parameters": _update_parameters(current, current, changed),
+        }
+    else:
+        log(f"Updating stack {stack_name}...")
+        update = {
+            "TemplateBody": template.to_json(),
+            "Parameters": _update_parameters(template.parameters, current, parameters),
+        }
+    try:
+        # Update the existing stack
+        response = client.update_stack(
+            StackName=stack_name,
+            Capabilities=CAPABILITIES,
+            Tags=[{"Key": k, "Value": v} for k, v in new_tags.items()],
+            ClientRequestToken=token,
+            **update,
+        )
+        log(f"Stack update initiated: {response['StackId']}")
+        if wait:
+            wait_for_stack(client, stack_name, response, token)
+        return response
+    except ClientError as e:
+        if "No updates are to be performed" in str(e):
+            log_warning("No updates are to be performed!")
+            return None
+        log_err(f"Unexpected error: {e}")
+        raise
+
+
+def update_parameters(client, stack_name: str, parameters: dict, wait: bool = False):
+    """
+    Update `parameters` of `stack_name` on its previous template, keeping the
+    other parameters and the tags as they are. With `wait` the stack events
+    are streamed until the update completes.
+
+    Returns:
+        The update response, or None when the stack does not take these
+        parameters or already has these values
+    """
+    stack = client.describe_stacks(StackName=stack_name)["Stacks"][0]
+    current = _stack_parameters(stack)
+    missing = [key for key in parameters if key not in current]
+    if missing:
+        log_warning(
+            f"Stack {stack_name} has no {', '.join(missing)} parameter(s), "
+            "apply the service again to reconcile it"
+        )
+        return None
+    if all(current[key] == str(value) for key, value in parameters.items()):
+        return None
+    log(f"Updating parameters of stack {stack_name}...")
+    token = f"kobidh-{uuid.uuid4()}"
+    response = client.update_stack(
+        StackName=stack_name,
+        UsePreviousTemplate=True,
+        Parameters=_update_parameters(current, current, parameters),
+        Capabilities=CAPABILITIES,
+        ClientRequestToken=token,
+    )
+    if wait:
+        wait_for_stack(client, stack_name, response, token)
+    return response
@@ -0,0 +1,190 @@
+"""
+Critical path analysis of the last operation on a stack.
+
+The dependency graph is rebuilt from the `Ref`, `Fn::GetAtt`, `Fn::Sub` and
+`DependsOn` references of the deployed template and joined with the resource
+timings of the stack events. CloudFormation starts a resource as soon as
+everything it references is done, so the longest chain of durations through
+that graph bounds the stack operation. Resources off that chain have slack:
+they could take that much longer without delaying the stack.
+"""
+
+import json
+import re
+from kobidh.resource.events import last_operation_events, resource_timings
+from kobidh.utils.logging import log, log_bold, log_warning
+
+SUB_REFERENCE = re.compile(r"\$\{([A-Za-z0-9]+)(?:\.[A-Za-z0-9.]+)?\}")
+
+
+def _references(node, resources) -> set:
+    refs = set()
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "Ref" and isinstance(value, str):
+                refs.add(value)
+            elif key == "Fn::GetAtt":
+                target = value[0] if isinstance(value, list) else value.split(".")[0]
+                refs.add(target)
+            elif key == "Fn::Sub":
+                text = value[0] if isinstance(value, list) else value
+                refs.update(SUB_REFERENCE.findall(text))
+            refs |= _references(value, resources)
+    elif isinstance(node, list):
+        for item in node:
+            refs |= _references(item, resources)
+    return refs & resources
+
+
+def dependency_graph(template: dict) -> dict:
+    """
+    Returns:
+        {logical id: set of the logical ids it depends on}
+    """
+    resources = template.get("Resources", {})
+    names = set(resources)
+    graph = {}
+    for logical_id, resource in resources.items():
+        depends_on = resource.get("DependsOn", [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        deps = _references(resource.get("Properties", {}), names)
+        deps |= set(depends_on) & names
+        deps.discard(logical_id)
+        graph[logical_id] = deps
+    return graph
+
+
+def _topological_order(graph: dict) -> list:
+    order, visited = [], set()
+
+    def visit(node):
+        if node in visited:
+            return
+        visited.add(node)
+        for dep in sorted(graph[node]):
+            visit(dep)
+        order.append(node)
+
+    for node in sorted(graph):
+        visit(node)
+    return order
+
+
+def critical_path(graph: dict, durations: dict) -> dict:
+    """
+    Classic critical path method over `graph`.
+
+    Args:
+        graph: Output of `dependency_graph`
+        durations: {logical id: seconds}, resources not touched by the
+            operation count as 0
+
+    Returns:
+        {"path": [logical ids], "total": seconds,
+         "resources": {logical id: {"duration", "earliest_start", "slack"}}}
+    """
+    order = _topological_order(graph)
+    earliest_finish, earliest_start = {}, {}
+    for node in order:
+        earliest_start[node] = max(
+            (earliest_finish[dep] for dep in graph[node]), default=0.0
+        )
+        earliest_finish[node] = earliest_start[node] + durations.get(node, 0.0)
+    total = max(earliest_finish.values(), default=0.0)
+
+    dependents = {node: set() for node in graph}
+    for node, deps in graph.items():
+        for dep in deps:
+            dependents[dep].add(node)
+    latest_start = {}
+    for node in reversed(order):
+        latest_finish = min(
+            (latest_start[child] for child in dependents[node]), default=total
+        )
+        latest_start[node] = latest_finish - durations.get(node, 0.0)
+
+    path = []
+    if order:
+        node = max(order, key=lambda n: (earliest_finish[n], n))
+        while node is not None:
+            path.append(node)
+            deps = graph[node]
+            node = max(deps, key=lambda n: (earliest_finish[n], n)) if deps else None
+        path.reverse()
+
+    return {
+        "path": path,
+        "total": total,
+        "resources": {
+            node: {
+                "duration": durations.get(node, 0.0),
+                "earliest_start": earliest_start[node],
+                "slack": latest_start[node] - earliest_start[node],
+            }
+            for node in graph
+        },
+    }
+
+
+def stack_timeline(client, stack_name: str) -> dict:
+    """
+    Critical path of the last operation on `stack_name`, with the observed
+    start offset and final status of every resource.
+    """
+    stack = client.describe_stacks(StackName=stack_name)["Stacks"][0]
+    template = client.get_template(StackName=stack_name, TemplateStage="Original")
+    body = template["TemplateBody"]
+    if isinstance(body, str):
+        body = json.loads(body)
+    events = last_operation_events(client, stack["StackId"])
+    timings = resource_timings(events)
+    graph = dependency_graph(body)
+    durations = {
+        logical_id: (timing["end"] - timing["start"]).total_seconds()
+        for logical_id, timing in timings.items()
+        if logical_id in graph and timing["end"]
+    }
+    report = critical_path(graph, durations)
+    started = events[0]["Timestamp"] if events else None
+    for logical_id, row in report["resources"].items():
+        timing = timings.get(logical_id)
+        row["type"] = body["Resources"][logical_id]["Type"]
+        row["status"] = timing["status"] if timing else None
+        row["started"] = (timing["start"] - started).total_seconds() if timing else None
+    report["stack_status"] = stack["StackStatus"]
+    report["elapsed"] = (
+        (events[-1]["Timestamp"] - started).total_seconds() if events else 0.0
+    )
+    return report
+
+
+def log_timeline(report: dict):
+    """Print the resources in critical path order, then the rest by slack."""
+    critical = set(report["path"])
+    rows = sorted(
+        report["resources"].items(),
+        key=lambda item: (
+            item[0] not in critical,
+            item[1]["slack"],
+            item[1]["earliest_start"],
+        ),
+    )
+    log_bold(
+        f"  {'Resource':<40} {'Type':<40} {'Started':>8} {'Duration':>9} {'Slack':>8}"
+    )
+    for logical_id, row in rows:
+        marker = "*" if logical_id in critical else " "
+        started = f"{row['started']:.0f}s" if row["started"] is not None else "-"
+        log(
+            f"{marker} {logical_id:<40} {row['type']:<40} {started:>8} "
+            f"{row['duration']:>8.1f}s {row['slack']:>7.1f}s"
+        )
+    if not report["path"]:
+        log_warning("No resources found in the stack template")
+        return
+    log_bold(f"Critical path ({report['total']:.1f}s): {' -> '.join(report['path'])}")
+    log(
+        f"Last operation ended in {report['stack_status']} after "
+        f"{report['elapsed']:.1f}s"
+    )
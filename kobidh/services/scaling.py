@@ -1,6 +1,4 @@
 import sys
-import json
-import boto3
 from troposphere import Ref, GetAtt, Base64, Join
 from troposphere.ec2 import (
     LaunchTemplate,
@@ -13,6 +11,7 @@ from troposphere.ec2 import (
 from troposphere.autoscaling import LaunchTemplateSpecification, AutoScalingGroup
 from kobidh.resource.config import Config, StackOutput
 from kobidh.utils.logging import log
+from kobidh.resource.provision.ami import AMIResolver
 
 
 class AutoScalingConfig:
@@ -27,14 +26,15 @@ class AutoScalingConfig:
         self.asg = None
 
     def _get_ami_id(self):
-        # Pick from https://docs.aws.amazon.com/AmazonECS/latest/developerguide/al2ami.html
-        ssm_client = boto3.client("ssm")
-        ami_response = ssm_client.get_parameter(
-            Name="/aws/service/ecs/optimized-ami/amazon-linux-2023/recommended"
-        )
         if "unittest" in sys.modules.keys():
             return "ami-test01234"
-        return json.loads(ami_response["Parameter"]["Value"])["image_id"]
+        image = AMIResolver().resolve(self.config.region)
+        # Record the resolved image so the template shows which AMI it uses
+        self.config.template.set_metadata(
+            {**self.config.template.metadata, "KobidhImage": image}
+        )
+        log(f'Using ECS optimized AMI "{image["image_id"]}" ({image["image_name"]})')
+        return image["image_id"]
 
     def _configure(self):
         # Launch Configuration
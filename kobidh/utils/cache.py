@@ -0,0 +1,124 @@
+"""
+On-disk cache for slow AWS lookups, stored as JSON files under `~/.kobidh/cache`.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+from kobidh.meta import DIR
+
+_enabled = True
+
+
+def set_enabled(enabled: bool):
+    """Enable or disable cache reads for the current process (`--no-cache`)."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def fingerprint(*parts: str) -> str:
+    """Stable, non reversible fingerprint of the given parts (e.g. access keys)."""
+    digest = hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class DiskCache:
+    """
+    A namespaced key/value store with per entry expiry.
+
+    Entries are kept in `~/.kobidh/cache/<namespace>.json`. Writes go through a
+    temporary file and an atomic rename, so concurrent kobidh processes never
+    read a partially written file. When the cache is disabled with
+    `set_enabled(False)` reads always miss but fresh values are still written.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[int] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.path = os.path.join(
+            os.path.expanduser("~"), DIR, "cache", f"{namespace}.json"
+        )
+        self._lock = threading.Lock()
+        self._entries = None
+        self._mtime = None
+
+    def get(self, key: str) -> Optional[Any]:
+        if not _enabled:
+            return None
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None:
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return entry["value"]
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        expires_at: Optional[float] = None,
+    ):
+        ttl = ttl if ttl is not None else self.ttl
+        if expires_at is None and ttl is not None:
+            expires_at = time.time() + ttl
+        with self._lock:
+            entries = dict(self._load())
+            entries[key] = {
+                "value": value,
+                "created_at": time.time(),
+                "expires_at": expires_at,
+            }
+            self._dump(entries)
+
+    def delete(self, key: str):
+        with self._lock:
+            entries = dict(self._load())
+            if entries.pop(key, None) is not None:
+                self._dump(entries)
+
+    def clear(self):
+        with self._lock:
+            self._dump({})
+
+    def _load(self) -> dict:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self._entries is None or mtime != self._mtime:
+            try:
+                with open(self.path, "r") as file:
+                    self._entries = json.load(file)
+            except (OSError, ValueError):
+                # A corrupt cache file is treated as empty and overwritten
+                self._entries = {}
+            self._mtime = mtime
+        return self._entries
+
+    def _dump(self, entries: dict):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{self.namespace}.")
+        try:
+            # Cache entries may hold account ids or registry tokens
+            os.chmod(tmp_path, 0o600)
+            with os.fdopen(fd, "w") as file:
+                json.dump(entries, file, default=str)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._entries = entries
+        self._mtime = os.stat(self.path).st_mtime_ns
@@ -0,0 +1,97 @@
+"""
+Process wide registry of boto3 sessions and clients.
+
+Creating a boto3 client loads and parses the botocore service model and opens
+a new connection pool, so kobidh creates each client once per
+(service, region, profile) and shares it for the rest of the process. boto3
+clients are thread safe, sessions are not, so client creation is serialized.
+Every client is rate limited per (service, region), see
+`kobidh.utils.ratelimit`.
+"""
+
+import os
+import threading
+from typing import Optional
+from kobidh.constants import (
+    AWS_CONNECT_TIMEOUT,
+    AWS_MAX_ATTEMPTS,
+    AWS_MAX_POOL_CONNECTIONS,
+    AWS_READ_TIMEOUT,
+)
+
+_lock = threading.RLock()
+_config = None
+_sessions = {}
+_clients = {}
+
+
+def get_config():
+    """The botocore `Config` shared by every kobidh client."""
+    global _config
+    with _lock:
+        if _config is None:
+            from botocore.config import Config
+
+            _config = Config(
+                max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                connect_timeout=AWS_CONNECT_TIMEOUT,
+                read_timeout=AWS_READ_TIMEOUT,
+                # Throttling backs off in `kobidh.utils.ratelimit`, shared
+                # across clients, instead of botocore's per client limiter
+                retries={"mode": "standard", "max_attempts": AWS_MAX_ATTEMPTS},
+            )
+        return _config
+
+
+def get_session(profile: Optional[str] = None):
+    """Return the shared boto3 session for `profile` (default: `AWS_PROFILE`)."""
+    import boto3
+
+    profile = profile or os.environ.get("AWS_PROFILE")
+    with _lock:
+        session = _sessions.get(profile)
+        if session is None:
+            session = boto3.session.Session(profile_name=profile)
+            _sessions[profile] = session
+        return session
+
+
+def get_client(
+    service: str, region: Optional[str] = None, profile: Optional[str] = None
+):
+    """
+    Return the shared client for `service` in `region`.
+
+    Args:
+        service: AWS service name (e.g. "cloudformation")
+        region: AWS region, defaults to the region of the session
+        profile: AWS profile, defaults to `AWS_PROFILE`
+
+    Returns:
+        A botocore client configured with `get_config()`
+    """
+    session = get_session(profile)
+    region = region or session.region_name
+    key = (service, region, profile or os.environ.get("AWS_PROFILE"))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from kobidh.utils import ratelimit
+
+            client = session.client(service, region_name=region, config=get_config())
+            ratelimit.attach(client, service, client.meta.region_name)
+            _clients[key] = client
+        return client
+
+
+def reset():
+    """Drop every cached session and client (e.g. after credentials change)."""
+    from kobidh.utils import ratelimit
+
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+    ratelimit.reset()
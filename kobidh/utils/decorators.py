@@ -1,25 +1,71 @@
-import boto3
-import botocore
+import functools
 from click import echo, prompt
+from kobidh.constants import IDENTITY_CACHE_TTL
+from kobidh.utils.cache import DiskCache, fingerprint
+from kobidh.utils.clients import get_client, get_session
+
+identity_cache = DiskCache("identity", ttl=IDENTITY_CACHE_TTL)
+
+
+def _identity_key(session, credentials) -> str:
+    # The secret key never leaves botocore, only a fingerprint of the key pair
+    # is stored so rotated credentials are validated again.
+    return ":".join(
+        [
+            session.profile_name or "default",
+            fingerprint(credentials.access_key, credentials.secret_key),
+        ]
+    )
+
+
+def caller_identity() -> dict:
+    """
+    {"UserId", "Account", "Arn"} of the current credentials, cached for
+    `IDENTITY_CACHE_TTL` per profile and key pair.
+    """
+    session = get_session()
+    credentials = session.get_credentials()
+
+    if credentials is None:
+        raise Exception(
+            "AWS credentials not found. Run `aws configure` to set them up."
+        )
+
+    key = _identity_key(session, credentials.get_frozen_credentials())
+    identity = identity_cache.get(key)
+    if identity is None:
+        client = get_client("sts")
+        identity = client.get_caller_identity()
+        identity = {k: identity[k] for k in ("UserId", "Account", "Arn")}
+        identity_cache.set(key, identity)
+    return identity
+
 
 def aws_credentails(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        try:
-            session = boto3.Session()
-            credentials = session.get_credentials()
+        # Imported lazily, botocore is only needed once a command touches AWS
+        import botocore
 
-            if credentials is None:
-                raise Exception("AWS credentials not found. Run `aws configure` to set them up.")
-            
-            client = session.client("sts")
-            identity = client.get_caller_identity()
-            echo(f"AWS credentials are set up correctly. Account ID: {identity['Account']}")
+        try:
+            identity = caller_identity()
+            # stderr, so machine readable output on stdout stays clean
+            account = identity["Account"]
+            echo(
+                f"AWS credentials are set up correctly. Account ID: {account}",
+                err=True,
+            )
 
         except botocore.exceptions.NoCredentialsError:
-            raise Exception("No AWS credentials found. Run `aws configure` to set them up.")
+            raise Exception(
+                "No AWS credentials found. Run `aws configure` to set them up."
+            )
         except botocore.exceptions.PartialCredentialsError:
-            raise Exception("Incomplete AWS credentials found. Please check your AWS configuration.")
+            raise Exception(
+                "Incomplete AWS credentials found. Please check your AWS configuration."
+            )
         except Exception as e:
             raise Exception(f"An error occurred: {e}")
         return func(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+
+    return wrapper
@@ -1,29 +1,63 @@
+import contextvars
+from contextlib import contextmanager
 import click
 
+_prefix_var = contextvars.ContextVar("kobidh_log_prefix", default=None)
+
+
+@contextmanager
+def prefixed(prefix: str):
+    """
+    Prefix every line logged in the current context, e.g. `[worker] ...`.
+    Worker threads keep the prefix when they run in a copy of the caller's
+    context, see `in_context`.
+    """
+    token = _prefix_var.set(prefix)
+    try:
+        yield
+    finally:
+        _prefix_var.reset(token)
+
+
+def current_prefix():
+    return _prefix_var.get()
+
+
+def in_context(func):
+    """`func` bound to a copy of the caller's context, to run on a thread pool"""
+    context = contextvars.copy_context()
+    # A context can only be entered by one thread at a time
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def _prefix(text):
+    prefix = current_prefix()
+    return f"[{prefix}] {text}" if prefix else text
+
 
 def log_err(text):
-    click.secho(text, fg="red", bold=True)
+    click.secho(_prefix(text), fg="red", bold=True)
 
 
 def log(text):
-    click.secho(text, fg="green")
+    click.secho(_prefix(text), fg="green")
 
 
 def log_warning(text):
-    click.secho(text, fg="yellow")
+    click.secho(_prefix(text), fg="yellow")
 
 
 def log_bold(text):
-    click.secho(text, fg="green", bold=True)
+    click.secho(_prefix(text), fg="green", bold=True)
 
 
 def log_intent(text, level=1):
-    click.secho("".join(["  "] * level + [text]), fg="green")
+    click.secho(_prefix("".join(["  "] * level + [text])), fg="green")
 
 
 def log_intent_err(text, level=1):
-    click.secho("".join(["  "] * level + [text]), fg="red")
+    click.secho(_prefix("".join(["  "] * level + [text])), fg="red")
 
 
 def log_with_color(text, color, level=2):
-    click.secho("".join(["  "] * level + [text]), fg=color)
+    click.secho(_prefix("".join(["  "] * level + [text])), fg=color)
@@ -0,0 +1,149 @@
+"""
+Client side rate limiting of AWS API calls.
+
+Every client created by `kobidh.utils.clients` takes a token from the bucket
+of its (service, region) before each HTTP attempt, retries included. The
+buckets are shared by all threads, so concurrent commands (bulk operations,
+layered stacks, fact lookups) stay under one budget instead of each
+tripping the service quota on its own.
+
+The rate adapts to throttling: it is halved on every throttling response and
+grows back linearly with successful calls (AIMD).
+"""
+
+import logging
+import threading
+import time
+from kobidh.constants import (
+    API_DEFAULT_RATE_LIMIT,
+    API_MIN_RATE_LIMIT,
+    API_RATE_LIMITS,
+)
+from kobidh.exceptions import THROTTLING_ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_buckets = {}
+
+
+class TokenBucket:
+    """Thread safe token bucket whose refill rate backs off on throttling."""
+
+    def __init__(self, rate: float, burst: float = None, min_rate: float = None):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate or API_MIN_RATE_LIMIT), self.max_rate)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        # Counters, see `stats`
+        self.calls = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """
+        Take a token, sleeping until one is available.
+
+        Returns:
+            Seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Reserve the token now, callers queue up behind each other
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.calls += 1
+            self.waited += delay
+            self.max_wait = max(self.max_wait, delay)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waited": self.waited,
+                "max_wait": self.max_wait,
+                "rate": self.rate,
+            }
+
+
+def get_bucket(service: str, region: str) -> TokenBucket:
+    """The bucket shared by every client of `service` in `region`."""
+    key = (service, region)
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(API_RATE_LIMITS.get(service, API_DEFAULT_RATE_LIMIT))
+            _buckets[key] = bucket
+        return bucket
+
+
+def is_throttling(response) -> bool:
+    if not response:
+        return False
+    parsed = response[1] or {}
+    return parsed.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+def attach(client, service: str, region: str):
+    """Route every HTTP attempt of `client` through the bucket of its service."""
+    bucket = get_bucket(service, region)
+
+    def before_send(**kwargs):
+        bucket.acquire()
+
+    def needs_retry(response=None, **kwargs):
+        if is_throttling(response):
+            logger.debug(f"{service} ({region}) throttled, backing off")
+            bucket.on_throttle()
+        elif response is not None:
+            bucket.on_success()
+
+    client.meta.events.register_first("before-send", before_send)
+    client.meta.events.register_first("needs-retry", needs_retry)
+    return client
+
+
+def stats() -> dict:
+    """{(service, region): counters} for every bucket used so far."""
+    with _lock:
+        buckets = dict(_buckets)
+    return {key: bucket.stats() for key, bucket in buckets.items()}
+
+
+def log_stats():
+    for (service, region), counters in sorted(stats().items()):
+        logger.debug(
+            f"{service} ({region}): {counters['calls']} calls, "
+            f"{counters['throttled']} throttled, waited {counters['waited']:.2f}s "
+            f"(max {counters['max_wait']:.2f}s), rate {counters['rate']:.1f}/s"
+        )
+
+
+def reset():
+    with _lock:
+        _buckets.clear()
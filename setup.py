@@ -29,7 +29,7 @@ setup(
     ],
     entry_points="""
         [console_scripts]
-        kobidh=kobidh.cli:main
+        kobidh=kobidh.daemon:run
     """,
     keywords=["cli", "automation", "deployment", "server-side", "devops"],
 )
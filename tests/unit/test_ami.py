@@ -0,0 +1,56 @@
+"""
+Tests for the cached ECS optimized AMI resolver.
+"""
+
+import json
+import pytest
+from kobidh.resource.provision import ami
+
+
+class FakeSSM:
+    def __init__(self, region):
+        self.region = region
+        self.calls = []
+
+    def get_parameter(self, Name):
+        self.calls.append(Name)
+        value = {"image_id": f"ami-{self.region}", "image_name": "al2023-ecs"}
+        return {"Parameter": {"Value": json.dumps(value)}}
+
+
+@pytest.fixture
+def clients(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(ami, "ami_cache", ami.DiskCache("ami", ttl=60))
+    clients = {}
+    monkeypatch.setattr(
+        ami,
+        "get_client",
+        lambda service, region: clients.setdefault(region, FakeSSM(region)),
+    )
+    return clients
+
+
+def test_resolve_is_cached_per_region(clients):
+    resolver = ami.AMIResolver()
+    assert resolver.resolve("ap-south-1")["image_id"] == "ami-ap-south-1"
+    assert resolver.resolve("ap-south-1")["image_id"] == "ami-ap-south-1"
+    assert len(clients["ap-south-1"].calls) == 1
+
+
+def test_prefetch_regions(clients):
+    images = ami.AMIResolver("amazon-linux-2023", "arm64").prefetch(
+        ["ap-south-1", "us-east-1"]
+    )
+    assert {r: i["image_id"] for r, i in images.items()} == {
+        "ap-south-1": "ami-ap-south-1",
+        "us-east-1": "ami-us-east-1",
+    }
+    assert clients["us-east-1"].calls == [
+        ami.AMI_PARAMETERS[("amazon-linux-2023", "arm64")]
+    ]
+
+
+def test_unknown_family():
+    with pytest.raises(ValueError):
+        ami.AMIResolver("windows", "x86_64")
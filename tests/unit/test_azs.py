@@ -0,0 +1,80 @@
+"""
+Tests for availability zone discovery, caching and pinning.
+"""
+
+import os
+import pytest
+from click.testing import CliRunner
+from kobidh import cli
+from kobidh.core import Config
+from kobidh.resource.config import Config as AppConfig
+from kobidh.resource.facts import Facts
+from kobidh.resource.infra import vpc_config
+from kobidh.resource.infra.vpc_config import VPCConfig, get_azs
+from kobidh.utils import decorators
+
+
+class FakeEC2:
+    def __init__(self, zones):
+        self.zones = zones
+        self.calls = 0
+
+    def describe_availability_zones(self, Filters):
+        self.calls += 1
+        return {"AvailabilityZones": [{"ZoneName": zone} for zone in self.zones]}
+
+
+@pytest.fixture
+def aws(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(vpc_config, "az_cache", vpc_config.DiskCache("azs", ttl=60))
+    account = {"Account": "111111111111"}
+    monkeypatch.setattr(decorators, "caller_identity", lambda: dict(account))
+    ec2 = FakeEC2(["ap-south-1a", "ap-south-1b"])
+    monkeypatch.setattr(vpc_config, "get_client", lambda service, region: ec2)
+    return account, ec2
+
+
+def test_azs_are_cached_per_account_and_region(aws):
+    account, ec2 = aws
+    assert get_azs("ap-south-1") == ["ap-south-1a", "ap-south-1b"]
+    assert get_azs("ap-south-1") == ["ap-south-1a", "ap-south-1b"]
+    assert ec2.calls == 1
+
+    # Another account has its own zones
+    account["Account"] = "222222222222"
+    ec2.zones = ["ap-south-1b", "ap-south-1c"]
+    assert get_azs("ap-south-1") == ["ap-south-1b", "ap-south-1c"]
+    assert ec2.calls == 2
+
+    assert get_azs("ap-south-1", refresh=True) == ["ap-south-1b", "ap-south-1c"]
+    assert ec2.calls == 3
+
+
+def test_pinned_azs_skip_discovery(aws, tmp_path):
+    _, ec2 = aws
+    os.makedirs(tmp_path / ".kobidh")
+    (tmp_path / ".kobidh" / "default.txt").write_text(
+        "azs.ap-south-1: ap-south-1a, ap-south-1c\n"
+    )
+    zones = Config().pinned_azs("ap-south-1")
+    assert zones == ["ap-south-1a", "ap-south-1c"]
+    assert Config().pinned_azs("eu-west-1") is None
+
+    config = AppConfig("tomato", "ap-south-1", Facts(azs=zones, services=[]))
+    assert [subnet["az"] for subnet in VPCConfig(config).subnets_config] == [
+        "ap-south-1a",
+        "ap-south-1a",
+        "ap-south-1c",
+        "ap-south-1c",
+    ]
+    assert ec2.calls == 0
+
+
+def test_azs_refresh_command(aws):
+    _, ec2 = aws
+    get_azs("ap-south-1")
+    result = CliRunner().invoke(cli.main, ["azs.refresh", "-r", "ap-south-1"])
+    assert result.exit_code == 0, result.output
+    assert "ap-south-1a, ap-south-1b" in result.output
+    assert ec2.calls == 2
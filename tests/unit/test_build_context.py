@@ -0,0 +1,120 @@
+"""
+Tests for the content addressed build context.
+"""
+
+import os
+import pytest
+from kobidh.resource.provision import build_context
+from kobidh.utils.cache import DiskCache
+
+
+@pytest.fixture
+def context(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(build_context, "stat_index", DiskCache("build-context"))
+    monkeypatch.setattr(build_context, "image_index", DiskCache("build-images"))
+    root = tmp_path / "app"
+    (root / "src").mkdir(parents=True)
+    (root / "node_modules" / "left-pad").mkdir(parents=True)
+    (root / "Dockerfile").write_text("FROM scratch\nCOPY . /app\n")
+    (root / "src" / "main.py").write_text("print('hello')\n")
+    (root / "node_modules" / "left-pad" / "index.js").write_text("module.exports")
+    (root / "debug.log").write_text("noise")
+    (root / "keep.log").write_text("kept")
+    (root / ".dockerignore").write_text("# comment\nnode_modules\n*.log\n!keep.log\n")
+    return root
+
+
+def test_dockerignore_rules(context):
+    rules = build_context.read_dockerignore(str(context))
+    assert rules == [("node_modules", True), ("*.log", True), ("keep.log", False)]
+    assert build_context.is_ignored("node_modules/left-pad/index.js", rules)
+    assert build_context.is_ignored("debug.log", rules)
+    assert not build_context.is_ignored("keep.log", rules)
+    assert build_context._files(str(context), rules) == [
+        ".dockerignore",
+        "Dockerfile",
+        "keep.log",
+        "src/main.py",
+    ]
+
+
+def test_dockerignore_wildcards_do_not_cross_directories():
+    rules = [("*.md", True)]
+    assert build_context.is_ignored("README.md", rules)
+    # Docker sends nested files a root pattern does not match
+    assert not build_context.is_ignored("docs/a.md", rules)
+    assert build_context.is_ignored("docs/a.md", [("*/*.md", True)])
+    assert not build_context.is_ignored("docs/api/a.md", [("*/*.md", True)])
+    assert not build_context.is_ignored("docs/a.md", [("doc?/a.md", False)])
+
+
+def test_dockerignore_double_star():
+    rules = [("**/*.pyc", True), ("build/**", True), ("build/keep", False)]
+    assert build_context.is_ignored("main.pyc", rules)
+    assert build_context.is_ignored("src/pkg/main.pyc", rules)
+    assert not build_context.is_ignored("src/pkg/main.py", rules)
+    assert build_context.is_ignored("build/out/app", rules)
+    assert not build_context.is_ignored("build/keep", rules)
+
+
+def test_nested_files_change_the_hash(context):
+    (context / ".dockerignore").write_text("*.md\n")
+    (context / "docs").mkdir()
+    nested = context / "docs" / "a.md"
+    nested.write_text("one")
+    (context / "README.md").write_text("ignored")
+    first = build_context.context_hash(str(context))
+    nested.write_text("two")
+    os.utime(nested, ns=(0, 1))
+    assert build_context.context_hash(str(context)) != first
+
+
+def test_context_hash_reads_changed_files_only(context, monkeypatch):
+    reads = []
+    file_digest = build_context._file_digest
+
+    def counting(path, mode):
+        reads.append(os.path.relpath(path, context))
+        return file_digest(path, mode)
+
+    monkeypatch.setattr(build_context, "_file_digest", counting)
+    first = build_context.context_hash(str(context))
+    assert len(reads) == 4
+
+    reads.clear()
+    assert build_context.context_hash(str(context)) == first
+    assert reads == []
+
+    # Ignored files do not change the hash
+    (context / "debug.log").write_text("more noise")
+    assert build_context.context_hash(str(context)) == first
+
+    main = context / "src" / "main.py"
+    main.write_text("print('hello, world')\n")
+    os.utime(main, ns=(0, 1))
+    changed = build_context.context_hash(str(context))
+    assert changed != first
+    assert reads == ["src/main.py"]
+
+    # The executable bit is part of the hash
+    main.chmod(0o755)
+    assert build_context.context_hash(str(context)) != changed
+
+
+def test_image_index(context):
+    uri = "123456789012.dkr.ecr.ap-south-1.amazonaws.com/tomato-repository/web"
+    digest = build_context.context_hash(str(context))
+    assert build_context.pushed_image(uri, digest) is None
+    build_context.record_image(uri, digest, "sha256:abc")
+    assert build_context.pushed_image(uri, digest) == "sha256:abc"
+
+
+def test_dockerfile_is_hashed_even_when_ignored(context):
+    (context / ".dockerignore").write_text("Dockerfile\n.dockerignore\n*.log\n")
+    rules = build_context.read_dockerignore(str(context))
+    files = build_context._files(str(context), rules)
+    assert ".dockerignore" in files and "Dockerfile" in files
+    before = build_context.context_hash(str(context))
+    (context / "Dockerfile").write_text("FROM scratch\nCOPY src /app\n")
+    assert build_context.context_hash(str(context)) != before
@@ -0,0 +1,68 @@
+"""
+Tests for bulk multi-app operations.
+"""
+
+import threading
+import pytest
+from kobidh.core import Bulk
+from kobidh.exceptions import ConfigurationError, DeploymentError
+
+
+def test_targets_from_names_and_manifest(tmp_path):
+    manifest = tmp_path / "apps.txt"
+    manifest.write_text("# team apps\ntomato\n\npotato us-east-1  # legacy\ntomato\n")
+    targets = Bulk.targets(["onion"], str(manifest), "ap-south-1")
+    assert targets == [
+        ("onion", "ap-south-1"),
+        ("tomato", "ap-south-1"),
+        ("potato", "us-east-1"),
+    ]
+    with pytest.raises(ConfigurationError):
+        Bulk.targets([], None)
+    with pytest.raises(ConfigurationError):
+        Bulk.targets([], str(tmp_path / "missing.txt"))
+
+
+def test_run_overlaps_apps_and_aggregates_failures():
+    targets = [("tomato", None), ("potato", None), ("onion", None)]
+    # Every operation waits for the others, so this only passes concurrently
+    barrier = threading.Barrier(len(targets), timeout=5)
+
+    def operation(name, region):
+        barrier.wait()
+        if name == "potato":
+            raise RuntimeError("stack is in ROLLBACK_COMPLETE")
+
+    with pytest.raises(DeploymentError) as error:
+        Bulk(targets, max_workers=3).run("apps.create", operation)
+    assert "1 of 3" in error.value.message and "potato" in error.value.message
+
+
+@pytest.mark.parametrize("command", ["apps.create", "apps.delete", "service.create"])
+def test_parallel_must_be_positive(command):
+    from click.testing import CliRunner
+    from kobidh import cli
+
+    result = CliRunner().invoke(cli.main, [command, "a", "b", "-p", "0"])
+    assert result.exit_code == 2
+    assert "0 is not in the range" in result.output
+
+
+def test_service_create_rejects_one_image_for_many_apps():
+    from click.testing import CliRunner
+    from kobidh import cli
+
+    result = CliRunner().invoke(
+        cli.main, ["service.create", "a", "b", "--image", "nginx:1"]
+    )
+    assert result.exit_code == 2
+    assert "--image" in result.output
+
+
+def test_run_prefixes_each_app_log(capsys):
+    from kobidh.utils.logging import log
+
+    targets = [("tomato", None), ("potato", None)]
+    Bulk(targets, max_workers=2).run("apps.create", lambda name, _: log("created"))
+    out = capsys.readouterr().out
+    assert "[tomato] created" in out and "[potato] created" in out
@@ -0,0 +1,47 @@
+"""
+Tests for the on-disk cache used by AWS lookups.
+"""
+
+import os
+import time
+import pytest
+from kobidh.utils import cache
+from kobidh.utils.cache import DiskCache, fingerprint
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    yield tmp_path
+    cache.set_enabled(True)
+
+
+def test_set_and_get(home):
+    store = DiskCache("test", ttl=60)
+    store.set("key", {"Account": "123456789012"})
+    assert DiskCache("test").get("key") == {"Account": "123456789012"}
+    path = os.path.join(home, ".kobidh", "cache", "test.json")
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_expired_entries_miss():
+    store = DiskCache("test")
+    store.set("old", "value", expires_at=time.time() - 1)
+    store.set("new", "value", ttl=60)
+    assert store.get("old") is None
+    assert store.get("new") == "value"
+
+
+def test_disabled_cache_misses_but_writes():
+    store = DiskCache("test", ttl=60)
+    cache.set_enabled(False)
+    store.set("key", "value")
+    assert store.get("key") is None
+    cache.set_enabled(True)
+    assert store.get("key") == "value"
+
+
+def test_fingerprint_hides_input():
+    assert fingerprint("AKIA", "secret") == fingerprint("AKIA", "secret")
+    assert fingerprint("AKIA", "secret") != fingerprint("AKIA", "rotated")
+    assert "secret" not in fingerprint("AKIA", "secret")
@@ -0,0 +1,49 @@
+"""
+Import-time budget for the CLI entry point.
+"""
+
+import os
+import subprocess
+import sys
+
+# Cumulative import budget (in microseconds) for `kobidh --help`, excluding
+# interpreter start-up (`site`). boto3 + troposphere alone cost ~350ms.
+IMPORT_BUDGET_US = 200_000
+HEAVY_MODULES = ("boto3", "botocore", "troposphere", "kobidh.resource")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def _importtime(*args):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "kobidh.cli", *args],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented below their parent
+        imports.append((name.rstrip()[1:], int(cumulative)))
+    return imports
+
+
+def test_help_skips_heavy_imports():
+    """`kobidh --help` must not import the AWS SDK or troposphere."""
+    names = [name.strip() for name, _ in _importtime("--help")]
+    for module in HEAVY_MODULES:
+        assert not [n for n in names if n == module or n.startswith(module + ".")]
+
+
+def test_help_import_budget():
+    """`kobidh --help` stays within the import-time budget."""
+    total = sum(
+        cumulative
+        for name, cumulative in _importtime("--help")
+        # Top level imports only, nested ones are part of their parent
+        if not name.startswith(" ") and name != "site"
+    )
+    assert total < IMPORT_BUDGET_US, f"{total}us spent importing modules"
@@ -0,0 +1,73 @@
+"""
+Tests for the process wide boto3 client registry.
+"""
+
+import threading
+import time
+import boto3
+import pytest
+from kobidh.utils import clients
+
+
+@pytest.fixture(autouse=True)
+def aws(tmp_path, monkeypatch):
+    config = tmp_path / "config"
+    config.write_text(
+        "[default]\nregion = us-east-1\n\n[profile other]\nregion = us-east-1\n"
+    )
+    monkeypatch.setenv("AWS_CONFIG_FILE", str(config))
+    monkeypatch.setenv("AWS_SHARED_CREDENTIALS_FILE", str(tmp_path / "credentials"))
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    clients.reset()
+    yield
+    clients.reset()
+
+
+def test_same_key_returns_same_client():
+    client = clients.get_client("sts", "us-east-1")
+    assert clients.get_client("sts", "us-east-1") is client
+    assert clients.get_client("sts") is client
+
+
+def test_regions_and_profiles_get_distinct_clients():
+    client = clients.get_client("sts", "us-east-1")
+    other_region = clients.get_client("sts", "eu-west-1")
+    other_profile = clients.get_client("sts", "us-east-1", profile="other")
+    assert other_region is not client and other_profile is not client
+    assert other_region.meta.region_name == "eu-west-1"
+    assert other_profile is not other_region
+
+
+def test_reset_clears_the_registry():
+    client = clients.get_client("sts", "us-east-1")
+    clients.reset()
+    assert clients.get_client("sts", "us-east-1") is not client
+
+
+def test_concurrent_calls_create_one_client(monkeypatch):
+    created = []
+    create = boto3.session.Session.client
+
+    def slow_client(self, *args, **kwargs):
+        created.append(args)
+        # Widen the window in which a second thread could miss the registry
+        time.sleep(0.05)
+        return create(self, *args, **kwargs)
+
+    monkeypatch.setattr(boto3.session.Session, "client", slow_client)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(clients.get_client("sts", "us-east-1"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
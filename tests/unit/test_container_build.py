@@ -0,0 +1,220 @@
+"""
+Tests for the BuildKit registry cache build of `container.push`.
+"""
+
+import base64
+import json
+import os
+import subprocess
+import time
+from datetime import datetime, timezone
+import pytest
+import kobidh.resource.provision as provision
+from kobidh.resource.provision import Provision, registry_auth
+from kobidh.utils.cache import DiskCache
+
+REGISTRY = "123456789012.dkr.ecr.ap-south-1.amazonaws.com"
+URI = f"{REGISTRY}/tomato-repository/web"
+IMAGE = "tomato-repository/web:1"
+
+
+class Run:
+    """Records the docker commands instead of running them"""
+
+    def __init__(self, builder_exists: bool):
+        self.builder_exists = builder_exists
+        self.commands = []
+
+    def __call__(self, args, **kwargs):
+        self.commands.append((args[1:], kwargs.get("input")))
+        returncode = 0 if self.builder_exists or args[2] != "inspect" else 1
+        return subprocess.CompletedProcess(args, returncode)
+
+
+def test_buildx_uses_registry_cache(monkeypatch):
+    run = Run(builder_exists=False)
+    monkeypatch.setattr(provision.subprocess, "run", run)
+    Provision._buildx(IMAGE, ".", "/tmp/image.tar", f"{URI}:buildcache")
+    commands = [args for args, _ in run.commands]
+    assert commands[0] == ["buildx", "inspect", "kobidh"]
+    assert commands[1][:3] == ["buildx", "create", "--name"]
+    build = commands[2]
+    cache_from = build[build.index("--cache-from") + 1]
+    assert cache_from == f"type=registry,ref={URI}:buildcache"
+    cache_to = build[build.index("--cache-to") + 1]
+    assert "image-manifest=true" in cache_to and "mode=max" in cache_to
+    assert build[build.index("--output") + 1].endswith("dest=/tmp/image.tar")
+
+    # An existing builder is reused
+    run = Run(builder_exists=True)
+    monkeypatch.setattr(provision.subprocess, "run", run)
+    Provision._buildx(IMAGE, ".", "/tmp/image.tar", f"{URI}:buildcache")
+    assert [args[1] for args, _ in run.commands] == ["inspect", "build"]
+
+
+class ECR:
+    """ECR client handing out tokens that expire in `lifetime` seconds"""
+
+    def __init__(self, lifetime: int = 12 * 3600):
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def get_authorization_token(self, registryIds):
+        self.calls += 1
+        token = base64.b64encode(b"AWS:secret").decode()
+        expires = datetime.fromtimestamp(time.time() + self.lifetime, timezone.utc)
+        return {
+            "authorizationData": [
+                {
+                    "authorizationToken": token,
+                    "proxyEndpoint": f"https://{REGISTRY}",
+                    "expiresAt": expires,
+                }
+            ]
+        }
+
+
+@pytest.fixture
+def tokens(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(registry_auth, "token_cache", DiskCache("ecr-tokens"))
+    monkeypatch.delenv("DOCKER_CONFIG", raising=False)
+    return tmp_path
+
+
+def _docker_auths(home, auths: dict):
+    config = home / ".docker" / "config.json"
+    config.parent.mkdir(exist_ok=True)
+    config.write_text(json.dumps({"auths": auths}))
+
+
+def test_docker_login_uses_cached_token(tokens, monkeypatch):
+    ecr, run = ECR(), Run(builder_exists=True)
+    monkeypatch.setattr(provision.subprocess, "run", run)
+    Provision._docker_login(ecr, "123456789012", "ap-south-1")
+    ((args, password),) = run.commands
+    assert args[0] == "login" and "secret" not in args
+    assert password == "secret"
+
+    # Back to back pushes reuse the token and docker's login with it
+    auth = base64.b64encode(b"AWS:secret").decode()
+    _docker_auths(tokens, {f"https://{REGISTRY}": {"auth": auth}})
+    Provision._docker_login(ecr, "123456789012", "ap-south-1")
+    assert ecr.calls == 1
+    assert [args[0] for args, _ in run.commands] == ["login"]
+
+    # After a `docker logout`, or a login with other credentials, docker logs
+    # in again
+    other = base64.b64encode(b"AWS:other").decode()
+    _docker_auths(tokens, {REGISTRY: {"auth": other}})
+    Provision._docker_login(ecr, "123456789012", "ap-south-1")
+    _docker_auths(tokens, {})
+    Provision._docker_login(ecr, "123456789012", "ap-south-1")
+    assert ecr.calls == 1
+    assert [args[0] for args, _ in run.commands] == ["login", "login", "login"]
+
+    # Tokens are per (account, region)
+    Provision._docker_login(ecr, "123456789012", "eu-west-1")
+    assert ecr.calls == 2
+
+
+def test_docker_credentials_from_helper(tokens, monkeypatch):
+    bin_dir = tokens / "bin"
+    bin_dir.mkdir()
+    helper = bin_dir / "docker-credential-fake"
+    helper.write_text(
+        "#!/bin/sh\n"
+        f'[ "$(cat)" = "{REGISTRY}" ] || exit 1\n'
+        'echo \'{"Username": "AWS", "Secret": "secret"}\'\n'
+    )
+    helper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    config = tokens / ".docker" / "config.json"
+    config.parent.mkdir()
+    config.write_text(json.dumps({"credHelpers": {REGISTRY: "fake"}}))
+    assert registry_auth.docker_credentials(f"https://{REGISTRY}") == {
+        "username": "AWS",
+        "password": "secret",
+    }
+    assert registry_auth.docker_credentials("https://other.example.com") is None
+
+
+def test_expiring_tokens_are_renewed(tokens):
+    # Within the refresh margin of its expiry
+    ecr = ECR(lifetime=60)
+    registry_auth.authorization(ecr, "123456789012", "ap-south-1")
+    registry_auth.authorization(ecr, "123456789012", "ap-south-1")
+    assert ecr.calls == 2
+
+
+def test_service_repositories():
+    from kobidh.resource.facts import Facts
+    from kobidh.resource.infra import Infra
+    from kobidh.resource.provision.ecr_push import service_repository_uri
+
+    facts = Facts(azs=["ap-south-1a", "ap-south-1b", "ap-south-1c"], services=[])
+    config = Infra.configure("tomato", "ap-south-1", facts, ["worker"])
+    template = config.template.to_dict()
+    names = sorted(
+        resource["Properties"]["RepositoryName"]
+        for resource in template["Resources"].values()
+        if resource["Type"] == "AWS::ECR::Repository"
+    )
+    assert names == ["tomato-repository/web", "tomato-repository/worker"]
+    worker = service_repository_uri(URI, "worker")
+    assert worker == f"{REGISTRY}/tomato-repository/worker"
+    assert service_repository_uri(URI, "web") == URI
+
+
+def test_push_services_in_parallel(monkeypatch, capsys):
+    from kobidh.exceptions import ContainerError
+    from kobidh.utils.logging import log
+
+    monkeypatch.setattr(provision.StackOutput, "validate", lambda self, n, r: None)
+    running, peak = [], []
+
+    def push(name, region, tag, context, registry_cache, service, timings):
+        running.append(service)
+        peak.append(len(running))
+        log(f"building {context}")
+        time.sleep(0.05)
+        running.remove(service)
+        if service == "scheduler":
+            raise ContainerError("docker build failed with exit code 1")
+        timings.update(build=1.0, push=0.5)
+        return f"sha256:{service}"
+
+    monkeypatch.setattr(Provision, "push", staticmethod(push))
+    services = {"web": ".", "worker": "./worker", "scheduler": "./scheduler"}
+    with pytest.raises(ContainerError, match="scheduler"):
+        Provision.push_services("tomato", "ap-south-1", services, max_workers=2)
+    assert max(peak) == 2
+
+    out = capsys.readouterr().out
+    assert "[worker] building ./worker" in out
+    assert "[scheduler] Failed: docker build failed" in out
+    assert "sha256:web" in out and "failed: docker build failed" in out
+
+
+def test_push_services_logs_in_once_before_the_builds(monkeypatch):
+    events = []
+
+    def validate(self, name, region):
+        self.ecr_uri = URI
+
+    monkeypatch.setattr(provision.StackOutput, "validate", validate)
+    monkeypatch.setattr(provision, "get_client", lambda service, region: None)
+    monkeypatch.setattr(
+        Provision,
+        "_docker_login",
+        staticmethod(lambda client, registry_id, region: events.append("login")),
+    )
+
+    def push(name, region, tag, context, registry_cache, service, timings):
+        events.append(service)
+        return f"sha256:{service}"
+
+    monkeypatch.setattr(Provision, "push", staticmethod(push))
+    services = {"web": ".", "worker": "./worker"}
+    Provision.push_services("tomato", "ap-south-1", services, registry_cache=True)
+    assert events[0] == "login" and sorted(events[1:]) == ["web", "worker"]
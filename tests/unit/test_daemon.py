@@ -0,0 +1,67 @@
+"""
+Tests for the thin client that forwards commands to `kobidh serve`.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import pytest
+from kobidh import daemon
+
+
+def test_forwardable_commands():
+    assert daemon._forwardable(["apps.create", "tomato"])
+    assert daemon._forwardable(["-v", "apps.delete", "tomato", "--force"])
+    assert not daemon._forwardable(["--help"])
+    assert not daemon._forwardable(["serve"])
+    assert not daemon._forwardable(["setup"])
+    # Confirmation prompts need the caller's terminal
+    assert not daemon._forwardable(["apps.delete", "tomato"])
+
+
+def test_forward_without_daemon_runs_in_process(tmp_path):
+    path = str(tmp_path / "kobidh.sock")
+    assert daemon.forward(["apps.describe", "tomato"], path) is None
+
+
+DAEMON = """
+import sys
+from kobidh import daemon
+
+
+def invoke(argv):
+    print("ran " + " ".join(argv))
+    print("warning", file=sys.stderr)
+    return 3
+
+
+daemon.Daemon._invoke = staticmethod(invoke)
+daemon.Daemon(sys.argv[1]).serve_forever()
+"""
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "kobidh.sock")
+    process = subprocess.Popen([sys.executable, "-c", DAEMON, path])
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        assert process.poll() is None and time.monotonic() < deadline
+        time.sleep(0.05)
+    yield path
+    process.kill()
+    process.wait()
+
+
+def test_forward_streams_output_and_exit_code(server, capsys):
+    assert daemon.forward(["apps.describe", "tomato"], server) == 3
+    captured = capsys.readouterr()
+    assert captured.out == "ran apps.describe tomato\n"
+    assert captured.err == "warning\n"
+
+
+def test_forward_falls_back_when_environment_differs(server, monkeypatch, capsys):
+    monkeypatch.setenv("AWS_PROFILE", "someone-else")
+    assert daemon.forward(["apps.describe", "tomato"], server) is None
+    assert capsys.readouterr().out == ""
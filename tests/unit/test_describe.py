@@ -0,0 +1,77 @@
+"""
+Tests for the streaming `apps.describe` output.
+"""
+
+import json
+from datetime import datetime, timezone
+import boto3
+import pytest
+from moto import mock_aws
+from troposphere import Template
+from troposphere.sqs import Queue
+from kobidh.resource.describe import stack_resources, write_resources, write_templates
+
+REGION = "ap-south-1"
+
+
+@pytest.fixture
+def cloudformation(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("cloudformation", region_name=REGION)
+        template = Template()
+        for index in range(3):
+            template.add_resource(Queue(f"Queue{index}"))
+        client.create_stack(StackName="tomatoAppStack", TemplateBody=template.to_json())
+        client.create_stack(
+            StackName="tomatoNetworkStack", TemplateBody=template.to_json()
+        )
+        yield client
+
+
+def test_resources_are_streamed(cloudformation, capsys):
+    resources = stack_resources(cloudformation, "tomatoAppStack")
+    # A generator, nothing is fetched until it is consumed
+    assert next(resources)["LogicalResourceId"] == "Queue0"
+
+    write_resources(stack_resources(cloudformation, "tomatoAppStack"), "ndjson")
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["LogicalResourceId"] for line in lines] == [
+        "Queue0",
+        "Queue1",
+        "Queue2",
+    ]
+
+    write_resources(stack_resources(cloudformation, "tomatoAppStack"), "json")
+    assert len(json.loads(capsys.readouterr().out)) == 3
+
+    write_resources(iter([]), "json")
+    assert json.loads(capsys.readouterr().out) == []
+
+
+def test_table(cloudformation, capsys):
+    stack = cloudformation.describe_stacks(StackName="tomatoAppStack")["Stacks"][0]
+    write_resources(stack_resources(cloudformation, "tomatoAppStack"), stack=stack)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Stack tomatoAppStack: CREATE_COMPLETE"
+    assert lines[1].startswith("LogicalResourceId")
+    assert lines[2].split()[:3] == ["Queue0", "AWS::SQS::Queue", "CREATE_COMPLETE"]
+
+
+def test_timestamps_are_iso(capsys):
+    updated = datetime(2026, 10, 17, 1, 59, 28, tzinfo=timezone.utc)
+    write_resources(iter([{"LastUpdatedTimestamp": updated}]), "ndjson")
+    resource = json.loads(capsys.readouterr().out)
+    assert resource["LastUpdatedTimestamp"] == "2026-10-17T01:59:28+00:00"
+
+
+def test_templates_are_one_document(cloudformation, capsys):
+    write_templates(cloudformation, ["tomatoAppStack", "tomatoNetworkStack"])
+    templates = json.loads(capsys.readouterr().out)
+    assert sorted(templates) == ["tomatoAppStack", "tomatoNetworkStack"]
+    assert sorted(templates["tomatoNetworkStack"]["Resources"]) == [
+        "Queue0",
+        "Queue1",
+        "Queue2",
+    ]
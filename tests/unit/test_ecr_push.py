@@ -0,0 +1,215 @@
+"""
+Tests for the daemonless ECR push.
+"""
+
+import hashlib
+import io
+import json
+import tarfile
+import boto3
+import pytest
+from moto import mock_aws
+from kobidh.exceptions import ContainerError
+from kobidh.resource.provision import ecr_push
+from kobidh.resource.provision.ecr_push import (
+    ECRPusher,
+    ImageArchive,
+    parse_repository_uri,
+)
+
+REGION = "ap-south-1"
+REPOSITORY = "tomato-repository/web"
+
+
+def _add(tar, name, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _digest(data: bytes) -> str:
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def docker_archive(path, layers):
+    """Legacy `docker save` layout"""
+    config = json.dumps({"architecture": "amd64", "os": "linux"}).encode()
+    with tarfile.open(path, "w") as tar:
+        _add(tar, "config.json", config)
+        for index, layer in enumerate(layers):
+            _add(tar, f"{index}/layer.tar", layer)
+        manifest = [
+            {
+                "Config": "config.json",
+                "RepoTags": ["tomato:latest"],
+                "Layers": [f"{index}/layer.tar" for index in range(len(layers))],
+            }
+        ]
+        _add(tar, "manifest.json", json.dumps(manifest).encode())
+    return str(path)
+
+
+def oci_archive(path, layers):
+    config = json.dumps({"architecture": "amd64", "os": "linux"}).encode()
+    manifest = json.dumps(
+        {
+            "schemaVersion": 2,
+            "mediaType": ecr_push.OCI_MANIFEST,
+            "config": {
+                "mediaType": ecr_push.OCI_CONFIG,
+                "digest": _digest(config),
+                "size": len(config),
+            },
+            "layers": [
+                {
+                    "mediaType": ecr_push.OCI_LAYER,
+                    "digest": _digest(layer),
+                    "size": len(layer),
+                }
+                for layer in layers
+            ],
+        }
+    ).encode()
+    index = {
+        "schemaVersion": 2,
+        "manifests": [
+            {
+                "mediaType": ecr_push.OCI_MANIFEST,
+                "digest": _digest(manifest),
+                "size": len(manifest),
+            }
+        ],
+    }
+    with tarfile.open(path, "w") as tar:
+        _add(tar, "oci-layout", b'{"imageLayoutVersion": "1.0.0"}')
+        _add(tar, "index.json", json.dumps(index).encode())
+        for blob in [config, manifest, *layers]:
+            _add(tar, f"blobs/sha256/{_digest(blob)[7:]}", blob)
+    return str(path), _digest(manifest)
+
+
+class CountingECR:
+    """Forwards to the moto client, counting the calls"""
+
+    def __init__(self, client):
+        self.client = client
+        self.exceptions = client.exceptions
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(**kwargs):
+            self.calls.append(name)
+            return method(**kwargs)
+
+        return call
+
+
+@pytest.fixture
+def ecr(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    # Small parts, so layers are uploaded in several of them
+    monkeypatch.setattr(ecr_push, "ECR_UPLOAD_PART_SIZE", 1024)
+    with mock_aws():
+        client = boto3.client("ecr", region_name=REGION)
+        registry_id = client.create_repository(repositoryName=REPOSITORY)["repository"][
+            "registryId"
+        ]
+        yield CountingECR(client), registry_id
+
+
+def test_parse_repository_uri():
+    uri = f"123456789012.dkr.ecr.{REGION}.amazonaws.com/{REPOSITORY}"
+    assert parse_repository_uri(uri) == ("123456789012", REGION, REPOSITORY)
+    with pytest.raises(ContainerError):
+        parse_repository_uri("docker.io/library/nginx")
+
+
+def test_push_docker_archive_skips_present_layers(ecr, tmp_path):
+    client, registry_id = ecr
+    layers = [b"a" * 3000, b"b" * 10]
+    path = docker_archive(tmp_path / "image.tar", layers)
+    pusher = ECRPusher(client, registry_id, REPOSITORY)
+    with ImageArchive(path) as image:
+        assert [layer.digest for layer in image.layers] == [
+            _digest(blob) for blob in layers
+        ]
+        digest = pusher.push(image, ["1", "latest"])
+    # 3 parts for the first layer, 1 for the second and 1 for the config
+    assert client.calls.count("upload_layer_part") == 5
+    assert client.calls.count("complete_layer_upload") == 3
+
+    images = client.client.describe_images(repositoryName=REPOSITORY)["imageDetails"]
+    assert sorted(images[0]["imageTags"]) == ["1", "latest"]
+    with ImageArchive(path) as image:
+        assert digest == _digest(image.manifest_body()[0])
+
+    # Nothing changed: one availability check and the tags
+    client.calls.clear()
+    with ImageArchive(path) as image:
+        pusher.push(image, ["1", "latest"])
+    assert client.calls == ["batch_check_layer_availability", "put_image", "put_image"]
+
+
+def test_push_oci_archive_keeps_manifest_digest(ecr, tmp_path):
+    client, registry_id = ecr
+    path, manifest_digest = oci_archive(tmp_path / "oci.tar", [b"c" * 2000])
+    with ImageArchive(path) as image:
+        digest = ECRPusher(client, registry_id, REPOSITORY).push(image, ["2"])
+    assert digest == manifest_digest
+
+
+def test_archive_member_names_keep_leading_dots(tmp_path):
+    path = tmp_path / "image.tar"
+    layer = b"d" * 100
+    manifest = [{"Config": "config.json", "Layers": [".hidden/layer.tar"]}]
+    with tarfile.open(path, "w") as tar:
+        _add(tar, "./config.json", b"{}")
+        _add(tar, "./.hidden/layer.tar", layer)
+        _add(tar, "./manifest.json", json.dumps(manifest).encode())
+    with ImageArchive(str(path)) as image:
+        assert [blob.digest for blob in image.layers] == [_digest(layer)]
+
+
+def test_invalid_archives(tmp_path):
+    path = tmp_path / "image.tar.gz"
+    with tarfile.open(path, "w:gz") as tar:
+        _add(tar, "manifest.json", b"[]")
+    with pytest.raises(ContainerError, match="compressed"):
+        ImageArchive(str(path))
+    path = tmp_path / "other.tar"
+    with tarfile.open(path, "w") as tar:
+        _add(tar, "README", b"hello")
+    with pytest.raises(ContainerError, match="not a docker-archive"):
+        ImageArchive(str(path))
+
+
+def test_retag(ecr, tmp_path):
+    client, registry_id = ecr
+    path = docker_archive(tmp_path / "image.tar", [b"d" * 100])
+    pusher = ECRPusher(client, registry_id, REPOSITORY)
+    with ImageArchive(path) as image:
+        pusher.push(image, ["1"])
+    digest = client.client.describe_images(repositoryName=REPOSITORY)["imageDetails"][
+        0
+    ]["imageDigest"]
+
+    assert pusher.retag(digest, ["2"]) == digest
+    images = client.client.describe_images(repositoryName=REPOSITORY)["imageDetails"]
+    assert sorted(images[0]["imageTags"]) == ["1", "2"]
+    assert pusher.retag("sha256:" + "0" * 64, ["3"]) is None
+
+
+def test_upload_threads_keep_the_log_prefix(ecr, tmp_path, capsys):
+    from kobidh.utils.logging import prefixed
+
+    client, registry_id = ecr
+    path = docker_archive(tmp_path / "image.tar", [b"e" * 2000, b"f" * 10])
+    pusher = ECRPusher(client, registry_id, REPOSITORY, max_workers=2)
+    with prefixed("worker"), ImageArchive(path) as image:
+        pusher.push(image, ["1"])
+    lines = [line for line in capsys.readouterr().out.splitlines() if line]
+    assert sum("Pushed sha256:" in line for line in lines) == 3
+    assert all(line.startswith("[worker] ") for line in lines)
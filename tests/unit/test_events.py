@@ -0,0 +1,86 @@
+"""
+Tests for the streaming stack event waiter.
+"""
+
+from datetime import datetime, timedelta
+from kobidh.resource import events as events_module
+from kobidh.resource.events import StackEventWaiter, resource_timings
+
+STACK_ID = "arn:aws:cloudformation:ap-south-1:123456789012:stack/tomatoAppStack/1"
+START = datetime(2026, 1, 1)
+
+
+def _event(n, logical_id, status, seconds, token="kobidh-1", reason=None):
+    return {
+        "EventId": f"event-{n}",
+        "StackId": STACK_ID,
+        "LogicalResourceId": logical_id,
+        "PhysicalResourceId": (
+            STACK_ID if logical_id == "tomatoAppStack" else logical_id
+        ),
+        "ResourceType": "AWS::EC2::VPC",
+        "ResourceStatus": status,
+        "ResourceStatusReason": reason,
+        "Timestamp": START + timedelta(seconds=seconds),
+        "ClientRequestToken": token,
+    }
+
+
+class FakeCloudFormation:
+    """Reveals one more batch of events on every poll, newest first."""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.polls = 0
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, StackName):
+        self.polls += 1
+        visible = [e for batch in self.batches[: self.polls] for e in batch]
+        yield {"StackEvents": list(reversed(visible))}
+
+
+def test_waiter_streams_new_events_once(monkeypatch):
+    monkeypatch.setattr(events_module.time, "sleep", lambda seconds: None)
+    previous = _event(0, "tomatoAppStack", "CREATE_COMPLETE", -60, token="kobidh-0")
+    client = FakeCloudFormation(
+        [
+            [
+                previous,
+                _event(
+                    1,
+                    "tomatoAppStack",
+                    "UPDATE_IN_PROGRESS",
+                    0,
+                    reason="User Initiated",
+                ),
+                _event(2, "tomatoVpc", "UPDATE_IN_PROGRESS", 1),
+            ],
+            [],
+            [_event(3, "tomatoVpc", "UPDATE_COMPLETE", 31)],
+            [_event(4, "tomatoAppStack", "UPDATE_COMPLETE", 32)],
+        ]
+    )
+    waiter = StackEventWaiter(client, STACK_ID, "kobidh-1")
+    assert waiter.wait() == "UPDATE_COMPLETE"
+    assert client.polls == 4
+    assert [e["EventId"] for e in waiter.events] == [
+        "event-1",
+        "event-2",
+        "event-3",
+        "event-4",
+    ]
+
+
+def test_resource_timings():
+    timings = resource_timings(
+        [
+            _event(1, "tomatoVpc", "CREATE_IN_PROGRESS", 0),
+            _event(2, "tomatoVpc", "CREATE_COMPLETE", 12),
+            _event(3, "tomatoSg", "CREATE_IN_PROGRESS", 12),
+        ]
+    )
+    assert (timings["tomatoVpc"]["end"] - timings["tomatoVpc"]["start"]).seconds == 12
+    assert timings["tomatoSg"]["end"] is None
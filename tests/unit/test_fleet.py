@@ -0,0 +1,84 @@
+"""
+Tests for the fleet wide app listing.
+"""
+
+import boto3
+import pytest
+from moto import mock_aws
+from troposphere import Output, Template
+from troposphere.sqs import Queue
+from kobidh.resource import fleet
+from kobidh.resource.stack import app_tags, deploy_stack
+
+REGION = "ap-south-1"
+
+
+def _template(cluster=None):
+    template = Template()
+    template.add_resource(Queue("Queue"))
+    if cluster:
+        template.add_output(Output("ClusterName", Value=cluster))
+    return template
+
+
+class CountingECS:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def describe_clusters(self, clusters):
+        self.calls.append(("describe_clusters", len(clusters)))
+        return self.client.describe_clusters(clusters=clusters)
+
+    def describe_services(self, cluster, services):
+        self.calls.append(("describe_services", len(services)))
+        return self.client.describe_services(cluster=cluster, services=services)
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        yield (
+            boto3.client("cloudformation", region_name=REGION),
+            boto3.client("ecs", region_name=REGION),
+        )
+
+
+def test_fleet_status_batches_describes(aws):
+    cloudformation, ecs = aws
+    for name in ("tomato", "potato"):
+        ecs.create_cluster(clusterName=f"{name}Cluster")
+        deploy_stack(
+            cloudformation,
+            f"{name}AppStack",
+            _template(f"{name}Cluster"),
+            tags=app_tags(name, "app"),
+        )
+    ecs.create_service(cluster="tomatoCluster", serviceName="tomatoService")
+    deploy_stack(
+        cloudformation,
+        "tomatoServiceStack",
+        _template(),
+        tags=app_tags("tomato", "service"),
+    )
+    # Stacks not published by kobidh are ignored
+    cloudformation.create_stack(StackName="other", TemplateBody=_template().to_json())
+
+    apps = fleet.list_apps(cloudformation)
+    assert [(app["name"], app["stacks"]) for app in apps] == [
+        ("potato", ["app"]),
+        ("tomato", ["app", "service"]),
+    ]
+
+    counting = CountingECS(ecs)
+    status = {app["name"]: app for app in fleet.fleet_status(cloudformation, counting)}
+    assert counting.calls == [("describe_clusters", 2), ("describe_services", 1)]
+    assert status["tomato"]["cluster"]["name"] == "tomatoCluster"
+    assert status["tomato"]["service"]["name"] == "tomatoService"
+    assert status["potato"]["service"] is None
+
+
+def test_batches():
+    assert [len(b) for b in fleet._batches(list(range(205)), 100)] == [100, 100, 5]
@@ -0,0 +1,88 @@
+"""
+Tests for the aggregate app status of `apps.info`.
+"""
+
+import boto3
+import pytest
+from moto import mock_aws
+from troposphere import Output, Template
+from troposphere.sqs import Queue
+from kobidh.resource import config, info
+from kobidh.utils.clients import reset
+
+REGION = "ap-south-1"
+MANIFEST = (
+    '{"schemaVersion": 2, '
+    '"mediaType": "application/vnd.docker.distribution.manifest.v2+json", '
+    '"config": {"digest": "sha256:0", "size": 1}, "layers": []}'
+)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(config, "stack_output_cache", config.DiskCache("outputs"))
+    monkeypatch.setattr(info, "stack_output_cache", config.stack_output_cache)
+    reset()
+    with mock_aws():
+        ecs = boto3.client("ecs", region_name=REGION)
+        ecs.create_cluster(clusterName="tomatoCluster")
+        ecs.register_task_definition(
+            family="tomatoTask",
+            containerDefinitions=[
+                {"name": "tomatoWeb", "image": "nginx", "memory": 512}
+            ],
+        )
+        ecs.create_service(cluster="tomatoCluster", serviceName="tomatoService")
+        ecr = boto3.client("ecr", region_name=REGION)
+        ecr.create_repository(repositoryName="tomato-repository/web")
+        ecr.put_image(
+            repositoryName="tomato-repository/web",
+            imageManifest=MANIFEST,
+            imageTag="1.0.0",
+        )
+        template = Template()
+        template.add_resource(Queue("Queue"))
+        template.add_output(Output("ClusterName", Value="tomatoCluster"))
+        boto3.client("cloudformation", region_name=REGION).create_stack(
+            StackName="tomatoAppStack", TemplateBody=template.to_json()
+        )
+        yield
+    reset()
+
+
+def test_app_info(app):
+    summary = info.app_info("tomato", REGION)
+    assert summary["errors"] == {}
+    assert summary["stacks"]["app"]["StackStatus"] == "CREATE_COMPLETE"
+    assert summary["outputs"] == {"ClusterName": "tomatoCluster"}
+    assert summary["cluster"]["clusterName"] == "tomatoCluster"
+    assert summary["service"]["serviceName"] == "tomatoService"
+    assert summary["task_definition"]["revision"] == 1
+    assert summary["image"]["imageTags"] == ["1.0.0"]
+    info.log_info("tomato", summary)
+
+
+def test_app_info_uses_cached_cluster(app, monkeypatch):
+    config.stack_output_cache.set(
+        f"{REGION}:tomatoAppStack",
+        {"version": "v", "outputs": {"ecs_cluster_name": "tomatoCluster"}},
+    )
+    started = []
+    original = info._cluster
+    monkeypatch.setattr(
+        info, "_cluster", lambda *args: started.append(args) or original(*args)
+    )
+    summary = info.app_info("tomato", REGION)
+    # Looked up once, alongside the stack
+    assert len(started) == 1
+    assert summary["service"]["serviceName"] == "tomatoService"
+
+
+def test_missing_app_is_reported(app, capsys):
+    from kobidh.resource.infra import Infra
+
+    assert Infra.info("potato", REGION) is None
+    assert 'App "potato" does not exist' in capsys.readouterr().out
@@ -0,0 +1,139 @@
+"""
+Tests for the layered app stacks.
+"""
+
+import boto3
+import pytest
+from moto import mock_aws
+from kobidh.resource import config
+from kobidh.resource.config import LAYERS, StackOutput
+from kobidh.resource.facts import Facts
+from kobidh.resource.infra import Infra
+from kobidh.utils.clients import reset
+
+REGION = "ap-south-1"
+FACTS = Facts(azs=["ap-south-1a", "ap-south-1b", "ap-south-1c"], services=[])
+
+
+@pytest.fixture
+def aws(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(config, "stack_output_cache", config.DiskCache("outputs"))
+    reset()
+    with mock_aws():
+        yield
+    reset()
+
+
+def test_layers_partition_the_app_stack():
+    app = Infra.configure("tomato", REGION, FACTS).template
+    layers = Infra.configure_layers("tomato", REGION, FACTS)
+    assert list(layers) == list(LAYERS)
+    resources = [r for c in layers.values() for r in c.template.resources]
+    assert sorted(resources) == sorted(app.resources)
+    outputs = layers["cluster"].template.to_dict()["Outputs"]
+    assert outputs["ClusterName"]["Export"] == {"Name": "tomato-ClusterName"}
+
+
+def test_layers_deploy_and_skip_unchanged(aws):
+    layers = Infra.configure_layers("tomato", REGION, FACTS)
+    responses = Infra.apply_layers("tomato", REGION, layers)
+    assert all(responses[layer] for layer in LAYERS)
+    cloudformation = boto3.client("cloudformation", region_name=REGION)
+    stacks = {s["StackName"] for s in cloudformation.describe_stacks()["Stacks"]}
+    assert stacks == {
+        "tomatoNetworkStack",
+        "tomatoIdentityStack",
+        "tomatoRegistryStack",
+        "tomatoClusterStack",
+    }
+
+    stack_op = StackOutput()
+    stack_op.validate("tomato", REGION)
+    assert stack_op.ecs_cluster_name and stack_op.instance_profile_name
+    assert len(stack_op.public_subnet_names.split(":")) == 3
+
+    # Unchanged layers are not updated
+    layers = Infra.configure_layers("tomato", REGION, FACTS)
+    responses = Infra.apply_layers("tomato", REGION, layers)
+    assert responses == {layer: None for layer in LAYERS}
+
+
+def test_deployed_service_repositories_are_kept(aws):
+    from kobidh.exceptions import ConfigurationError
+    from kobidh.resource.infra.ecr_config import deployed_services
+
+    def repositories(config):
+        return sorted(
+            resource.properties["RepositoryName"]
+            for resource in config.template.resources.values()
+            if resource.resource_type == "AWS::ECR::Repository"
+        )
+
+    assert deployed_services("tomato", REGION) == []
+    facts = Facts(azs=FACTS.azs)
+    config = Infra.configure("tomato", REGION, facts, ["worker"])
+    Infra.apply("tomato", REGION, config.template)
+    assert sorted(deployed_services("tomato", REGION)) == ["web", "worker"]
+
+    # Creating the app again without --service keeps the worker repository
+    config = Infra.configure("tomato", REGION, Facts(azs=FACTS.azs))
+    assert repositories(config) == ["tomato-repository/web", "tomato-repository/worker"]
+
+    config = Infra.configure(
+        "tomato", REGION, Facts(azs=FACTS.azs), remove_services=("worker",)
+    )
+    assert repositories(config) == ["tomato-repository/web"]
+    with pytest.raises(ConfigurationError):
+        Infra.configure("tomato", REGION, facts, remove_services=("web",))
+
+
+def test_layered_and_single_stack_apps_do_not_mix(aws):
+    from kobidh.exceptions import ConfigurationError
+
+    layers = Infra.configure_layers("tomato", REGION, FACTS)
+    Infra.apply_layers("tomato", REGION, layers)
+    with pytest.raises(ConfigurationError, match="layer stacks"):
+        Infra.apply("tomato", REGION, Infra.configure("tomato", REGION, FACTS).template)
+
+    Infra.apply("potato", REGION, Infra.configure("potato", REGION, FACTS).template)
+    with pytest.raises(ConfigurationError, match="single stack"):
+        Infra.apply_layers(
+            "potato", REGION, Infra.configure_layers("potato", REGION, FACTS)
+        )
+
+
+def test_unchanged_single_stack_costs_one_describe(aws, monkeypatch):
+    from kobidh.utils.clients import get_client
+
+    template = Infra.configure("tomato", REGION, FACTS).template
+    Infra.apply("tomato", REGION, template)
+    client = get_client("cloudformation", REGION)
+    calls = []
+    describe_stacks = client.describe_stacks
+    monkeypatch.setattr(
+        client,
+        "describe_stacks",
+        lambda **kwargs: calls.append(kwargs) or describe_stacks(**kwargs),
+    )
+    assert Infra.apply("tomato", REGION, template) is None
+    assert calls == [{"StackName": "tomatoAppStack"}]
+
+
+def test_timeline_of_layered_app(aws):
+    from kobidh.exceptions import ConfigurationError
+
+    layers = Infra.configure_layers("tomato", REGION, FACTS)
+    Infra.apply_layers("tomato", REGION, layers)
+    reports = Infra.timeline("tomato", REGION)
+    assert sorted(reports) == [
+        "tomatoClusterStack",
+        "tomatoIdentityStack",
+        "tomatoNetworkStack",
+        "tomatoRegistryStack",
+    ]
+    assert "tomatoCluster" in reports["tomatoClusterStack"]["resources"]
+    with pytest.raises(ConfigurationError, match="does not exist"):
+        Infra.timeline("potato", REGION)
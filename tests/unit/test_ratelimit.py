@@ -0,0 +1,93 @@
+"""
+Tests for the client side API rate limiter.
+"""
+
+import pytest
+from kobidh.exceptions import ThrottlingError, handle_boto3_error
+from kobidh.utils import ratelimit
+from kobidh.utils.ratelimit import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_waits_once_burst_is_spent(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.stats()["waited"] == pytest.approx(0.5)
+    assert bucket.stats()["calls"] == 3
+
+
+def test_bucket_backs_off_on_throttling_and_recovers(clock):
+    bucket = TokenBucket(rate=8, burst=8, min_rate=1)
+    bucket.on_throttle()
+    bucket.on_throttle()
+    assert bucket.rate == 2
+    # The burst is dropped, the next call waits at the reduced rate
+    assert bucket.acquire() == pytest.approx(0.5)
+    for _ in range(40):
+        bucket.on_success()
+    assert bucket.rate == 8
+    for _ in range(10):
+        bucket.on_throttle()
+    assert bucket.rate == 1
+    assert bucket.stats()["throttled"] == 12
+
+
+def test_throttling_response_detection():
+    throttled = (None, {"Error": {"Code": "ThrottlingException"}})
+    assert ratelimit.is_throttling(throttled)
+    assert not ratelimit.is_throttling((None, {"Error": {"Code": "AccessDenied"}}))
+    assert not ratelimit.is_throttling(None)
+
+
+def test_throttling_error_is_mapped():
+    from botocore.exceptions import ClientError
+
+    @handle_boto3_error
+    def describe():
+        raise ClientError(
+            {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}},
+            "DescribeStacks",
+        )
+
+    with pytest.raises(ThrottlingError):
+        describe()
+
+
+def test_shared_clients_pass_through_the_bucket(tmp_path, monkeypatch, clock):
+    from moto import mock_aws
+    from kobidh.utils.clients import get_client, reset
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    reset()
+    with mock_aws():
+        client = get_client("cloudformation", "ap-south-1")
+        for _ in range(7):
+            client.list_stacks()
+    counters = ratelimit.stats()[("cloudformation", "ap-south-1")]
+    assert counters["calls"] == 7
+    # 5 calls/s with a burst of 5
+    assert clock.slept == [pytest.approx(0.2), pytest.approx(0.2)]
+    reset()
@@ -0,0 +1,179 @@
+"""
+Tests for the direct image release path.
+"""
+
+import boto3
+import pytest
+from moto import mock_aws
+from troposphere import Parameter, Ref, Template
+from troposphere.sqs import Queue
+from kobidh.exceptions import ServiceError
+from kobidh.resource.provision.release import release_image, with_image
+from kobidh.resource.stack import update_parameters
+
+REGION = "ap-south-1"
+REPOSITORY = "123456789012.dkr.ecr.ap-south-1.amazonaws.com/tomato-repository/web"
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        ecs = boto3.client("ecs", region_name=REGION)
+        ecs.create_cluster(clusterName="tomatoCluster")
+        task_definition = ecs.register_task_definition(
+            family="tomatoTask",
+            cpu="256",
+            memory="512",
+            containerDefinitions=[
+                {"name": "tomatoWeb", "image": f"{REPOSITORY}:1", "memory": 512},
+                {"name": "sidecar", "image": "envoy", "memory": 128},
+            ],
+        )["taskDefinition"]
+        ecs.create_service(
+            cluster="tomatoCluster",
+            serviceName="tomatoService",
+            taskDefinition=task_definition["taskDefinitionArn"],
+            desiredCount=1,
+        )
+        yield ecs, boto3.client("cloudformation", region_name=REGION)
+
+
+def test_with_image_only_changes_the_container():
+    task_definition = {
+        "family": "tomatoTask",
+        "revision": 3,
+        "status": "ACTIVE",
+        "cpu": "256",
+        "containerDefinitions": [
+            {"name": "tomatoWeb", "image": "a"},
+            {"name": "sidecar", "image": "b"},
+        ],
+    }
+    registration = with_image(task_definition, "tomatoWeb", "c")
+    assert registration == {
+        "family": "tomatoTask",
+        "cpu": "256",
+        "containerDefinitions": [
+            {"name": "tomatoWeb", "image": "c"},
+            {"name": "sidecar", "image": "b"},
+        ],
+    }
+    assert task_definition["containerDefinitions"][0]["image"] == "a"
+    with pytest.raises(ServiceError):
+        with_image(task_definition, "worker", "c")
+
+
+def test_release_registers_revision_and_updates_service(aws):
+    ecs, _ = aws
+    released = release_image(
+        ecs, "tomatoCluster", "tomatoService", "tomatoWeb", f"{REPOSITORY}:2"
+    )
+    assert released["task_definition"].endswith("tomatoTask:2")
+    service = ecs.describe_services(cluster="tomatoCluster", services=["tomatoService"])
+    assert service["services"][0]["taskDefinition"] == released["task_definition"]
+    task_definition = ecs.describe_task_definition(taskDefinition="tomatoTask:2")
+    images = [
+        c["image"] for c in task_definition["taskDefinition"]["containerDefinitions"]
+    ]
+    assert images == [f"{REPOSITORY}:2", "envoy"]
+
+    # Releasing the running image again is a no-op
+    again = release_image(
+        ecs, "tomatoCluster", "tomatoService", "tomatoWeb", f"{REPOSITORY}:2"
+    )
+    assert again["task_definition"] is None
+
+
+def test_update_parameters_on_previous_template(aws):
+    _, cloudformation = aws
+    template = Template()
+    image = template.add_parameter(Parameter("Image", Type="String"))
+    template.add_parameter(Parameter("DesiredCount", Type="Number"))
+    template.add_resource(Queue("Queue", QueueName=Ref(image)))
+    cloudformation.create_stack(
+        StackName="tomatoServiceStack",
+        TemplateBody=template.to_json(),
+        Parameters=[
+            {"ParameterKey": "Image", "ParameterValue": "one"},
+            {"ParameterKey": "DesiredCount", "ParameterValue": "2"},
+        ],
+    )
+    assert (
+        update_parameters(cloudformation, "tomatoServiceStack", {"Image": "one"})
+        is None
+    )
+    assert update_parameters(cloudformation, "tomatoServiceStack", {"Image": "two"})
+    stack = cloudformation.describe_stacks(StackName="tomatoServiceStack")["Stacks"][0]
+    parameters = {p["ParameterKey"]: p["ParameterValue"] for p in stack["Parameters"]}
+    assert parameters == {"Image": "two", "DesiredCount": "2"}
+    assert update_parameters(cloudformation, "tomatoServiceStack", {"Cpu": 1}) is None
+
+
+def test_release_registers_one_revision(aws, monkeypatch, tmp_path):
+    from kobidh.resource.config import Config, StackOutput
+    from kobidh.resource.facts import Facts
+    from kobidh.resource.provision import Provision
+    from kobidh.resource.provision.service_config import ServiceConfig
+    from kobidh.utils.clients import get_client, reset
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    reset()
+    stack_op = StackOutput.from_dict(
+        {
+            "ecs_cluster_name": "tomatoCluster",
+            "ecr_uri": REPOSITORY,
+            "public_subnet_names": "subnet-1:subnet-2",
+            "security_group_name": "sg-1",
+        }
+    )
+    role = "arn:aws:iam::123456789012:role/ecsTaskExecutionRole"
+    config = Config("tomato", REGION, Facts(execution_role_arn=role))
+    ServiceConfig(config, stack_op)._configure()
+    # moto only keeps previous values of parameters given explicitly
+    parameters = {"Image": f"{REPOSITORY}:1", "DesiredCount": 1, "Cpu": 256}
+    Provision.apply(config, parameters={**parameters, "Memory": 512})
+
+    registered = []
+    get_client("ecs", REGION).meta.events.register(
+        "before-call.ecs.RegisterTaskDefinition",
+        lambda **kwargs: registered.append(kwargs),
+    )
+    monkeypatch.setattr(StackOutput, "validate", lambda self, *args: None)
+    monkeypatch.setattr(
+        StackOutput, "__init__", lambda self: self.__dict__.update(stack_op.__dict__)
+    )
+    released = Provision.release("tomato", REGION, "2")
+    assert len(registered) == 1
+    ecs, cloudformation = aws
+    service = ecs.describe_services(cluster="tomatoCluster", services=["tomatoService"])
+    assert service["services"][0]["taskDefinition"] == released["task_definition"]
+
+    # The stack takes over the released revision. Its own task definition is
+    # conditional on the parameter being empty, so CloudFormation drops it
+    # instead of registering the new image a second time. (moto does not
+    # evaluate resource conditions on update, so this is checked on the
+    # template and parameters it was given.)
+    stack = cloudformation.describe_stacks(StackName="tomatoServiceStack")["Stacks"][0]
+    parameters = {p["ParameterKey"]: p["ParameterValue"] for p in stack["Parameters"]}
+    assert parameters["Image"] == f"{REPOSITORY}:2"
+    assert parameters["TaskDefinitionArn"] == released["task_definition"]
+    template = cloudformation.get_template(StackName="tomatoServiceStack")
+    resources = template["TemplateBody"]["Resources"]
+    assert resources["tomatoTd"]["Condition"] == "StackTaskDefinition"
+    assert resources["tomatoService"]["Properties"]["TaskDefinition"] == {
+        "Fn::If": [
+            "ReleasedTaskDefinition",
+            {"Ref": "TaskDefinitionArn"},
+            {"Ref": "tomatoTd"},
+        ]
+    }
+
+    # `service.create` returns the service to the stack's task definition
+    Provision.apply(config)
+    stack = cloudformation.describe_stacks(StackName="tomatoServiceStack")["Stacks"][0]
+    parameters = {p["ParameterKey"]: p["ParameterValue"] for p in stack["Parameters"]}
+    assert parameters["TaskDefinitionArn"] == ""
+    assert parameters["Image"] == f"{REPOSITORY}:2"
+    reset()
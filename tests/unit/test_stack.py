@@ -0,0 +1,113 @@
+"""
+Tests for fingerprint based CloudFormation deployments.
+"""
+
+import boto3
+import pytest
+from moto import mock_aws
+from troposphere import Parameter, Ref, Template, Output
+from troposphere.sqs import Queue
+from kobidh.resource.stack import (
+    FINGERPRINT_TAG,
+    deploy_stack,
+    stack_tags,
+    template_fingerprint,
+    update_parameters,
+)
+
+REGION = "ap-south-1"
+
+
+def _template(name="queue"):
+    template = Template()
+    queue = template.add_resource(Queue(name.capitalize()))
+    template.add_output(Output("QueueName", Value=queue.ref()))
+    return template
+
+
+@pytest.fixture
+def cloudformation(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        yield boto3.client("cloudformation", region_name=REGION)
+
+
+def test_fingerprint_is_canonical():
+    assert template_fingerprint(_template()) == template_fingerprint(_template())
+    assert template_fingerprint(_template()) != template_fingerprint(_template("jobs"))
+    assert template_fingerprint(_template(), {"Image": "a"}) != template_fingerprint(
+        _template(), {"Image": "b"}
+    )
+
+
+def test_unchanged_template_skips_update(cloudformation):
+    assert "StackId" in deploy_stack(cloudformation, "tomatoStack", _template())
+    stack = cloudformation.describe_stacks(StackName="tomatoStack")["Stacks"][0]
+    assert stack_tags(stack)[FINGERPRINT_TAG] == template_fingerprint(_template())
+
+    assert deploy_stack(cloudformation, "tomatoStack", _template()) is None
+
+    assert "StackId" in deploy_stack(cloudformation, "tomatoStack", _template("jobs"))
+    stack = cloudformation.describe_stacks(StackName="tomatoStack")["Stacks"][0]
+    assert stack_tags(stack)[FINGERPRINT_TAG] == template_fingerprint(_template("jobs"))
+
+
+def _parameterized():
+    template = Template()
+    image = template.add_parameter(Parameter("Image", Type="String", Default="a"))
+    template.add_parameter(Parameter("DesiredCount", Type="Number", Default=1))
+    queue = template.add_resource(Queue("Queue", QueueName=Ref(image)))
+    template.add_output(Output("QueueName", Value=queue.ref()))
+    return template
+
+
+def _stack_parameters(cloudformation):
+    stack = cloudformation.describe_stacks(StackName="tomatoStack")["Stacks"][0]
+    return {p["ParameterKey"]: p["ParameterValue"] for p in stack["Parameters"]}
+
+
+def test_parameter_changes_use_previous_template(cloudformation, monkeypatch):
+    deploy_stack(cloudformation, "tomatoStack", _parameterized(), {"DesiredCount": 2})
+    calls = []
+    update_stack = cloudformation.update_stack
+    monkeypatch.setattr(
+        cloudformation,
+        "update_stack",
+        lambda **kwargs: calls.append(kwargs) or update_stack(**kwargs),
+    )
+
+    deploy_stack(cloudformation, "tomatoStack", _parameterized(), {"Image": "b"})
+    assert "TemplateBody" not in calls[-1] and calls[-1]["UsePreviousTemplate"]
+    assert sorted(calls[-1]["Parameters"], key=lambda p: p["ParameterKey"]) == [
+        {"ParameterKey": "DesiredCount", "UsePreviousValue": True},
+        {"ParameterKey": "Image", "ParameterValue": "b"},
+    ]
+    assert _stack_parameters(cloudformation) == {"Image": "b", "DesiredCount": "2"}
+
+    # Values that are already deployed need no update
+    unchanged = deploy_stack(
+        cloudformation, "tomatoStack", _parameterized(), {"Image": "b"}
+    )
+    assert unchanged is None
+    assert len(calls) == 1
+
+    # A template change uploads the template, keeping the deployed values
+    template = _parameterized()
+    template.add_resource(Queue("Jobs"))
+    deploy_stack(cloudformation, "tomatoStack", template)
+    assert "TemplateBody" in calls[-1]
+    assert _stack_parameters(cloudformation) == {"Image": "b", "DesiredCount": "2"}
+
+
+def test_deploy_after_parameter_update_rolls_back(cloudformation):
+    # `container.release` updates the Image parameter, `service.create
+    # --image` must be able to roll it back
+    parameters = {"Image": "b", "DesiredCount": 1}
+    deploy_stack(cloudformation, "tomatoStack", _parameterized(), parameters)
+    update_parameters(cloudformation, "tomatoStack", {"Image": "c"})
+    assert _stack_parameters(cloudformation)["Image"] == "c"
+
+    response = deploy_stack(cloudformation, "tomatoStack", _parameterized(), parameters)
+    assert response is not None
+    assert _stack_parameters(cloudformation)["Image"] == "b"
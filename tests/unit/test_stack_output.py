@@ -0,0 +1,55 @@
+"""
+Tests for the cached app stack outputs used by provisioning.
+"""
+
+import boto3
+import pytest
+from moto import mock_aws
+from troposphere import Template, Output
+from troposphere.sqs import Queue
+from kobidh.resource import config
+from kobidh.resource.config import StackOutput
+from kobidh.utils.clients import get_client, reset
+
+REGION = "ap-south-1"
+
+
+@pytest.fixture
+def app_stack(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(config, "stack_output_cache", config.DiskCache("outputs"))
+    reset()
+    with mock_aws():
+        boto3.client("ecs", region_name=REGION).create_cluster(clusterName="tomato")
+        template = Template()
+        template.add_resource(Queue("Queue"))
+        for key, value in {
+            "ClusterName": "tomato",
+            "ECRUri": "123456789012.dkr.ecr.ap-south-1.amazonaws.com/tomato",
+            "PublicSubnetNames": "subnet-1:subnet-2",
+            "SecurityGroupName": "sg-1",
+            "InstanceProfileName": "tomatoProfile",
+        }.items():
+            template.add_output(Output(key, Value=value))
+        boto3.client("cloudformation", region_name=REGION).create_stack(
+            StackName="tomatoAppStack", TemplateBody=template.to_json()
+        )
+        yield
+    reset()
+
+
+def test_outputs_are_mapped_and_cached(app_stack, monkeypatch):
+    stack_op = StackOutput()
+    stack_op.validate("tomato", REGION)
+    assert stack_op.ecs_cluster_name == "tomato"
+    assert stack_op.public_subnet_names == "subnet-1:subnet-2"
+    assert stack_op.private_subnet_names is None
+
+    # An unchanged stack is served from the cache without ECS calls
+    ecs_client = get_client("ecs", REGION)
+    monkeypatch.setattr(ecs_client, "describe_clusters", None)
+    cached = StackOutput()
+    cached.validate("tomato", REGION)
+    assert cached.to_dict() == stack_op.to_dict()
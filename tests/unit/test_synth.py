@@ -0,0 +1,118 @@
+"""
+Tests for offline template synthesis from a facts snapshot.
+"""
+
+import json
+import os
+import threading
+import pytest
+from kobidh.core import Synth
+from kobidh.exceptions import ConfigurationError
+from kobidh.resource.facts import Facts
+
+FACTS = Facts(
+    azs=["ap-south-1a", "ap-south-1b"],
+    image={"image_id": "ami-0123", "image_name": "al2023-ecs", "parameter": "/aws"},
+    execution_role_arn="arn:aws:iam::123456789012:role/ecsTaskExecutionRole",
+    stack_outputs={
+        "ecs_cluster_name": "tomatoCluster",
+        "ecr_uri": "123456789012.dkr.ecr.ap-south-1.amazonaws.com/tomato",
+        "public_subnet_names": "subnet-1:subnet-2",
+        "private_subnet_names": "subnet-3:subnet-4",
+        "security_group_name": "sg-1",
+        "instance_profile_name": "tomatoProfile",
+    },
+)
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "facts.json")
+    FACTS.save(path, "tomato", "ap-south-1")
+    snapshot = Facts.load(path)
+    assert snapshot["app"] == "tomato"
+    assert snapshot["facts"].to_dict() == FACTS.to_dict()
+
+
+def test_snapshot_version_mismatch(tmp_path):
+    path = str(tmp_path / "facts.json")
+    with open(path, "w") as file:
+        json.dump({"version": 0, "facts": {}}, file)
+    with pytest.raises(ConfigurationError):
+        Facts.load(path)
+
+
+def test_render_offline(tmp_path, monkeypatch):
+    # No credentials: any AWS call would fail
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_PROFILE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    path = str(tmp_path / "facts.json")
+    FACTS.save(path, "tomato", "ap-south-1")
+
+    files = Synth("tomato", snapshot=path).render(str(tmp_path / "out"))
+    assert [os.path.basename(f) for f in files] == [
+        "tomatoAppStack.template.json",
+        "tomatoServiceStack.template.json",
+    ]
+    with open(files[0]) as file:
+        resources = json.load(file)["Resources"]
+    assert resources["tomatoApSouth1aPublicSubnet"]["Properties"][
+        "AvailabilityZone"
+    ] == ("ap-south-1a")
+
+
+def test_gather_runs_lookups_concurrently(monkeypatch):
+    from kobidh.resource import facts as facts_module
+
+    barrier = threading.Barrier(4, timeout=5)
+
+    def lookup(value):
+        def wrapped(*args):
+            # Only passes when the four lookups are in flight together
+            barrier.wait()
+            return value
+
+        return wrapped
+
+    monkeypatch.setattr(facts_module, "_lookup_services", lookup(["web"]))
+    monkeypatch.setattr(facts_module, "_lookup_image", lookup({"image_id": "ami"}))
+    monkeypatch.setattr(facts_module, "_lookup_execution_role_arn", lookup("arn"))
+    monkeypatch.setattr(facts_module, "_lookup_stack_outputs", lookup({}))
+    facts = Facts(azs=["ap-south-1a"]).gather("tomato", "ap-south-1")
+    assert facts.image == {"image_id": "ami"}
+    assert facts.execution_role_arn == "arn"
+
+
+def test_infra_facts_are_fetched_concurrently(monkeypatch):
+    from kobidh.resource import facts as facts_module
+    from kobidh.resource.infra import Infra
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def lookup(value):
+        def wrapped(*args):
+            barrier.wait()
+            return value
+
+        return wrapped
+
+    monkeypatch.setattr(facts_module, "_lookup_azs", lookup(["ap-south-1a"]))
+    monkeypatch.setattr(facts_module, "_lookup_services", lookup(["web", "worker"]))
+    config = Infra.configure("tomato", "ap-south-1")
+    assert config.services == ["web", "worker"]
+    assert "tomatoApSouth1aPublicSubnet" in config.template.resources
+
+
+def test_failed_zone_lookup_stops_configuration(monkeypatch):
+    from botocore.exceptions import ClientError
+    from kobidh.resource import facts as facts_module
+    from kobidh.resource.infra import Infra
+
+    def fail(*args):
+        error = {"Error": {"Code": "UnauthorizedOperation", "Message": "denied"}}
+        raise ClientError(error, "DescribeAvailabilityZones")
+
+    monkeypatch.setattr(facts_module, "_lookup_azs", fail)
+    monkeypatch.setattr(facts_module, "_lookup_services", lambda *args: [])
+    with pytest.raises(ClientError):
+        Infra.configure("tomato", "ap-south-1")
@@ -0,0 +1,58 @@
+"""
+Tests for the critical path analysis of stack operations.
+"""
+
+from kobidh.resource.facts import Facts
+from kobidh.resource.infra import Infra
+from kobidh.resource.timeline import critical_path, dependency_graph
+
+
+def test_graph_of_app_template():
+    facts = Facts(azs=["ap-south-1a"], services=[])
+    config = Infra.configure("tomato", "ap-south-1", facts)
+    graph = dependency_graph(config.template.to_dict())
+    assert graph["tomatoVpc"] == set()
+    assert graph["tomatoApSouth1aPublicSubnet"] == {"tomatoVpc"}
+    assert graph["tomatoInstanceProfile"] == {"tomatoInstanceRole"}
+    assert graph["tomatoIgAttachment"] == {"tomatoVpc", "tomatoIg"}
+
+
+def test_graph_references():
+    template = {
+        "Resources": {
+            "Role": {"Type": "AWS::IAM::Role", "Properties": {}},
+            "Profile": {
+                "Type": "AWS::IAM::InstanceProfile",
+                "Properties": {"Roles": [{"Ref": "Role"}]},
+            },
+            "Bucket": {
+                "Type": "AWS::S3::Bucket",
+                "DependsOn": "Profile",
+                "Properties": {
+                    "BucketName": {"Fn::Sub": "${AWS::Region}-${Role.Arn}"},
+                    "Tags": [{"Key": "p", "Value": {"Fn::GetAtt": ["Profile", "Arn"]}}],
+                },
+            },
+        }
+    }
+    assert dependency_graph(template) == {
+        "Role": set(),
+        "Profile": {"Role"},
+        "Bucket": {"Role", "Profile"},
+    }
+
+
+def test_critical_path_and_slack():
+    graph = {
+        "Vpc": set(),
+        "Subnet": {"Vpc"},
+        "Route": {"Vpc"},
+        "Nat": {"Subnet", "Route"},
+        "Role": set(),
+    }
+    durations = {"Vpc": 10, "Subnet": 5, "Route": 2, "Nat": 100, "Role": 20}
+    report = critical_path(graph, durations)
+    assert report["path"] == ["Vpc", "Subnet", "Nat"]
+    assert report["total"] == 115
+    slack = {k: v["slack"] for k, v in report["resources"].items()}
+    assert slack == {"Vpc": 0, "Subnet": 0, "Nat": 0, "Route": 3, "Role": 95}